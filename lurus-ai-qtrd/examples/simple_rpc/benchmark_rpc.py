@@ -0,0 +1,428 @@
+"""
+Benchmark latency and throughput of RpcServer running in a subprocess.
+
+Results are printed as a table and can be written as json with --output,
+so that serializer and transport changes can be compared run by run:
+
+    python benchmark_rpc.py --serializer pickle --output pickle.json
+    python benchmark_rpc.py --serializer msgpack --transport shm --output shm.json
+"""
+import json
+import platform
+import sys
+import tempfile
+import threading
+from argparse import ArgumentParser, Namespace
+from multiprocessing import get_context
+from multiprocessing.context import SpawnContext
+from pathlib import Path
+from time import perf_counter, sleep, time
+from typing import Any
+
+import numpy as np
+
+from vnpy.rpc import RpcClient, ShmRpcServer, ShmRpcClient
+
+
+BENCHMARK_TOPIC = "benchmark"
+END_TOPIC = "benchmark_end"
+
+PAYLOAD_SIZES = [64, 1024, 64 * 1024, 1024 * 1024]
+
+
+class BenchmarkServer(ShmRpcServer):
+    """
+    Server with functions measured by the benchmark.
+    """
+
+    def __init__(self, serializers: list[str], pool: str, max_workers: int | None) -> None:
+        """"""
+        super().__init__(serializers, pool, max_workers)
+
+        self.register(self.echo, parallel=True)
+        self.register(self.block, parallel=True)
+        self.register(self.publish_burst)
+        self.register(self.get_function_stats)
+
+    def echo(self, data: Any) -> Any:
+        """"""
+        return data
+
+    def block(self, seconds: float) -> None:
+        """
+        Simulate a blocking query.
+        """
+        sleep(seconds)
+
+    def publish_burst(self, count: int, size: int) -> float:
+        """
+        Publish count messages as fast as possible, returns seconds used.
+        """
+        payload: bytes = bytes(size)
+
+        start: float = perf_counter()
+        for i in range(count):
+            self.publish(BENCHMARK_TOPIC, (i, payload))
+        cost: float = perf_counter() - start
+
+        # End marker is resent since PUB socket may drop data at high water mark
+        for _ in range(10):
+            self.publish(END_TOPIC, count)
+            sleep(0.01)
+
+        return cost
+
+
+class BenchmarkClient(RpcClient):
+    """
+    Subscriber counting received messages.
+    """
+
+    def __init__(self, serializers: list[str], cache: bool = False) -> None:
+        """"""
+        super().__init__(serializers, cache)
+
+        self.count: int = 0
+        self.first_time: float = 0
+        self.last_time: float = 0
+        self.finished: threading.Event = threading.Event()
+
+    def callback(self, topic: str, data: Any) -> None:
+        """"""
+        if topic == BENCHMARK_TOPIC:
+            if not self.count:
+                self.first_time = perf_counter()
+            self.count += 1
+            self.last_time = perf_counter()
+        elif topic == END_TOPIC:
+            self.finished.set()
+
+
+class ShmBenchmarkClient(ShmRpcClient, BenchmarkClient):
+    """
+    Subscriber receiving messages through shared memory.
+    """
+
+    pass
+
+
+def get_addresses(transport: str) -> tuple[str, str]:
+    """
+    Addresses of request and publish sockets for transport.
+    """
+    if transport == "ipc":
+        folder: Path = Path(tempfile.gettempdir())
+        return f"ipc://{folder.joinpath('vnpy_benchmark_rep.ipc')}", f"ipc://{folder.joinpath('vnpy_benchmark_pub.ipc')}"
+    else:
+        return "tcp://127.0.0.1:23020", "tcp://127.0.0.1:24108"
+
+
+def create_client(args: Namespace, subscribe: bool = False) -> BenchmarkClient:
+    """
+    Create and start client for chosen transport.
+    """
+    rep_address, pub_address = get_addresses(args.transport)
+
+    client: BenchmarkClient
+    if args.transport == "shm":
+        client = ShmBenchmarkClient([args.serializer])
+    else:
+        client = BenchmarkClient([args.serializer])
+
+    if subscribe:
+        client.subscribe_topic(BENCHMARK_TOPIC)
+        client.subscribe_topic(END_TOPIC)
+
+    client.start(rep_address, pub_address)
+    return client
+
+
+def run_server(args: Namespace, ready: Any, stop: Any) -> None:
+    """
+    Run server process until stop event is set.
+    """
+    server: BenchmarkServer = BenchmarkServer([args.serializer], args.pool, args.max_workers)
+    server.start(*get_addresses(args.transport))
+
+    ready.set()
+    stop.wait()
+
+    server.stop()
+    server.join()
+
+
+def stop_processes(processes: list) -> None:
+    """
+    Give client processes a moment to detach, since socket clients only
+    exit after next heartbeat.
+    """
+    for process in processes:
+        process.join(2)
+        process.terminate()
+
+
+def summarize(latencies: list[float]) -> dict:
+    """
+    Percentiles of latency samples in microseconds.
+    """
+    data: np.ndarray = np.array(latencies) * 1e6
+    return {
+        "count": len(data),
+        "mean_us": float(data.mean()),
+        "p50_us": float(np.percentile(data, 50)),
+        "p90_us": float(np.percentile(data, 90)),
+        "p99_us": float(np.percentile(data, 99)),
+        "max_us": float(data.max()),
+    }
+
+
+def measure_calls(client: RpcClient, func: str, args: tuple, count: int) -> list[float]:
+    """
+    Round trip time of each call in seconds.
+    """
+    remote: Any = getattr(client, func)
+
+    latencies: list[float] = []
+    for _ in range(count):
+        start: float = perf_counter()
+        remote(*args)
+        latencies.append(perf_counter() - start)
+    return latencies
+
+
+def benchmark_latency(args: Namespace) -> list[dict]:
+    """
+    Round trip latency of echo call for each payload size.
+    """
+    client: BenchmarkClient = create_client(args)
+
+    results: list[dict] = []
+    for size in args.sizes:
+        payload: bytes = bytes(size)
+
+        # Fewer rounds for large payloads to keep total data bounded
+        count: int = min(args.count, max(256 * 1024 * 1024 // size, 100))
+
+        measure_calls(client, "echo", (payload,), min(count, 100))
+        latencies: list[float] = measure_calls(client, "echo", (payload,), count)
+
+        result: dict = {"payload_bytes": size, **summarize(latencies)}
+        result["calls_per_second"] = count / sum(latencies)
+        result["megabytes_per_second"] = result["calls_per_second"] * size * 2 / 1024 / 1024
+        results.append(result)
+
+        print(
+            f"latency  {size:>10,} B  p50 {result['p50_us']:>10,.1f}us  "
+            f"p99 {result['p99_us']:>10,.1f}us  {result['calls_per_second']:>10,.0f} calls/s",
+            file=sys.stderr
+        )
+
+    client.stop()
+    return results
+
+
+def run_subscriber(args: Namespace, ready: Any, results: Any) -> None:
+    """
+    Subscriber process, puts count and receive time into results queue.
+    """
+    client: BenchmarkClient = create_client(args, subscribe=True)
+    ready.release()
+
+    client.finished.wait(args.fanout_timeout)
+    results.put({
+        "received": client.count,
+        "seconds": client.last_time - client.first_time
+    })
+
+    client.stop()
+    client.join()
+
+
+def benchmark_fanout(args: Namespace, ctx: SpawnContext) -> list[dict]:
+    """
+    Publish throughput with different number of subscriber processes.
+    """
+    caller: BenchmarkClient = create_client(args)
+
+    results: list[dict] = []
+    for subscribers in args.subscribers:
+        ready: Any = ctx.Semaphore(0)
+        queue: Any = ctx.Queue()
+
+        processes: list = [
+            ctx.Process(target=run_subscriber, args=(args, ready, queue), daemon=True)
+            for _ in range(subscribers)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.acquire()
+
+        # Wait for subscriptions to reach server
+        sleep(1)
+
+        publish_seconds: float = caller.publish_burst(args.fanout_count, args.fanout_size, timeout=600_000)
+        received: list[dict] = [queue.get() for _ in processes]
+
+        stop_processes(processes)
+
+        seconds: float = max(r["seconds"] for r in received) or publish_seconds
+        total: int = sum(r["received"] for r in received)
+
+        result: dict = {
+            "subscribers": subscribers,
+            "published": args.fanout_count,
+            "payload_bytes": args.fanout_size,
+            "publish_per_second": args.fanout_count / publish_seconds,
+            "delivered_per_second": total / seconds if seconds else 0,
+            "loss_ratio": 1 - total / (args.fanout_count * subscribers),
+            "received": [r["received"] for r in received],
+        }
+        results.append(result)
+
+        print(
+            f"fanout   {subscribers:>4} subs  publish {result['publish_per_second']:>10,.0f} msg/s  "
+            f"delivered {result['delivered_per_second']:>10,.0f} msg/s  loss {result['loss_ratio']:.2%}",
+            file=sys.stderr
+        )
+
+    caller.stop()
+    return results
+
+
+def run_caller(args: Namespace, func: str, func_args: tuple, start: Any, results: Any) -> None:
+    """
+    Caller process, puts latency samples into results queue.
+    """
+    client: BenchmarkClient = create_client(args)
+    measure_calls(client, func, func_args, 10)
+
+    start.wait()
+    begin: float = perf_counter()
+    latencies: list[float] = measure_calls(client, func, func_args, args.concurrent_count)
+    results.put((latencies, perf_counter() - begin))
+
+    client.stop()
+    client.join()
+
+
+def benchmark_concurrency(args: Namespace, ctx: SpawnContext) -> list[dict]:
+    """
+    Latency and throughput with many caller processes at the same time.
+    """
+    # Echo shows overhead of transport, block shows queueing on server
+    workloads: list[tuple[str, tuple]] = [
+        ("echo", (bytes(args.concurrent_size),)),
+        ("block", (args.block_time,)),
+    ]
+
+    results: list[dict] = []
+    for func, func_args in workloads:
+        for callers in args.callers:
+            start: Any = ctx.Event()
+            queue: Any = ctx.Queue()
+
+            processes: list = [
+                ctx.Process(target=run_caller, args=(args, func, func_args, start, queue), daemon=True)
+                for _ in range(callers)
+            ]
+            for process in processes:
+                process.start()
+
+            # Let callers connect and warm up before starting together
+            sleep(1 + callers * 0.2)
+            start.set()
+
+            samples: list[tuple[list[float], float]] = [queue.get() for _ in processes]
+            stop_processes(processes)
+
+            latencies: list[float] = [t for s, _ in samples for t in s]
+            seconds: float = max(s[1] for s in samples)
+
+            result: dict = {"function": func, "callers": callers, **summarize(latencies)}
+            result["calls_per_second"] = len(latencies) / seconds
+            results.append(result)
+
+            print(
+                f"callers  {func:<6}{callers:>4} procs  p50 {result['p50_us']:>10,.1f}us  "
+                f"p99 {result['p99_us']:>10,.1f}us  {result['calls_per_second']:>10,.0f} calls/s",
+                file=sys.stderr
+            )
+
+    return results
+
+
+def parse_args() -> Namespace:
+    """"""
+    parser: ArgumentParser = ArgumentParser(description="Benchmark RpcServer and RpcClient")
+    parser.add_argument("--serializer", default="pickle", help="serializer used by server and clients")
+    parser.add_argument("--transport", default="tcp", choices=["tcp", "ipc", "shm"])
+    parser.add_argument("--pool", default="", choices=["", "thread", "process"], help="worker pool of server")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--sizes", type=int, nargs="+", default=PAYLOAD_SIZES, help="payload bytes of latency test")
+    parser.add_argument("--count", type=int, default=2000, help="calls per payload size")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 4], help="subscriber processes of fan-out test")
+    parser.add_argument("--fanout-count", type=int, default=50_000, help="messages published in fan-out test")
+    parser.add_argument("--fanout-size", type=int, default=256, help="payload bytes of fan-out test")
+    parser.add_argument("--fanout-timeout", type=float, default=120)
+    parser.add_argument("--callers", type=int, nargs="+", default=[1, 4], help="caller processes of concurrency test")
+    parser.add_argument("--concurrent-count", type=int, default=1000, help="calls per caller process")
+    parser.add_argument("--concurrent-size", type=int, default=1024)
+    parser.add_argument("--block-time", type=float, default=0.001, help="seconds blocked in block function")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["latency", "fanout", "concurrency"])
+    parser.add_argument("--output", default="", help="json file of results, printed to stdout if empty")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """"""
+    args: Namespace = parse_args()
+    ctx: SpawnContext = get_context("spawn")
+
+    ready: Any = ctx.Event()
+    stop: Any = ctx.Event()
+    server_process = ctx.Process(target=run_server, args=(args, ready, stop), daemon=True)
+    server_process.start()
+
+    if not ready.wait(30):
+        raise RuntimeError("Benchmark server failed to start")
+
+    report: dict = {
+        "time": time(),
+        "config": vars(args),
+        "platform": {
+            "python": platform.python_version(),
+            "system": platform.platform(),
+            "machine": platform.machine(),
+        },
+    }
+
+    try:
+        if "latency" not in args.skip:
+            report["latency"] = benchmark_latency(args)
+        if "fanout" not in args.skip:
+            report["fanout"] = benchmark_fanout(args, ctx)
+        if "concurrency" not in args.skip:
+            report["concurrency"] = benchmark_concurrency(args, ctx)
+
+        # Server side time spent in each function
+        client: BenchmarkClient = create_client(args)
+        report["server_stats"] = client.get_function_stats()
+
+        # Client thread exits after next heartbeat, which stops with server
+        client.stop()
+        client.join()
+    finally:
+        stop.set()
+        server_process.join(10)
+        server_process.terminate()
+
+    text: str = json.dumps(report, indent=4)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from datetime import datetime
+from time import perf_counter
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from vnpy.trader.constant import Exchange
+from vnpy.trader.object import TickData
+from vnpy.rpc.serializer import Serializer, SERIALIZERS, get_serializer
+
+
+def create_tick() -> TickData:
+    """"""
+    tick: TickData = TickData(
+        gateway_name="CTP",
+        symbol="rb2501",
+        exchange=Exchange.SHFE,
+        datetime=datetime.now(ZoneInfo("Asia/Shanghai")),
+        last_price=3500,
+        volume=123456,
+        bid_price_1=3499,
+        ask_price_1=3501,
+        bid_volume_1=10,
+        ask_volume_1=20
+    )
+    return tick
+
+
+def run_benchmark(serializer: Serializer, name: str, obj: object, count: int) -> None:
+    """
+    Measure dumps+loads throughput and message size.
+    """
+    frames: list = serializer.dumps(obj)
+    size: int = sum(len(memoryview(f).cast("B")) for f in frames)
+
+    start: float = perf_counter()
+    for _ in range(count):
+        serializer.loads(serializer.dumps(obj))
+    cost: float = perf_counter() - start
+
+    print(f"{serializer.name:<10}{name:<20}{count / cost:>12,.0f} msg/s{size:>12,} bytes")
+
+
+if __name__ == "__main__":
+    tick: TickData = create_tick()
+
+    payloads: list[tuple[str, object, int]] = [
+        ("tick", tick, 100_000),
+        ("tick batch x100", [create_tick() for _ in range(100)], 1_000),
+        ("ndarray 8MB", np.random.rand(1_000_000), 1_000),
+    ]
+
+    for name in SERIALIZERS:
+        try:
+            serializer: Serializer = get_serializer(name)
+        except ImportError as e:
+            print(f"{name} is not available: {e}")
+            continue
+
+        for payload_name, obj, count in payloads:
+            run_benchmark(serializer, payload_name, obj, count)
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import polars as pl
+from scipy.stats import rankdata
+
+from vnpy.alpha.dataset import AlphaDataset, FactorReport, analyze_factors
+from vnpy.alpha.dataset.analysis import plot_report
+
+
+START: datetime = datetime(2024, 1, 1)
+PERIODS: tuple[int, ...] = (1, 3)
+QUANTILES: int = 4
+
+
+def create_df() -> tuple[pl.DataFrame, pl.DataFrame]:
+    """Prices with suspended symbol, and factors with missing values"""
+    rng: np.random.Generator = np.random.default_rng(0)
+
+    dfs: list[pl.DataFrame] = []
+    for i in range(12):
+        days: np.ndarray = np.arange(60)
+        if i == 0:
+            days = days[(days < 20) | (days > 25)]
+
+        dfs.append(pl.DataFrame({
+            "datetime": [START + timedelta(days=int(day)) for day in days],
+            "vt_symbol": f"{600000 + i}.SSE",
+            "close": 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(days)))),
+        }))
+
+    price_df: pl.DataFrame = pl.concat(dfs).sort(["datetime", "vt_symbol"])
+
+    factor_df: pl.DataFrame = price_df.select(
+        "datetime",
+        "vt_symbol",
+        momentum=pl.col("close").pct_change(2).over("vt_symbol"),
+        noise=pl.Series(rng.normal(size=price_df.height)),
+        # Ties in rank
+        level=pl.Series(rng.integers(0, 3, price_df.height)).cast(pl.Float64),
+    ).with_columns(
+        pl.when(pl.int_range(pl.len()) % 7 == 0).then(None).otherwise(pl.col("noise")).alias("noise")
+    )
+
+    return price_df, factor_df
+
+
+def analyze_by_loop(price_df: pl.DataFrame, factor_df: pl.DataFrame, name: str) -> dict:
+    """Reference calculating on each datetime separately"""
+    prices: pd.DataFrame = price_df.to_pandas().pivot(index="datetime", columns="vt_symbol", values="close")
+    returns: dict[int, pd.DataFrame] = {p: prices.shift(-p) / prices - 1 for p in PERIODS}
+
+    factors: pd.DataFrame = factor_df.to_pandas().pivot(index="datetime", columns="vt_symbol", values=name)
+    factors = factors.reindex(index=prices.index, columns=prices.columns)
+
+    result: dict = {p: {"ic": [], "rank_ic": []} for p in PERIODS}
+    result["ranks"] = []
+    result["quantiles"] = []
+
+    for dt in prices.index:
+        data: pd.DataFrame = pd.DataFrame({"factor": factors.loc[dt]} | {p: returns[p].loc[dt] for p in PERIODS})
+        data = data.dropna()
+        if data.empty:
+            continue
+
+        rank: np.ndarray = rankdata(data["factor"])
+        quantile: np.ndarray = np.ceil(rank * QUANTILES / len(data))
+        result["ranks"].append(pd.Series(rank, index=data.index, name=dt))
+        result["quantiles"].append(pd.Series(quantile, index=data.index, name=dt))
+
+        for p in PERIODS:
+            result[p]["ic"].append(data["factor"].corr(data[p]))
+            result[p]["rank_ic"].append(data["factor"].corr(data[p], method="spearman"))
+
+            demeaned: pd.Series = data[p] - data[p].mean()
+            result[p].setdefault("returns", []).append(demeaned.groupby(quantile).agg(["sum", "count"]))
+
+    return result
+
+
+def test_analyze_factors() -> None:
+    """Factors analyzed at once same as each datetime separately"""
+    price_df, factor_df = create_df()
+    names: list[str] = ["momentum", "noise", "level"]
+
+    report: FactorReport = analyze_factors(factor_df, price_df, names, PERIODS, QUANTILES)
+
+    assert report.summary["name"].to_list() == names
+    assert report.quantile_returns.height == len(names) * QUANTILES
+
+    for name in names:
+        expected: dict = analyze_by_loop(price_df, factor_df, name)
+        daily: pl.DataFrame = report.daily.filter(pl.col("name") == name)
+        summary: dict = report.summary.filter(pl.col("name") == name).row(0, named=True)
+
+        for p in PERIODS:
+            ic: np.ndarray = np.array(expected[p]["ic"])
+            rank_ic: np.ndarray = np.array(expected[p]["rank_ic"])
+
+            np.testing.assert_allclose(daily[f"ic_{p}"].to_numpy(), ic, rtol=1e-10)
+            np.testing.assert_allclose(daily[f"rank_ic_{p}"].to_numpy(), rank_ic, rtol=1e-10)
+            assert np.isclose(summary[f"icir_{p}"], ic.mean() / ic.std(ddof=1))
+
+            stats: pd.DataFrame = pd.concat(expected[p]["returns"]).groupby(level=0).sum()
+            mean_return: np.ndarray = (stats["sum"] / stats["count"]).to_numpy()
+
+            quantile_returns: pl.DataFrame = report.quantile_returns.filter(pl.col("name") == name)
+            np.testing.assert_allclose(quantile_returns[f"return_{p}"].to_numpy(), mean_return, atol=1e-15)
+
+        ranks: pd.DataFrame = pd.DataFrame(expected["ranks"])
+        autocorr: pd.Series = ranks.corrwith(ranks.shift(1), axis=1)
+        np.testing.assert_allclose(daily["autocorr"].to_numpy()[1:], autocorr.to_numpy()[1:], rtol=1e-10)
+
+        top: pd.DataFrame = pd.DataFrame(expected["quantiles"]) == QUANTILES
+        turnover: pd.Series = 1 - (top & top.shift(1, fill_value=False)).sum(axis=1) / top.sum(axis=1)
+        np.testing.assert_allclose(daily["top_turnover"].to_numpy()[1:], turnover.to_numpy()[1:], rtol=1e-10)
+
+
+def test_analyze_features() -> None:
+    """All features of dataset analyzed, and plotted for one"""
+    price_df, _ = create_df()
+    df: pl.DataFrame = price_df.with_columns(volume=pl.lit(1e6))
+
+    dataset: AlphaDataset = AlphaDataset(
+        df,
+        ("2024-01-01", "2024-01-31"),
+        ("2024-02-01", "2024-02-10"),
+        ("2024-02-11", "2024-02-29")
+    )
+    dataset.add_feature("ma", "ts_mean(close, 5) / close")
+    dataset.add_feature("rank", "cs_rank(ts_delta(close, 2))")
+    dataset.set_label("ts_delay(close, -2) / ts_delay(close, -1) - 1")
+    dataset.prepare_data()
+
+    report: FactorReport = dataset.analyze_features()
+
+    assert report.summary["name"].to_list() == ["ma", "rank"]
+    assert report.summary.columns[1:5] == ["ic_1", "icir_1", "rank_ic_1", "rank_icir_1"]
+
+    fig = plot_report(report, "rank")
+    assert len(fig.data) == 10
+
+
+def test_analyze_features_without_label() -> None:
+    """Last feature is analyzed when dataset has no label"""
+    price_df, _ = create_df()
+    df: pl.DataFrame = price_df.with_columns(volume=pl.lit(1e6))
+
+    dataset: AlphaDataset = AlphaDataset(
+        df,
+        ("2024-01-01", "2024-01-31"),
+        ("2024-02-01", "2024-02-10"),
+        ("2024-02-11", "2024-02-29")
+    )
+    dataset.add_feature("ma", "ts_mean(close, 5) / close")
+    dataset.add_feature("rank", "cs_rank(ts_delta(close, 2))")
+    dataset.prepare_data()
+
+    report: FactorReport = dataset.analyze_features()
+    assert report.summary["name"].to_list() == ["ma", "rank"]
@@ -0,0 +1,98 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from vnpy.alpha.dataset import AlphaDataset
+from vnpy.alpha.dataset.cache import FeatureCache, main, parse_size
+
+
+def create_dataset(df: pl.DataFrame, features: dict[str, str]) -> AlphaDataset:
+    """"""
+    dataset: AlphaDataset = AlphaDataset(
+        df,
+        ("2024-01-01", "2024-01-20"),
+        ("2024-01-21", "2024-02-10"),
+        ("2024-02-11", "2024-03-01")
+    )
+
+    for name, expression in features.items():
+        dataset.add_feature(name, expression)
+    dataset.add_feature("log_volume", pl.col("volume").log())
+    dataset.set_label("ts_delay(close, -3) / ts_delay(close, -1) - 1")
+
+    return dataset
+
+
+def create_df(seed: int = 0) -> pl.DataFrame:
+    """"""
+    rng: np.random.Generator = np.random.default_rng(seed)
+    n_symbols: int = 5
+    n_days: int = 60
+
+    return pl.DataFrame({
+        "datetime": [datetime(2024, 1, 1) + timedelta(days=i) for i in range(n_days)] * n_symbols,
+        "vt_symbol": np.repeat([f"{600000 + i}.SSE" for i in range(n_symbols)], n_days),
+        "close": rng.random(n_symbols * n_days) * 100,
+        "volume": rng.random(n_symbols * n_days) * 1e6,
+    }).sort(["datetime", "vt_symbol"])
+
+
+def test_prepare_by_cache(tmp_path) -> None:
+    """Features cached by other dataset are loaded instead of calculated"""
+    cache: FeatureCache = FeatureCache(tmp_path)
+    df: pl.DataFrame = create_df()
+
+    first: AlphaDataset = create_dataset(df, {"ma_5": "ts_mean(close, 5) / close"})
+    first.prepare_data(cache=cache)
+    assert len(cache.list_files()) == 2
+
+    # Same expression in different format and name is a hit
+    features: dict[str, str] = {"ma": "ts_mean( close,5 )/close", "rank": "cs_rank(volume)"}
+
+    dataset: AlphaDataset = create_dataset(df, features)
+    dataset.prepare_data(cache=cache)
+    assert len(cache.list_files()) == 3
+
+    expected: AlphaDataset = create_dataset(df, features)
+    expected.prepare_data()
+
+    assert dataset.result_df.equals(expected.result_df)
+    assert dataset.raw_df.equals(expected.raw_df)
+
+    # Different bar data is a miss
+    other: AlphaDataset = create_dataset(create_df(1), features)
+    other.prepare_data(cache=cache)
+    assert len(cache.list_files()) == 6
+
+
+def test_prune(tmp_path, capsys: pytest.CaptureFixture) -> None:
+    """Least recently used files are removed first"""
+    cache: FeatureCache = FeatureCache(tmp_path.joinpath("feature"))
+    s: pl.Series = pl.Series(np.arange(1000, dtype=float))
+
+    for i in range(3):
+        cache.save(f"key{i}", f"close + {i}", s)
+        os.utime(cache.cache_path.joinpath(f"key{i}.parquet"), (i, i))
+
+    assert cache.load("key0", len(s)) is not None
+    assert cache.load("key1", len(s) + 1) is None
+
+    size: int = cache.cache_path.joinpath("key0.parquet").stat().st_size
+    assert cache.prune(size * 2) == 1
+    assert {path.stem for path, _ in cache.list_files()} == {"key0", "key2"}
+
+    main([str(tmp_path), "list"])
+    assert "close + 0" in capsys.readouterr().out
+
+    main([str(tmp_path), "clear"])
+    assert not cache.list_files()
+
+
+def test_parse_size() -> None:
+    """"""
+    assert parse_size("512") == 512
+    assert parse_size("2K") == 2048
+    assert parse_size("1.5GB") == int(1.5 * 1024 ** 3)
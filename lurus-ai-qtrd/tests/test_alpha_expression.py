@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from vnpy.alpha.dataset.utility import ExpressionCompiler, calculate_by_expression
+
+
+def create_df(n_symbols: int = 5, n_days: int = 60) -> pl.DataFrame:
+    """"""
+    rng: np.random.Generator = np.random.default_rng(0)
+    count: int = n_symbols * n_days
+
+    return pl.DataFrame({
+        "datetime": [datetime(2024, 1, 1) + timedelta(days=i) for i in range(n_days)] * n_symbols,
+        "vt_symbol": np.repeat([f"{600000 + i}.SSE" for i in range(n_symbols)], n_days),
+        "close": rng.random(count) * 100,
+        "volume": rng.random(count) * 1e6,
+    }).sort(["datetime", "vt_symbol"])
+
+
+def test_mixed_windows() -> None:
+    """Cross-section result used by time-series operator is calculated first"""
+    df: pl.DataFrame = create_df()
+
+    result: pl.DataFrame = calculate_by_expression(df, "ts_sum(cs_rank(close), 3) - cs_mean(ts_delay(close, 1))")
+
+    expected: pl.Series = df.with_columns(
+        rank=pl.col("close").rank().over("datetime"),
+        delay=pl.col("close").shift(1).over("vt_symbol")
+    ).select(
+        pl.col("rank").rolling_sum(3).over("vt_symbol") - pl.col("delay").mean().over("datetime")
+    ).to_series()
+
+    assert result.columns == ["datetime", "vt_symbol", "data"]
+    assert result["data"].equals(expected, check_names=False)
+
+
+def test_shared_intermediates() -> None:
+    """Sub-expression needed by several expressions is calculated once"""
+    df: pl.DataFrame = create_df()
+
+    compiler: ExpressionCompiler = ExpressionCompiler(df.columns)
+    exprs: list[pl.Expr] = [
+        compiler.compile("ts_mean(cs_rank(volume), 5)").alias("a"),
+        compiler.compile("ts_max(cs_rank(volume), 5) / ts_min(cs_rank(volume), 5)").alias("b"),
+        compiler.compile("quesval2(close, ts_delay(close, 1), 1, 0)").alias("c"),
+    ]
+
+    assert sum(len(stage) for stage in compiler.stages) == 1
+
+    result: pl.DataFrame = compiler.create_query(df, exprs).collect()
+    assert result.columns == df.columns + ["a", "b", "c"]
+
+    # Value if threshold is less than feature
+    delay: pl.Expr = pl.col("close").shift(1).over("vt_symbol")
+    expected: pl.Series = df.select(pl.when(pl.col("close") < delay).then(1).otherwise(0)).to_series()
+    assert result["c"].equals(expected, check_names=False)
+
+
+def test_invalid_expression() -> None:
+    """Unknown names are reported before query is run"""
+    compiler: ExpressionCompiler = ExpressionCompiler(["datetime", "vt_symbol", "close"])
+
+    with pytest.raises(ValueError):
+        compiler.compile("ts_unknown(close, 5)")
+
+    with pytest.raises(ValueError):
+        compiler.compile("close + open")
+
+
+def test_common_subexpressions() -> None:
+    """Window referred by several features is calculated once and reported"""
+    df: pl.DataFrame = create_df()
+
+    expressions: list[str] = [
+        "ts_mean(close / ts_delay(close, 1) - 1, 5)",
+        "ts_std(close / ts_delay(close, 1) - 1, 5)",
+        "cs_rank(close / ts_delay(close, 1) - 1)",
+    ]
+
+    compiler: ExpressionCompiler = ExpressionCompiler(df.columns)
+    compiler.count_references(expressions)
+
+    exprs: list[pl.Expr] = [
+        compiler.compile(expression).alias(f"f{i}") for i, expression in enumerate(expressions)
+    ]
+    assert list(compiler.intermediate_keys.values()) == ["close / ts_delay(close, 1) - 1"]
+
+    result: pl.DataFrame = compiler.calculate(df, exprs)
+    assert result.columns == df.columns + ["f0", "f1", "f2"]
+
+    for i, expression in enumerate(expressions):
+        expected: pl.DataFrame = calculate_by_expression(df, expression)
+        assert result[f"f{i}"].equals(expected["data"], check_names=False)
+
+    count, references, saved = compiler.get_reuse_statistics()
+    assert (count, references) == (1, 3)
+    assert saved > 0
+
+
+def test_shared_regression() -> None:
+    """Regression fields with the same arguments are calculated in one pass"""
+    df: pl.DataFrame = create_df()
+
+    expressions: list[str] = [
+        "ts_slope(close, 10) / close",
+        "ts_rsquare(close, 10)",
+        "ts_resi(close, 10) / close",
+        "ts_slope(close, 20) / close",
+    ]
+
+    compiler: ExpressionCompiler = ExpressionCompiler(df.columns)
+    compiler.count_references(expressions)
+
+    exprs: list[pl.Expr] = [
+        compiler.compile(expression).alias(f"f{i}") for i, expression in enumerate(expressions)
+    ]
+    assert list(compiler.intermediate_keys.values()) == ["get_regression(close, 10)"]
+
+    result: pl.DataFrame = compiler.calculate(df, exprs)
+
+    for i, expression in enumerate(expressions):
+        expected: pl.DataFrame = calculate_by_expression(df, expression)
+        assert result[f"f{i}"].equals(expected["data"], check_names=False)
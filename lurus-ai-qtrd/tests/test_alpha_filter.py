@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+from vnpy.alpha import AlphaLab
+from vnpy.alpha.dataset import AlphaDataset
+from vnpy.alpha.dataset.utility import to_filter_table, filter_by_intervals
+
+
+SYMBOLS: list[str] = [f"{600000 + i}.SSE" for i in range(6)]
+START: datetime = datetime(2024, 1, 1)
+
+
+def create_components() -> dict[str, list[str]]:
+    """Components changed randomly on each date"""
+    rng: np.random.Generator = np.random.default_rng(0)
+
+    return {
+        (START + timedelta(days=i)).strftime("%Y-%m-%d"): [s for s in SYMBOLS if rng.random() < 0.7]
+        for i in range(60)
+    }
+
+
+def filter_by_ranges(df: pl.DataFrame, filters: dict[str, list[tuple[datetime, datetime]]]) -> pl.DataFrame:
+    """Filter each range separately"""
+    dfs: list[pl.DataFrame] = [
+        df.filter((pl.col("vt_symbol") == vt_symbol) & pl.col("datetime").is_between(start, end))
+        for vt_symbol, ranges in filters.items()
+        for start, end in ranges
+    ]
+    return pl.concat(dfs).unique(maintain_order=True).sort(["datetime", "vt_symbol"])
+
+
+def test_component_filters(tmp_path) -> None:
+    """Holding periods break on dates missed in components"""
+    lab: AlphaLab = AlphaLab(str(tmp_path))
+    components: dict[str, list[str]] = create_components()
+    lab.save_component_data("000300.SSE", components)
+
+    filters: pl.DataFrame = lab.load_component_filters("000300.SSE", "2024-01-01", "2024-12-31")
+    assert filters.columns == ["vt_symbol", "start", "end"]
+
+    # Every date inside periods is in components, and dates at both ends are boundaries
+    for vt_symbol, start, end in filters.iter_rows():
+        days: list[datetime] = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        assert all(vt_symbol in components[day.strftime("%Y-%m-%d")] for day in days)
+
+        for day in [start - timedelta(days=1), end + timedelta(days=1)]:
+            assert vt_symbol not in components.get(day.strftime("%Y-%m-%d"), [])
+
+
+def test_filter_by_intervals() -> None:
+    """Same as filtering each range, with overlapping ranges merged"""
+    df: pl.DataFrame = pl.DataFrame({
+        "datetime": [START + timedelta(days=i) for i in range(30) for _ in SYMBOLS],
+        "vt_symbol": SYMBOLS * 30,
+        "value": np.arange(30 * len(SYMBOLS), dtype=float),
+    })
+
+    filters: dict[str, list[tuple[datetime, datetime]]] = {
+        SYMBOLS[0]: [(START, START + timedelta(days=10)), (START + timedelta(days=5), START + timedelta(days=7))],
+        SYMBOLS[1]: [(START + timedelta(days=3), START + timedelta(days=4)), (START + timedelta(days=20), START + timedelta(days=40))],
+        SYMBOLS[2]: [(START + timedelta(days=15), START + timedelta(days=15))],
+    }
+
+    result: pl.DataFrame = filter_by_intervals(df, to_filter_table(filters))
+    assert result.equals(filter_by_ranges(df, filters))
+
+
+def test_prepare_with_filters() -> None:
+    """Table and dict of filters give the same raw data"""
+    rng: np.random.Generator = np.random.default_rng(0)
+
+    df: pl.DataFrame = pl.DataFrame({
+        "datetime": [START + timedelta(days=i) for i in range(60) for _ in SYMBOLS],
+        "vt_symbol": SYMBOLS * 60,
+        "close": rng.random(60 * len(SYMBOLS)) * 100,
+    })
+
+    filters: dict[str, list[tuple[datetime, datetime]]] = {
+        SYMBOLS[0]: [(START, START + timedelta(days=20))],
+        SYMBOLS[3]: [(START + timedelta(days=10), START + timedelta(days=50))],
+    }
+
+    dataset: AlphaDataset = AlphaDataset(df, ("2024-01-01", "2024-01-20"), ("2024-01-21", "2024-02-10"), ("2024-02-11", "2024-03-01"))
+    dataset.add_feature("ma", "ts_mean(close, 5) / close")
+    dataset.set_label("ts_delay(close, -2) / close - 1")
+
+    dataset.prepare_data(filters=to_filter_table(filters))
+    table_df: pl.DataFrame = dataset.raw_df
+
+    dataset.prepare_data(filters=filters)
+    assert dataset.raw_df.equals(table_df)
+
+    expected: pl.DataFrame = filter_by_ranges(dataset.result_df.fill_null(float("nan")), filters)
+    assert table_df.equals(expected.select(table_df.columns))
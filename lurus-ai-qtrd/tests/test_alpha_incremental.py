@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+from functools import partial
+
+import numpy as np
+import polars as pl
+import pytest
+
+from vnpy.alpha.dataset import AlphaDataset, process_cs_norm, process_robust_zscore_norm
+from vnpy.alpha.dataset.incremental import UpdatePlanner
+
+
+START: datetime = datetime(2024, 1, 1)
+
+
+def create_df(n_days: int = 80) -> pl.DataFrame:
+    """Bars of symbols with suspended days"""
+    rng: np.random.Generator = np.random.default_rng(0)
+
+    dfs: list[pl.DataFrame] = []
+    for i in range(6):
+        days: np.ndarray = np.arange(n_days)
+        if i == 0:
+            days = days[(days < 30) | (days > 45)]
+
+        close: np.ndarray = 100 + np.cumsum(rng.normal(size=len(days)))
+        dfs.append(pl.DataFrame({
+            "datetime": [START + timedelta(days=int(day)) for day in days],
+            "vt_symbol": f"{600000 + i}.SSE",
+            "high": close + 1,
+            "low": close - 1,
+            "close": close,
+            "volume": rng.random(len(days)) * 1e6,
+        }))
+
+    return pl.concat(dfs).sort(["datetime", "vt_symbol"])
+
+
+def create_dataset(df: pl.DataFrame, ta: bool) -> AlphaDataset:
+    """"""
+    dataset: AlphaDataset = AlphaDataset(
+        df,
+        ("2024-01-01", "2024-01-31"),
+        ("2024-02-01", "2024-02-20"),
+        ("2024-02-21", "2024-03-31")
+    )
+
+    dataset.add_feature("ma", "ts_mean(close, 10) / close")
+    dataset.add_feature("corr", "ts_corr(close, ts_log(volume + 1), 5)")
+    dataset.add_feature("slope", "ts_slope(cs_rank(ts_delta(close, 3)), 6)")
+    dataset.add_feature("rank", "cs_rank(ts_sum(volume, 8))")
+    dataset.add_feature("future", "ts_mean(ts_delay(close, -2), 3)")
+    if ta:
+        dataset.add_feature("rsi", "ta_rsi(close, 14)")
+    dataset.set_label("ts_delay(close, -3) / ts_delay(close, -1) - 1")
+
+    dataset.add_processor("infer", partial(process_cs_norm, names=["ma", "corr"], method="zscore"))
+    dataset.add_processor(
+        "learn",
+        partial(process_robust_zscore_norm, fit_start_time="2024-01-01", fit_end_time="2024-01-31")
+    )
+
+    return dataset
+
+
+@pytest.mark.parametrize("ta", [False, True])
+def test_update_data(ta: bool) -> None:
+    """Data updated incrementally is the same as rebuilt from all bars"""
+    df: pl.DataFrame = create_df()
+    cutoff: datetime = START + timedelta(days=75)
+
+    dataset: AlphaDataset = create_dataset(df.filter(pl.col("datetime") < cutoff), ta)
+    dataset.prepare_data()
+    dataset.process_data()
+
+    dataset.update_data(df.filter(pl.col("datetime") >= cutoff), verify=True)
+
+    expected: AlphaDataset = create_dataset(df, ta)
+    expected.prepare_data()
+    expected.process_data()
+
+    assert dataset.raw_df.equals(expected.raw_df)
+    assert dataset.learn_df.equals(expected.learn_df)
+
+
+def test_update_earlier_bars() -> None:
+    """Bars not later than existing data are rejected"""
+    df: pl.DataFrame = create_df()
+
+    dataset: AlphaDataset = create_dataset(df, False)
+    dataset.prepare_data()
+
+    with pytest.raises(ValueError):
+        dataset.update_data(df.tail(6))
+
+
+def test_data_start() -> None:
+    """Windows of nested operators reach back on bars of each symbol"""
+    planner: UpdatePlanner = UpdatePlanner(create_df())
+
+    def to_date(days: int) -> np.datetime64:
+        return np.datetime64(START + timedelta(days=days), "us")
+
+    start: np.datetime64 = to_date(75)
+
+    assert planner.get_data_start("close / volume", start) == start
+    assert planner.get_data_start("ts_mean(close, 10)", start) == to_date(66)
+    assert planner.get_data_start("ts_delay(ts_sum(close, 5), 3)", start) == to_date(68)
+    assert planner.get_data_start("ta_rsi(close, 14)", start) is None
+
+    # Suspended symbol reaches back further, then cross section of all symbols
+    start = to_date(50)
+    assert planner.get_data_start("ts_mean(close, 10)", start) == to_date(25)
+    assert planner.get_data_start("ts_mean(cs_rank(ts_delta(close, 2)), 10)", start) == to_date(23)
+
+    # Rows before new bars changed by label referring to future
+    assert planner.get_update_start("ts_delay(close, -3)", start) == to_date(47)
+    assert planner.get_update_start("ts_mean(close, 5)", start) == start
@@ -0,0 +1,101 @@
+import pickle
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from vnpy.alpha.dataset import RobustZScoreNorm, process_cs_norm, process_drop_na
+
+
+START: datetime = datetime(2024, 1, 1)
+
+
+def create_df(n_days: int = 40, seed: int = 0) -> pl.DataFrame:
+    """Features of symbols with missing values"""
+    rng: np.random.Generator = np.random.default_rng(seed)
+    n_symbols: int = 8
+    rows: int = n_days * n_symbols
+
+    a: np.ndarray = rng.normal(size=rows)
+    a[rng.random(rows) < 0.1] = np.nan
+
+    b: list[float | None] = rng.normal(5, 2, size=rows).tolist()
+    for ix in range(0, rows, 7):
+        b[ix] = None
+
+    return pl.DataFrame({
+        "datetime": [START + timedelta(days=i) for i in range(n_days) for _ in range(n_symbols)],
+        "vt_symbol": [f"{600000 + j}.SSE" for _ in range(n_days) for j in range(n_symbols)],
+        "a": a,
+        "b": b,
+        "label": rng.normal(size=rows),
+    })
+
+
+def cs_norm_by_column(df: pl.DataFrame, names: list[str], method: str) -> pl.DataFrame:
+    """Reference normalizing each column of each datetime separately"""
+    dfs: list[pl.DataFrame] = []
+
+    for _, group in df.group_by("datetime", maintain_order=True):
+        for col in names:
+            value: np.ndarray = group[col].fill_nan(None).to_numpy().astype(float)
+
+            if method == "robust":
+                deviation: np.ndarray = value - np.nanmedian(value)
+                result: np.ndarray = np.clip(deviation / np.nanmedian(np.abs(deviation)) / 1.4826, -3, 3)
+            else:
+                result = (value - np.nanmean(value)) / np.nanstd(value, ddof=1)
+
+            group = group.with_columns(pl.Series(col, result, nan_to_null=True))
+        dfs.append(group)
+
+    return pl.concat(dfs)
+
+
+@pytest.mark.parametrize("method", ["robust", "zscore"])
+def test_cs_norm(method: str) -> None:
+    """All columns normalized in one pass same as column by column"""
+    df: pl.DataFrame = create_df()
+
+    result: pl.DataFrame = process_cs_norm(df, ["a", "b"], method)
+    expected: pl.DataFrame = cs_norm_by_column(df, ["a", "b"], method)
+
+    assert result.columns == df.columns
+    assert result.select("datetime", "vt_symbol", "label").equals(df.select("datetime", "vt_symbol", "label"))
+    for col in ["a", "b"]:
+        np.testing.assert_allclose(result[col].to_numpy(), expected[col].to_numpy(), rtol=1e-12)
+
+
+def test_drop_na() -> None:
+    """Rows with null or NaN in any feature removed"""
+    df: pl.DataFrame = create_df()
+
+    result: pl.DataFrame = process_drop_na(df)
+
+    assert result.height == df.filter(pl.col("a").is_not_nan() & pl.col("b").is_not_null()).height
+    assert result.null_count().sum_horizontal().item() == 0
+
+
+def test_robust_zscore_norm() -> None:
+    """Statistics fitted once are applied to new data, also after pickled"""
+    df: pl.DataFrame = create_df()
+
+    processor: RobustZScoreNorm = RobustZScoreNorm("2024-01-01", "2024-01-20")
+    result: pl.DataFrame = processor(df)
+
+    train: np.ndarray = df.filter(pl.col("datetime") <= datetime(2024, 1, 20))["b"].to_numpy().astype(float)
+    median: float = float(np.nanmedian(train))
+    assert processor.mean["b"] == pytest.approx(median)
+    assert processor.std["b"] == pytest.approx((np.nanmedian(np.abs(train - median)) + 1e-12) * 1.4826)
+
+    expected: pl.Series = ((df["b"] - processor.mean["b"]) / processor.std["b"]).clip(-3, 3)
+    assert result["b"].equals(expected)
+
+    # Inference data transformed without fitting again
+    mean: dict[str, float] = dict(processor.mean)
+    new_df: pl.DataFrame = create_df(5, seed=1)
+
+    restored: RobustZScoreNorm = pickle.loads(pickle.dumps(processor))
+    assert restored(new_df).equals(processor.transform(new_df))
+    assert processor.mean == restored.mean == mean
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+from vnpy.alpha.dataset import AlphaDataset
+from vnpy.alpha.dataset.shard import ShardPlan, split_by_rows
+
+
+FEATURES: dict[str, str] = {
+    "ma": "ts_mean(close, 5) / close",
+    "rsi": "ta_rsi(close, 6)",
+    "rank": "cs_rank(ts_sum(volume, 10)) * 2",
+    "scale": "cs_scale(close - ts_delay(close, 1)) + ts_std(close, 5)",
+    "mixed": "ts_corr(cs_rank(close), cs_rank(volume), 5)",
+    "compare": "quesval(0, cs_rank(close), 1, -1)",
+}
+
+
+def create_dataset(df: pl.DataFrame) -> AlphaDataset:
+    """"""
+    dataset: AlphaDataset = AlphaDataset(
+        df,
+        ("2024-01-01", "2024-01-20"),
+        ("2024-01-21", "2024-02-10"),
+        ("2024-02-11", "2024-03-01")
+    )
+
+    for name, expression in FEATURES.items():
+        dataset.add_feature(name, expression)
+    dataset.add_feature("log_volume", pl.col("volume").log())
+    dataset.set_label("ts_delay(close, -3) / ts_delay(close, -1) - 1")
+
+    return dataset
+
+
+def create_df() -> pl.DataFrame:
+    """Bars of symbols with different length"""
+    rng: np.random.Generator = np.random.default_rng(0)
+
+    dfs: list[pl.DataFrame] = []
+    for i in range(7):
+        count: int = 60 - i * 5
+        dfs.append(pl.DataFrame({
+            "datetime": [datetime(2024, 1, 1) + timedelta(days=60 - count + j) for j in range(count)],
+            "vt_symbol": f"{600000 + i}.SSE",
+            "close": 100 + np.cumsum(rng.normal(size=count)),
+            "volume": rng.random(count) * 1e6,
+        }))
+
+    return pl.concat(dfs).sort(["datetime", "vt_symbol"])
+
+
+def test_prepare_by_shards() -> None:
+    """Features calculated on shards are the same as on whole data"""
+    df: pl.DataFrame = create_df()
+
+    expected: AlphaDataset = create_dataset(df)
+    expected.prepare_data()
+
+    for shard_size in [50, 1000]:
+        dataset: AlphaDataset = create_dataset(df)
+        dataset.prepare_data(shard_size=shard_size)
+
+        assert dataset.result_df.equals(expected.result_df)
+        assert dataset.raw_df.equals(expected.raw_df)
+
+
+def test_shard_plan() -> None:
+    """Time-series sub-expressions are replaced with columns of the first pass"""
+    plan: ShardPlan = ShardPlan(list(FEATURES.items()))
+
+    assert set(plan.series) == {"ma", "rsi", "__series_0", "__series_1", "__series_2", "__series_3", "__series_4"}
+    assert plan.series["__series_0"] == "ts_sum(volume, 10)"
+    assert plan.sections["rank"] == "cs_rank(__series_0) * 2"
+    assert plan.sections["scale"] == "cs_scale(__series_1) + __series_2"
+    assert plan.mixed["mixed"] == "ts_corr(cs_rank(__series_3), cs_rank(__series_4), 5)"
+    assert plan.sections["compare"] == "quesval(0, cs_rank(__series_3), 1, -1)"
+
+
+def test_split_by_rows() -> None:
+    """"""
+    df: pl.DataFrame = create_df()
+
+    groups: list[pl.Series] = split_by_rows(df, "vt_symbol", 100)
+    assert [len(group) for group in groups] == [1, 1, 2, 2, 1]
+
+    # Value with more rows than limit is not split
+    assert len(split_by_rows(df, "vt_symbol", 10)) == 7
@@ -0,0 +1,84 @@
+from collections.abc import Callable
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+import talib
+
+from vnpy.alpha.dataset.utility import ExpressionCompiler, calculate_by_expression
+
+
+def create_df() -> pl.DataFrame:
+    """Bars of symbols with different length, sorted by datetime"""
+    rng: np.random.Generator = np.random.default_rng(0)
+
+    dfs: list[pl.DataFrame] = []
+    for i, count in enumerate([300, 200, 5, 120]):
+        close: np.ndarray = 100 + np.cumsum(rng.normal(size=count))
+        dfs.append(pl.DataFrame({
+            "datetime": [datetime(2024, 1, 1) + timedelta(days=300 - count + j) for j in range(count)],
+            "vt_symbol": f"{600000 + i}.SSE",
+            "open": close + rng.normal(size=count),
+            "high": close + 2,
+            "low": close - 2,
+            "close": close,
+            "volume": rng.random(count) * 1e6,
+        }))
+
+    return pl.concat(dfs).sort(["datetime", "vt_symbol"])
+
+
+CASES: dict[str, Callable[[dict[str, np.ndarray]], np.ndarray]] = {
+    "ta_rsi(close, 14)": lambda d: talib.RSI(d["close"], 14),
+    "ta_ema(close, 10)": lambda d: talib.EMA(d["close"], 10),
+    "ta_atr(high, low, close, 14)": lambda d: talib.ATR(d["high"], d["low"], d["close"], 14),
+    "ta_adx(high, low, close, 14)": lambda d: talib.ADX(d["high"], d["low"], d["close"], 14),
+    "ta_cci(high, low, close, 20)": lambda d: talib.CCI(d["high"], d["low"], d["close"], 20),
+    "ta_mfi(high, low, close, volume, 14)": lambda d: talib.MFI(d["high"], d["low"], d["close"], d["volume"], 14),
+    "ta_obv(close, volume)": lambda d: talib.OBV(d["close"], d["volume"]),
+    "ta_bop(open, high, low, close)": lambda d: talib.BOP(d["open"], d["high"], d["low"], d["close"]),
+    "ta_macd_hist(close, 12, 26, 9)": lambda d: talib.MACD(d["close"], 12, 26, 9)[2],
+    "ta_boll_up(close, 20, 2)": lambda d: talib.SMA(d["close"], 20) + talib.STDDEV(d["close"], 20) * 2,
+    "ta_aroon_down(high, low, 14)": lambda d: talib.AROON(d["high"], d["low"], 14)[0],
+    "ta_rsi(cs_rank(close), 6)": lambda d: talib.RSI(d["rank"], 6),
+}
+
+
+@pytest.mark.parametrize("expression", list(CASES))
+def test_operator_by_symbol(expression: str) -> None:
+    """Indicator is calculated on data of each symbol alone"""
+    df: pl.DataFrame = create_df().with_columns(
+        rank=pl.col("close").rank().over("datetime")
+    )
+
+    result: pl.DataFrame = calculate_by_expression(df, expression).join(df, on=["datetime", "vt_symbol"])
+
+    for (_, ), data in result.group_by(["vt_symbol"]):
+        arrays: dict[str, np.ndarray] = {name: data[name].to_numpy() for name in data.columns}
+        expected: pl.Series = pl.Series(CASES[expression](arrays), nan_to_null=True)
+
+        assert data["data"].is_null().equals(expected.is_null())
+        np.testing.assert_allclose(data["data"].to_numpy(), expected.to_numpy(), rtol=1e-10)
+
+
+def test_shared_macd() -> None:
+    """Fields of MACD with the same arguments are calculated once"""
+    df: pl.DataFrame = create_df()
+
+    expressions: list[str] = [
+        "ta_macd(close, 12, 26, 9)",
+        "ta_macd_signal(close, 12, 26, 9)",
+        "ta_macd_hist(close, 12, 26, 9)",
+    ]
+
+    compiler: ExpressionCompiler = ExpressionCompiler(df.columns)
+    compiler.count_references(expressions)
+
+    exprs: list[pl.Expr] = [
+        compiler.compile(expression).alias(f"f{i}") for i, expression in enumerate(expressions)
+    ]
+    assert list(compiler.intermediate_keys.values()) == ["get_macd(close, 12, 26, 9)"]
+
+    result: pl.DataFrame = compiler.calculate(df, exprs)
+    assert (result["f0"] - result["f1"] - result["f2"]).abs().max() < 1e-10       # type: ignore
@@ -0,0 +1,144 @@
+from collections.abc import Callable
+from typing import cast
+
+import numpy as np
+import polars as pl
+import pytest
+from scipy import stats
+
+from vnpy.alpha.dataset.utility import DataProxy
+from vnpy.alpha.dataset import ts_function
+
+
+def create_df() -> pl.DataFrame:
+    """Data with NaN, null, ties and a symbol shorter than window"""
+    rng: np.random.Generator = np.random.default_rng(0)
+
+    symbols: list[str] = []
+    values: list[float | None] = []
+    for i, count in enumerate([300, 200, 3]):
+        data: list[float | None] = list(rng.integers(0, 20, count).astype(float))
+        for ix in rng.integers(0, count, count // 10):
+            data[ix] = float("nan")
+        for ix in rng.integers(0, count, count // 10):
+            data[ix] = None
+
+        symbols.extend([f"{600000 + i}.SSE"] * count)
+        values.extend(data)
+
+    return pl.DataFrame(
+        {"vt_symbol": symbols, "close": values},
+        schema={"vt_symbol": pl.String, "close": pl.Float64}
+    ).sample(fraction=1, shuffle=True, seed=0)
+
+
+def decay_func(s: pl.Series, window: int) -> float:
+    """"""
+    weights = pl.Series(range(window, 0, -1))
+    return float((s * weights).sum() / (window * (window + 1) / 2))
+
+
+REFERENCES: dict[str, Callable[[pl.Expr, int], pl.Expr]] = {
+    "ts_argmax": lambda e, w: e.rolling_map(lambda s: cast(int, s.arg_max()) + 1, w),
+    "ts_argmin": lambda e, w: e.rolling_map(lambda s: cast(int, s.arg_min()) + 1, w),
+    "ts_rank": lambda e, w: e.rolling_map(lambda s: stats.percentileofscore(s, s[-1]) / 100, w),
+    "ts_sum": lambda e, w: e.rolling_map(lambda s: s.sum(), w),
+    "ts_mean": lambda e, w: e.rolling_map(lambda s: np.nanmean(s), w, min_samples=1),
+    "ts_std": lambda e, w: e.rolling_map(lambda s: np.nanstd(s, ddof=0), w, min_samples=1),
+    "ts_decay_linear": lambda e, w: e.rolling_map(lambda s: decay_func(s, w), w),
+    "ts_product": lambda e, w: e.rolling_map(lambda s: s.product(), w),
+}
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("name", list(REFERENCES))
+@pytest.mark.parametrize("window", [1, 5, 20])
+@pytest.mark.parametrize("block", [7, ts_function.ROLLING_BLOCK])
+def test_rolling_kernels(name: str, window: int, block: int, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Vectorized kernel gives same result as rolling_map, also across blocks"""
+    monkeypatch.setattr(ts_function, "ROLLING_BLOCK", block)
+
+    df: pl.DataFrame = create_df()
+    func: Callable = getattr(ts_function, name)
+
+    result: pl.DataFrame = df.select(
+        result=func(DataProxy(pl.col("close")), window).expr,
+        expected=REFERENCES[name](pl.col("close"), window).over("vt_symbol")
+    )
+
+    assert result["result"].is_null().equals(result["expected"].is_null())
+    np.testing.assert_allclose(result["result"].to_numpy(), result["expected"].to_numpy(), rtol=1e-10)
+
+
+@pytest.mark.parametrize("quantile", [0, 0.2, 0.5, 0.8, 1])
+def test_rolling_quantile(quantile: float) -> None:
+    """Quantile with NaN in window is same as polars"""
+    df: pl.DataFrame = create_df()
+
+    result: pl.DataFrame = df.select(
+        result=ts_function.ts_quantile(DataProxy(pl.col("close")), 6, quantile).expr,
+        expected=pl.col("close").rolling_map(
+            lambda s: s.quantile(quantile=quantile, interpolation="linear"), 6
+        ).over("vt_symbol")
+    )
+
+    assert result["result"].is_null().equals(result["expected"].is_null())
+    np.testing.assert_allclose(result["result"].to_numpy(), result["expected"].to_numpy(), rtol=1e-10)
+
+
+def test_integer_feature() -> None:
+    """Result of integer feature is not truncated"""
+    df: pl.DataFrame = pl.DataFrame({
+        "vt_symbol": ["600000.SSE"] * 4,
+        "up": pl.Series([1, 0, 0, 1], dtype=pl.Int32)
+    })
+
+    result: pl.Series = df.select(ts_function.ts_mean(DataProxy(pl.col("up")), 3).expr).to_series()
+    assert result.to_list() == [1, 0.5, 1 / 3, 1 / 3]
+
+
+@pytest.mark.parametrize("window", [5, 20])
+def test_rolling_regression(window: int) -> None:
+    """Regression fields are same as least squares fitted on each window"""
+    df: pl.DataFrame = create_df()
+
+    # Constant values at the beginning of each symbol
+    first: pl.Expr = pl.int_range(pl.len()).over("vt_symbol") < 30
+    df = df.with_columns(pl.when(first).then(7.0).otherwise(pl.col("close")).alias("close"))
+
+    feature: DataProxy = DataProxy(pl.col("close"))
+    result: pl.DataFrame = df.select(
+        "vt_symbol",
+        "close",
+        slope=ts_function.ts_slope(feature, window).expr,
+        intercept=ts_function.ts_intercept(feature, window).expr,
+        rsquare=ts_function.ts_rsquare(feature, window).expr,
+        resi=ts_function.ts_resi(feature, window).expr,
+    )
+
+    x: np.ndarray = np.arange(window)
+
+    for _, data in result.group_by("vt_symbol"):
+        close: list[float | None] = data["close"].to_list()
+
+        for i, row in enumerate(data.iter_rows(named=True)):
+            values: list[float | None] = close[max(i - window + 1, 0): i + 1]
+
+            if len(values) < window or None in values:
+                assert row["slope"] is None and row["rsquare"] is None and row["resi"] is None
+                continue
+
+            y: np.ndarray = np.array(values)
+            if np.isnan(y).any():
+                assert np.isnan(row["slope"]) and np.isnan(row["resi"]) and row["rsquare"] is None
+                continue
+
+            slope, intercept = np.polyfit(x, y, 1)
+            assert row["slope"] == pytest.approx(slope, abs=1e-9)
+            assert row["intercept"] == pytest.approx(intercept, abs=1e-9)
+            assert row["resi"] == pytest.approx(y[-1] - slope * (window - 1) - intercept, abs=1e-9)
+
+            if y.min() == y.max():
+                assert row["rsquare"] is None
+            else:
+                assert row["rsquare"] == pytest.approx(np.corrcoef(x, y)[0, 1] ** 2, abs=1e-9)
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+from vnpy.alpha.dataset import AlphaDataset
+from vnpy.alpha.dataset.worker import WorkerPool, get_worker_pool, close_worker_pool
+
+
+def create_dataset() -> AlphaDataset:
+    """"""
+    rng: np.random.Generator = np.random.default_rng(0)
+    n_symbols: int = 5
+    n_days: int = 60
+
+    df: pl.DataFrame = pl.DataFrame({
+        "datetime": [datetime(2024, 1, 1) + timedelta(days=i) for i in range(n_days)] * n_symbols,
+        "vt_symbol": np.repeat([f"{600000 + i}.SSE" for i in range(n_symbols)], n_days),
+        "close": rng.random(n_symbols * n_days) * 100,
+        "volume": rng.random(n_symbols * n_days) * 1e6,
+    }).sort(["datetime", "vt_symbol"])
+
+    dataset: AlphaDataset = AlphaDataset(
+        df,
+        ("2024-01-01", "2024-01-20"),
+        ("2024-01-21", "2024-02-10"),
+        ("2024-02-11", "2024-03-01")
+    )
+
+    for w in [5, 10, 20]:
+        dataset.add_feature(f"ma_{w}", f"ts_mean(close, {w}) / close")
+        dataset.add_feature(f"rank_{w}", f"cs_rank(ts_sum(volume, {w}))")
+    dataset.add_feature("log_volume", pl.col("volume").log())
+    dataset.set_label("ts_delay(close, -3) / ts_delay(close, -1) - 1")
+
+    return dataset
+
+
+def test_prepare_by_workers() -> None:
+    """Features calculated by worker processes are same as by one query"""
+    expected: AlphaDataset = create_dataset()
+    expected.prepare_data()
+
+    try:
+        for _ in range(2):
+            dataset: AlphaDataset = create_dataset()
+            dataset.prepare_data(max_workers=2)
+
+            assert dataset.raw_df.equals(expected.raw_df)
+
+        # Pool is reused by later calls
+        pool: WorkerPool = get_worker_pool(2)
+        assert get_worker_pool(2) is pool
+        assert not list(pool.folder.iterdir())
+    finally:
+        close_worker_pool()
@@ -0,0 +1,173 @@
+import os
+from copy import copy
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyqtgraph")
+
+from vnpy.chart.manager import BarManager, RangeTree      # noqa: E402
+from vnpy.chart.item import LOD_TILE_SIZE, CandleItem      # noqa: E402
+from vnpy.trader.constant import Exchange, Interval      # noqa: E402
+from vnpy.trader.object import BarData      # noqa: E402
+from vnpy.trader.ui import QtGui, QtWidgets      # noqa: E402
+
+
+def create_bars(count: int, seed: int = 0) -> list[BarData]:
+    """"""
+    rng: np.random.Generator = np.random.default_rng(seed)
+    start: datetime = datetime(2024, 1, 1)
+
+    bars: list[BarData] = []
+    for i in range(count):
+        low: float = float(rng.random() * 100)
+        bar: BarData = BarData(
+            gateway_name="TEST",
+            symbol="rb2501",
+            exchange=Exchange.SHFE,
+            datetime=start + timedelta(minutes=i),
+            interval=Interval.MINUTE,
+            volume=float(rng.integers(0, 1000)),
+            open_price=low,
+            high_price=low + float(rng.random() * 10),
+            low_price=low,
+            close_price=low
+        )
+        bars.append(bar)
+    return bars
+
+
+def test_range_tree() -> None:
+    """Range query matches NumPy over random windows"""
+    rng: np.random.Generator = np.random.default_rng(1)
+    data: np.ndarray = rng.random(3000)
+
+    tree: RangeTree = RangeTree(np.minimum, 4)
+    for ix, value in enumerate(data):
+        tree.set_value(ix, value)
+
+    for _ in range(200):
+        min_ix: int = int(rng.integers(0, len(data)))
+        max_ix: int = int(rng.integers(min_ix, len(data)))
+        assert tree.query(min_ix, max_ix) == data[min_ix: max_ix + 1].min()
+
+
+def test_bar_manager_range() -> None:
+    """Ranges follow history and live bar updates"""
+    bars: list[BarData] = create_bars(2000)
+
+    manager: BarManager = BarManager()
+    manager.update_history(bars[:1500])
+    for bar in bars[1500:]:
+        manager.update_bar(bar)
+
+    last_bar: BarData = bars[-1]
+    last_bar.high_price = 1000
+    last_bar.volume = 5000
+    manager.update_bar(last_bar)
+
+    highs: np.ndarray = np.array([bar.high_price for bar in bars])
+    lows: np.ndarray = np.array([bar.low_price for bar in bars])
+    volumes: np.ndarray = np.array([bar.volume for bar in bars])
+
+    for min_ix, max_ix in [(0, 1999), (100, 300), (1900, 2500), (1999, 1999)]:
+        end: int = min(max_ix, 1999) + 1
+        assert manager.get_price_range(min_ix, max_ix) == (lows[min_ix: end].min(), highs[min_ix: end].max())
+        assert manager.get_volume_range(min_ix, max_ix) == (0, volumes[min_ix: end].max())
+
+
+def test_bar_manager_merge() -> None:
+    """Out-of-order history is merged, newer bar replaces the same datetime"""
+    bars: list[BarData] = create_bars(3000)
+
+    manager: BarManager = BarManager()
+    manager.update_history(bars[1000:2000])
+    manager.update_history(bars[2000:])
+    manager.update_history(bars[:1000][::-1])
+    manager.update_history(bars[500:1500])
+
+    new_bar: BarData = copy(bars[700])
+    new_bar.close_price = 999
+    manager.update_history([new_bar, bars[100]])
+    bars[700] = new_bar
+
+    assert manager.get_count() == 3000
+    assert manager.get_all_bars() == bars
+
+    for ix in [0, 999, 1000, 2999]:
+        assert manager.get_index(bars[ix].datetime) == ix
+        assert manager.get_bar(ix) is bars[ix]
+        assert manager.get_datetime(ix) == bars[ix].datetime
+
+    assert manager.get_index(bars[-1].datetime + timedelta(seconds=1)) is None
+    assert manager.get_bar(3000) is None
+
+    close: np.ndarray = manager.get_array("close")
+    assert (close == [bar.close_price for bar in bars]).all()
+    assert (np.diff(manager.get_datetimes().astype(np.int64)) > 0).all()
+
+
+def test_bar_manager_envelope() -> None:
+    """Envelope of buckets matches bars in each bucket"""
+    bars: list[BarData] = create_bars(1000)
+
+    manager: BarManager = BarManager()
+    manager.update_history(bars)
+
+    envelope: dict[str, np.ndarray] = manager.get_envelope(100, 1200, 64)
+    assert len(envelope["index"]) == 15
+
+    for i, start in enumerate(envelope["index"]):
+        bucket: list[BarData] = bars[start: start + 64]
+        assert envelope["open"][i] == bucket[0].open_price
+        assert envelope["close"][i] == bucket[-1].close_price
+        assert envelope["high"][i] == max(bar.high_price for bar in bucket)
+        assert envelope["low"][i] == min(bar.low_price for bar in bucket)
+        assert envelope["volume"][i] == max(bar.volume for bar in bucket)
+
+
+def test_item_lod_update_bar() -> None:
+    """Tiles containing updated or appended bar are rebuilt when zoomed out"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    # Two tiles of level 1
+    bars: list[BarData] = create_bars(LOD_TILE_SIZE * 3)
+
+    manager: BarManager = BarManager()
+    manager.update_history(bars)
+
+    item: CandleItem = CandleItem(manager)
+    item.update_history(bars)
+
+    def paint() -> dict:
+        picture: QtGui.QPicture = QtGui.QPicture()
+        painter: QtGui.QPainter = QtGui.QPainter(picture)
+        assert item._paint_lod(painter, 1, 0, manager.get_count())
+        painter.end()
+        return dict(item._lod_pictures)
+
+    tiles: dict = paint()
+    assert list(tiles) == [(1, 0), (1, 1)]
+
+    # Live update of bar in second tile
+    bar: BarData = copy(bars[LOD_TILE_SIZE * 2 + 10])
+    bar.high_price += 1000
+    manager.update_bar(bar)
+    item.update_bar(bar)
+
+    assert list(item._lod_pictures) == [(1, 0)]
+
+    rebuilt: dict = paint()
+    assert rebuilt[(1, 0)] is tiles[(1, 0)]
+    assert rebuilt[(1, 1)] is not tiles[(1, 1)]
+
+    # New bar appended to second tile
+    bar = copy(bars[-1])
+    bar.datetime += timedelta(minutes=1)
+    manager.update_bar(bar)
+    item.update_bar(bar)
+
+    assert list(item._lod_pictures) == [(1, 0)]
+    assert paint()[(1, 1)] is not rebuilt[(1, 1)]
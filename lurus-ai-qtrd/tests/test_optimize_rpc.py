@@ -0,0 +1,142 @@
+import os
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from time import sleep, time
+
+import pytest
+
+from vnpy.trader.optimize import OptimizationSetting, run_bf_optimization, run_ga_optimization
+from vnpy.trader.optimize_rpc import OptimizationCoordinator, start_optimization_workers
+
+
+REP_ADDRESS = "tcp://127.0.0.1:23015"
+PUB_ADDRESS = "tcp://127.0.0.1:24103"
+
+
+def evaluate(setting: dict) -> tuple:
+    """Quadratic target with maximum at x=3, y=-2"""
+    value: float = -(setting["x"] - 3) ** 2 - (setting["y"] + 2) ** 2
+    return setting, value, os.getpid()
+
+
+def blocking_evaluate(setting: dict) -> tuple:
+    """Target marking evaluation started, then blocking long enough to be killed"""
+    Path(setting["path"], str(os.getpid())).touch()
+    sleep(1)
+    return evaluate(setting)
+
+
+def wait_until(condition: Callable[[], bool], timeout: float) -> bool:
+    """"""
+    end: float = time() + timeout
+    while time() < end:
+        if condition():
+            return True
+        sleep(0.05)
+    return False
+
+
+def key(result: tuple) -> float:
+    """"""
+    return float(result[1])
+
+
+@pytest.fixture
+def optimization_setting() -> OptimizationSetting:
+    """"""
+    setting: OptimizationSetting = OptimizationSetting()
+    setting.add_parameter("x", 0, 6, 1)
+    setting.add_parameter("y", -5, 1, 1)
+    setting.set_target("value")
+    return setting
+
+
+class TestRpcOptimization:
+    """Test optimization with rpc backend on local worker processes"""
+
+    def test_bf(self, optimization_setting: OptimizationSetting) -> None:
+        """Results match process backend"""
+        results: list[tuple] = run_bf_optimization(
+            evaluate,
+            optimization_setting,
+            key,
+            max_workers=3,
+            output=lambda msg: None,
+            backend="rpc",
+            rep_address=REP_ADDRESS,
+            pub_address=PUB_ADDRESS
+        )
+
+        assert len(results) == len(optimization_setting.generate_settings())
+        assert results[0][0] == {"x": 3, "y": -2}
+        assert len({r[2] for r in results}) > 1
+
+    def test_ga(self, optimization_setting: OptimizationSetting) -> None:
+        """"""
+        results: list[tuple] = run_ga_optimization(
+            evaluate,
+            optimization_setting,
+            key,
+            max_workers=2,
+            pop_size=20,
+            ngen=5,
+            output=lambda msg: None,
+            backend="rpc",
+            rep_address=REP_ADDRESS,
+            pub_address=PUB_ADDRESS
+        )
+
+        assert results
+        assert key(results[0]) == max(key(r) for r in results)
+
+    def test_worker_died(self, tmp_path: Path) -> None:
+        """Task held by a killed worker is retried after keepalive timeout"""
+        coordinator: OptimizationCoordinator = OptimizationCoordinator(worker_timeout=1, output=lambda msg: None)
+        coordinator.set_evaluate_func(blocking_evaluate)
+        coordinator.start(REP_ADDRESS, PUB_ADDRESS)
+
+        # Only one worker, so the task can not be stolen before retried
+        processes = start_optimization_workers(REP_ADDRESS, PUB_ADDRESS, 1)
+
+        try:
+            assert coordinator.wait_for_workers(1, 60)
+
+            settings: list[dict] = [{"x": x, "y": 0, "path": str(tmp_path)} for x in range(2)]
+            results: list = []
+
+            thread: threading.Thread = threading.Thread(target=lambda: results.extend(coordinator.map(settings)))
+            thread.start()
+
+            # Kill the worker while it is evaluating the task
+            assert wait_until(lambda: any(tmp_path.iterdir()), 30)
+            processes[0].kill()
+
+            assert wait_until(lambda: coordinator.retry_count >= 1, 30)
+
+            processes += start_optimization_workers(REP_ADDRESS, PUB_ADDRESS, 1)
+            thread.join(60)
+        finally:
+            for process in processes:
+                process.kill()
+                process.join()
+
+            coordinator.stop()
+            coordinator.join()
+
+        assert [r[0] for r in results] == settings
+        assert coordinator.retry_count >= 1
+        assert coordinator.steal_count == 0
+
+    def test_no_worker(self) -> None:
+        """Job fails instead of blocking when no worker connects"""
+        coordinator: OptimizationCoordinator = OptimizationCoordinator(connect_timeout=1, output=lambda msg: None)
+        coordinator.set_evaluate_func(evaluate)
+        coordinator.start(REP_ADDRESS, PUB_ADDRESS)
+
+        try:
+            with pytest.raises(TimeoutError):
+                coordinator.map([{"x": 0, "y": 0}])
+        finally:
+            coordinator.stop()
+            coordinator.join()
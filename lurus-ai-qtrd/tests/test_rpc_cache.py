@@ -0,0 +1,133 @@
+from time import sleep
+
+from vnpy.rpc import RpcServer, RpcClient, MultiplexRpcClient
+from vnpy.rpc.cache import RpcCache, make_cache_key
+
+
+REP_ADDRESS = "tcp://127.0.0.1:23021"
+PUB_ADDRESS = "tcp://127.0.0.1:24109"
+
+
+class TestServer(RpcServer):
+    """"""
+
+    __test__ = False
+
+    def __init__(self) -> None:
+        """"""
+        super().__init__()
+
+        self.prices: dict[str, float] = {"a": 1, "b": 2}
+        self.call_count: int = 0
+
+        self.register(self.get_price, cacheable=True)
+        self.register(self.get_all_prices, cacheable=True)
+        self.register(self.get_call_count)
+
+    def get_price(self, symbol: str) -> float:
+        """"""
+        self.call_count += 1
+        return self.prices[symbol]
+
+    def get_all_prices(self) -> dict[str, float]:
+        """"""
+        self.call_count += 1
+        return dict(self.prices)
+
+    def get_call_count(self) -> int:
+        """"""
+        return self.call_count
+
+    def set_price(self, symbol: str, price: float) -> None:
+        """"""
+        self.prices[symbol] = price
+
+        self.invalidate("get_price", {(symbol,): price})
+        self.invalidate("get_all_prices")
+
+
+def test_cache_versions() -> None:
+    """Missed invalidation or stale result never leaves stale cache"""
+    cache: RpcCache = RpcCache()
+    key: tuple = make_cache_key(("a",), {})
+
+    cache.set("f", key, 1, ("x", 0))
+    assert cache.get("f", key) == (True, 1)
+
+    # Delta with next version replaces result
+    cache.update("f", ("x", 1), {("a",): 2})
+    assert cache.get("f", key) == (True, 2)
+
+    # Result computed before last invalidation is not saved
+    cache.set("f", make_cache_key(("b",), {}), 3, ("x", 0))
+    assert cache.get("f", make_cache_key(("b",), {}))[0] is False
+
+    # Gap in versions drops all results
+    cache.update("f", ("x", 3), {("a",): 4})
+    assert cache.get("f", key)[0] is False
+
+    # Restarted server has another epoch
+    cache.set("f", key, 5, ("x", 3))
+    cache.set("f", make_cache_key(("b",), {}), 6, ("y", 0))
+    assert cache.get("f", key)[0] is False
+
+    assert make_cache_key(([1],), {}) is None
+
+
+def test_cache_keyword_call() -> None:
+    """Delta drops results cached from calls with keyword arguments"""
+    cache: RpcCache = RpcCache()
+    keyword_key: tuple = make_cache_key((), {"symbol": "a"})
+    mixed_key: tuple = make_cache_key(("a",), {"depth": 5})
+    key: tuple = make_cache_key(("b",), {})
+
+    cache.set("f", keyword_key, 1, ("x", 0))
+    cache.set("f", mixed_key, 1, ("x", 0))
+    cache.set("f", key, 2, ("x", 0))
+
+    cache.update("f", ("x", 1), {("a",): 10})
+    assert cache.get("f", keyword_key)[0] is False
+    assert cache.get("f", mixed_key)[0] is False
+    assert cache.get("f", key) == (True, 2)
+
+
+def test_client_cache() -> None:
+    """Cacheable calls are answered locally until invalidated"""
+    server: TestServer = TestServer()
+    server.start(REP_ADDRESS, PUB_ADDRESS)
+
+    client: RpcClient = RpcClient(cache=True)
+    client.start(REP_ADDRESS, PUB_ADDRESS)
+
+    multiplex_client: MultiplexRpcClient = MultiplexRpcClient(cache=True)
+    multiplex_client.start(REP_ADDRESS, PUB_ADDRESS)
+
+    try:
+        sleep(0.5)
+
+        for c in [client, multiplex_client]:
+            for _ in range(10):
+                assert c.get_price("a") == 1
+                assert c.get_all_prices() == {"a": 1, "b": 2}
+        assert client.get_call_count() == 4
+
+        server.set_price("a", 10)
+        sleep(0.5)
+
+        for c in [client, multiplex_client]:
+            assert c.get_price("a") == 10
+            assert c.get_all_prices() == {"a": 10, "b": 2}
+
+        # Delta is applied locally, full result is queried again
+        assert client.get_call_count() == 6
+
+        # Result of keyword call is not left stale by delta
+        assert client.get_price(symbol="b") == 2
+        server.set_price("b", 20)
+        sleep(0.5)
+        assert client.get_price(symbol="b") == 20
+    finally:
+        client.stop()
+        multiplex_client.stop()
+        server.stop()
+        server.join()
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import threading
+from time import sleep
+from typing import Any
+
+import pytest
+
+from vnpy.rpc import RpcServer, RpcClient, MultiplexRpcClient
+from vnpy.rpc.client import RemoteException
+
+
+REP_ADDRESS = "tcp://127.0.0.1:23016"
+PUB_ADDRESS = "tcp://127.0.0.1:24104"
+
+
+class TestServer(RpcServer):
+    """"""
+
+    __test__ = False
+
+    def __init__(self) -> None:
+        """"""
+        super().__init__()
+
+        self.register(self.add)
+        self.register(self.slow)
+
+    def add(self, a: int, b: int) -> int:
+        """"""
+        return a + b
+
+    def slow(self, seconds: float) -> float:
+        """"""
+        sleep(seconds)
+        return seconds
+
+
+class TestClient(MultiplexRpcClient):
+    """"""
+
+    __test__ = False
+
+    def callback(self, topic: str, data: Any) -> None:
+        """"""
+        pass
+
+
+@pytest.fixture
+def client() -> Any:
+    """Multiplex client connected to a running server"""
+    server: TestServer = TestServer()
+    server.start(REP_ADDRESS, PUB_ADDRESS)
+
+    client: TestClient = TestClient()
+    client.start(REP_ADDRESS, PUB_ADDRESS)
+
+    yield client
+
+    client.stop()
+    server.stop()
+    server.join()
+
+
+def test_threads(client: TestClient) -> None:
+    """Concurrent calls from threads get their own results"""
+    results: dict[int, int] = {}
+
+    def call(i: int) -> None:
+        results[i] = client.add(i, i)
+
+    threads: list[threading.Thread] = [threading.Thread(target=call, args=(i,)) for i in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: i * 2 for i in range(50)}
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/fd"), reason="open files are listed in /proc")
+def test_short_threads(client: TestClient) -> None:
+    """Thread per call does not leave sockets open"""
+    client.add(0, 0)
+    count: int = len(os.listdir("/proc/self/fd"))
+
+    for i in range(100):
+        thread: threading.Thread = threading.Thread(target=client.add, args=(i, i))
+        thread.start()
+        thread.join()
+
+    assert len(os.listdir("/proc/self/fd")) <= count + 5
+
+
+def test_asyncio(client: TestClient) -> None:
+    """"""
+    async def main() -> list:
+        return await asyncio.gather(*[client.acall("add", i, 1) for i in range(100)])
+
+    assert asyncio.run(main()) == [i + 1 for i in range(100)]
+
+
+def test_timeout(client: TestClient) -> None:
+    """Timed out call does not block following calls"""
+    with pytest.raises(RemoteException):
+        client.slow(0.5, timeout=100)
+
+    assert client.add(1, 2) == 3
+
+    # Late reply of the timed out call is discarded
+    sleep(0.6)
+    assert client.add(2, 3) == 5
+
+
+def test_req_client(client: TestClient) -> None:
+    """REQ client still works with the same server"""
+    req_client: RpcClient = RpcClient()
+    req_client.start(REP_ADDRESS, PUB_ADDRESS)
+
+    try:
+        assert req_client.add(3, 4) == 7
+    finally:
+        req_client.stop()
+
+
+def test_stop_while_calling(client: TestClient) -> None:
+    """Calls racing with stop either fail or return, none blocks forever"""
+    errors: list[Exception] = []
+
+    def call() -> None:
+        for i in range(1000):
+            try:
+                client.add(i, i)
+            except RemoteException as e:
+                errors.append(e)
+                return
+
+    threads: list[threading.Thread] = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+
+    sleep(0.1)
+    client.stop()
+
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+
+    assert len(errors) == 8
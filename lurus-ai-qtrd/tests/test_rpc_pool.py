@@ -0,0 +1,125 @@
+import math
+from threading import Thread
+from time import sleep, perf_counter
+from typing import Any
+
+import pytest
+
+from vnpy.rpc import RpcServer, MultiplexRpcClient
+from vnpy.rpc.client import RemoteException
+
+
+REP_ADDRESS = "tcp://127.0.0.1:23017"
+PUB_ADDRESS = "tcp://127.0.0.1:24105"
+
+
+def factorial(n: int) -> int:
+    """Module level function which can run in process pool"""
+    if n < 0:
+        raise ValueError("negative")
+    return math.factorial(n)
+
+
+class PoolServer(RpcServer):
+    """"""
+
+    def __init__(self, pool: str) -> None:
+        """"""
+        super().__init__(pool=pool, max_workers=4)
+
+        self.orders: list[int] = []
+
+        self.register(self.query_history, parallel=True)
+        self.register(self.send_order)
+        self.register(factorial, parallel=True)
+
+    def query_history(self, seconds: float) -> float:
+        """"""
+        sleep(seconds)
+        return seconds
+
+    def send_order(self, n: int) -> int:
+        """"""
+        self.orders.append(n)
+        return n
+
+
+class PoolClient(MultiplexRpcClient):
+    """"""
+
+    def callback(self, topic: str, data: Any) -> None:
+        """"""
+        pass
+
+
+def start(pool: str) -> tuple[PoolServer, PoolClient]:
+    """"""
+    server: PoolServer = PoolServer(pool)
+    server.start(REP_ADDRESS, PUB_ADDRESS)
+
+    client: PoolClient = PoolClient()
+    client.start(REP_ADDRESS, PUB_ADDRESS)
+
+    return server, client
+
+
+def close(server: PoolServer, client: PoolClient) -> None:
+    """"""
+    client.stop()
+    server.stop()
+    server.join()
+
+
+def test_thread_pool() -> None:
+    """Slow parallel function does not stall order-sensitive ones"""
+    server, client = start("thread")
+
+    try:
+        slow: Thread = Thread(target=client.query_history, args=(1,))
+        slow.start()
+        sleep(0.1)
+
+        start_time: float = perf_counter()
+        futures: list = [client.call_async("send_order", n) for n in range(100)]
+        assert [f.result() for f in futures] == list(range(100))
+        assert perf_counter() - start_time < 0.5
+
+        slow.join()
+    finally:
+        close(server, client)
+
+    # Order-sensitive function keeps request order
+    assert server.orders == list(range(100))
+
+    stats: dict = server.get_function_stats()
+    assert stats["send_order"]["count"] == 100
+    assert stats["query_history"]["max"] >= 1000
+
+
+def test_process_pool() -> None:
+    """"""
+    server, client = start("process")
+
+    try:
+        assert client.factorial(5) == 120
+        assert client.send_order(1) == 1
+
+        with pytest.raises(RemoteException):
+            client.factorial(-1)
+    finally:
+        close(server, client)
+
+    assert server.get_function_stats()["factorial"]["error_count"] == 1
+
+
+def test_stop_running() -> None:
+    """Server waits for running function before closing its socket"""
+    server, client = start("thread")
+
+    try:
+        client.call_async("query_history", 2)
+        sleep(0.1)
+    finally:
+        close(server, client)
+
+    assert server.get_function_stats()["query_history"]["count"] == 1
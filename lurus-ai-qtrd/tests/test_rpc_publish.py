@@ -0,0 +1,59 @@
+from time import sleep
+from typing import Any
+
+from vnpy.rpc import RpcServer, RpcClient
+
+
+REP_ADDRESS = "tcp://127.0.0.1:23018"
+PUB_ADDRESS = "tcp://127.0.0.1:24106"
+
+
+class TestClient(RpcClient):
+    """"""
+
+    __test__ = False
+
+    def __init__(self) -> None:
+        """"""
+        super().__init__()
+
+        self.received: list = []
+
+    def callback(self, topic: str, data: Any) -> None:
+        """"""
+        self.received.append((topic, data))
+
+
+def test_batch_publish() -> None:
+    """Conflated topic keeps newest value per key, others keep all data in order"""
+    server: RpcServer = RpcServer()
+    server.set_batch_publish(0.05)
+    server.set_conflation("tick", lambda data: data[0])
+    server.start(REP_ADDRESS, PUB_ADDRESS)
+
+    client: TestClient = TestClient()
+    client.subscribe_topic("")
+    client.start(REP_ADDRESS, PUB_ADDRESS)
+
+    try:
+        sleep(0.5)
+
+        for i in range(1000):
+            server.publish("tick", (i % 10, i))
+        for i in range(100):
+            server.publish("trade", i)
+
+        sleep(0.5)
+    finally:
+        client.stop()
+        server.stop()
+        server.join()
+
+    ticks: dict = {}
+    for topic, data in client.received:
+        if topic == "tick":
+            ticks[data[0]] = data[1]
+
+    assert ticks == {i % 10: i for i in range(990, 1000)}
+    assert len([t for t, _ in client.received if t == "tick"]) < 1000
+    assert [d for t, d in client.received if t == "trade"] == list(range(100))
@@ -0,0 +1,158 @@
+import socket
+from time import sleep
+from typing import Any
+
+from vnpy.rpc import RpcServer, RpcClient
+
+
+REP_ADDRESS = "tcp://127.0.0.1:23022"
+PUB_ADDRESS = "tcp://127.0.0.1:24110"
+
+
+def wait_released(address: str) -> None:
+    """Wait for address of stopped server to be released by zmq"""
+    host, port = address.removeprefix("tcp://").split(":")
+
+    for _ in range(50):
+        with socket.socket() as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind((host, int(port)))
+                return
+            except OSError:
+                sleep(0.1)
+
+
+class TestServer(RpcServer):
+    """"""
+
+    __test__ = False
+
+    def __init__(self) -> None:
+        """"""
+        super().__init__()
+
+        self.orders: dict[int, int] = {}
+        self.set_sequenced("order", self.get_orders, history_size=10)
+
+    def get_orders(self) -> dict[int, int]:
+        """"""
+        return dict(self.orders)
+
+    def update_order(self, order_id: int, volume: int) -> None:
+        """"""
+        self.orders[order_id] = volume
+        self.publish("order", (order_id, volume))
+
+
+class TestClient(RpcClient):
+    """Client losing some data on purpose"""
+
+    __test__ = False
+
+    def __init__(self) -> None:
+        """"""
+        super().__init__()
+
+        self.orders: dict[int, int] = {}
+        self.snapshot_count: int = 0
+        self.lost: set[int] = set()
+
+    def process_sequenced(self, topic: str, epoch: str, seq: int, data: Any) -> None:
+        """"""
+        if seq in self.lost:
+            self.lost.discard(seq)
+            return
+        super().process_sequenced(topic, epoch, seq, data)
+
+    def on_snapshot(self, topic: str, data: Any) -> None:
+        """"""
+        self.snapshot_count += 1
+        self.orders = data
+
+    def callback(self, topic: str, data: Any) -> None:
+        """"""
+        order_id, volume = data
+        self.orders[order_id] = volume
+
+
+def test_sequenced_topic() -> None:
+    """Client recovers missed data with snapshot or replay"""
+    server: TestServer = TestServer()
+    server.start(REP_ADDRESS, PUB_ADDRESS)
+
+    # Published before client started, more than history size
+    for i in range(50):
+        server.update_order(i % 20, i)
+
+    client: TestClient = TestClient()
+    client.subscribe_sequenced("order")
+    client.start(REP_ADDRESS, PUB_ADDRESS)
+
+    try:
+        sleep(0.5)
+
+        # First data triggers loading snapshot
+        server.update_order(100, 0)
+        sleep(0.2)
+        assert client.snapshot_count == 1
+        assert client.orders == server.orders
+
+        # Short gap is replayed from history
+        client.lost = {53, 54, 55}
+        for i in range(10):
+            server.update_order(i, 1000 + i)
+        sleep(0.2)
+        assert client.snapshot_count == 1
+        assert client.gap_count == 1
+        assert client.orders == server.orders
+
+        # Long gap needs another snapshot
+        client.lost = set(range(62, 80))
+        for i in range(30):
+            server.update_order(i, 2000 + i)
+        sleep(0.2)
+        assert client.snapshot_count == 2
+        assert client.orders == server.orders
+    finally:
+        client.stop()
+        server.stop()
+        server.join()
+
+
+def test_server_restart() -> None:
+    """Client resyncs when sequence restarts with new server"""
+    server: TestServer = TestServer()
+    server.start(REP_ADDRESS, PUB_ADDRESS)
+
+    client: TestClient = TestClient()
+    client.subscribe_sequenced("order")
+    client.start(REP_ADDRESS, PUB_ADDRESS)
+
+    try:
+        sleep(0.5)
+
+        for i in range(50):
+            server.update_order(i % 20, i)
+        sleep(0.2)
+        assert client.orders == server.orders
+
+        server.stop()
+        server.join()
+        wait_released(REP_ADDRESS)
+        wait_released(PUB_ADDRESS)
+
+        # Sequence of new server is below last one processed by client
+        server = TestServer()
+        server.start(REP_ADDRESS, PUB_ADDRESS)
+        sleep(1)
+
+        for i in range(20):
+            server.update_order(i, 5000 + i)
+        sleep(0.5)
+        assert client.orders == server.orders
+        assert client.gap_count == 0
+    finally:
+        client.stop()
+        server.stop()
+        server.join()
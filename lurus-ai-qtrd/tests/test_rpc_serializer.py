@@ -0,0 +1,131 @@
+from datetime import datetime
+from time import sleep
+from typing import Any
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+from vnpy.rpc import RpcServer, RpcClient
+from vnpy.rpc.client import RemoteException
+from vnpy.rpc.serializer import MsgpackSerializer, PickleSerializer, Serializer
+from vnpy.trader.constant import Direction, Exchange, Interval
+from vnpy.trader.object import BarData, TickData
+
+
+REP_ADDRESS = "tcp://127.0.0.1:23014"
+PUB_ADDRESS = "tcp://127.0.0.1:24102"
+
+
+def create_tick() -> TickData:
+    """"""
+    return TickData(
+        gateway_name="CTP",
+        symbol="rb2501",
+        exchange=Exchange.SHFE,
+        datetime=datetime(2025, 1, 2, 9, 30, 1, 500000, tzinfo=ZoneInfo("Asia/Shanghai")),
+        last_price=3500
+    )
+
+
+class EchoServer(RpcServer):
+    """"""
+
+    def __init__(self, serializers: list[str] | None = None) -> None:
+        """"""
+        super().__init__(serializers)
+
+        self.register(self.echo)
+        self.register(self.get_func)
+
+    def echo(self, data: Any) -> Any:
+        """"""
+        return data
+
+    def get_func(self) -> Any:
+        """"""
+        return create_tick
+
+
+class EchoClient(RpcClient):
+    """"""
+
+    def __init__(self, serializers: list[str] | None = None) -> None:
+        """"""
+        super().__init__(serializers)
+
+        self.received: list = []
+
+    def callback(self, topic: str, data: Any) -> None:
+        """"""
+        self.received.append((topic, data))
+
+
+@pytest.mark.parametrize("serializer", [PickleSerializer(), MsgpackSerializer()])
+def test_roundtrip(serializer: Serializer) -> None:
+    """Objects keep type and value after roundtrip"""
+    bar: BarData = BarData(
+        gateway_name="DB",
+        symbol="600000",
+        exchange=Exchange.SSE,
+        datetime=datetime(2025, 1, 2),
+        interval=Interval.DAILY,
+        close_price=10.5
+    )
+    obj: list = [create_tick(), bar, (Direction.LONG, 1), {"a": {1, 2}}, np.arange(12.0).reshape(3, 4)]
+
+    result: list = serializer.loads(serializer.dumps(obj))
+
+    assert result[:4] == obj[:4]
+    assert result[0].vt_symbol == "rb2501.SHFE"
+    assert result[0].datetime.tzinfo == ZoneInfo("Asia/Shanghai")
+    np.testing.assert_array_equal(result[4], obj[4])
+
+
+def test_msgpack_rejects_unknown_type() -> None:
+    """Unregistered types are never loaded by msgpack"""
+    with pytest.raises(TypeError):
+        MsgpackSerializer().dumps(create_tick)
+
+
+@pytest.mark.parametrize(
+    "server_serializers, client_serializers",
+    [
+        (["msgpack", "pickle"], ["msgpack", "pickle"]),
+        (["pickle"], ["msgpack", "pickle"]),
+        (["msgpack"], ["msgpack"]),
+    ]
+)
+def test_server_client(server_serializers: list[str], client_serializers: list[str]) -> None:
+    """Serializer is negotiated and published data is decoded"""
+    server: EchoServer = EchoServer(server_serializers)
+    server.start(REP_ADDRESS, PUB_ADDRESS)
+
+    client: EchoClient = EchoClient(client_serializers)
+    client.subscribe_topic("tick")
+    client.start(REP_ADDRESS, PUB_ADDRESS)
+
+    try:
+        tick: TickData = create_tick()
+        assert client.echo(tick) == tick
+
+        # Function objects can only be sent with pickle
+        if "pickle" in server_serializers:
+            assert client.get_func() is create_tick
+        else:
+            with pytest.raises(RemoteException):
+                client.get_func()
+
+        for _ in range(20):
+            server.publish("tick", tick)
+            server.publish("other", 1)
+            sleep(0.05)
+            if client.received:
+                break
+
+        assert client.received[0] == ("tick", tick)
+        assert all(topic == "tick" for topic, _data in client.received)
+    finally:
+        client.stop()
+        server.stop()
+        server.join()
@@ -0,0 +1,115 @@
+from time import sleep
+from typing import Any
+
+import numpy as np
+import pytest
+import zmq
+
+from vnpy.rpc import ShmRpcServer, ShmRpcClient
+from vnpy.rpc.client import RemoteException
+from vnpy.rpc.shm import ShmRingBuffer
+
+
+REP_ADDRESS = "tcp://127.0.0.1:23019"
+PUB_ADDRESS = "tcp://127.0.0.1:24107"
+
+
+class TestServer(ShmRpcServer):
+    """"""
+
+    __test__ = False
+
+    def __init__(self) -> None:
+        """"""
+        super().__init__()
+
+        self.register(self.add)
+        self.register(self.echo)
+        self.register(self.fail)
+
+    def add(self, a: int, b: int) -> int:
+        """"""
+        return a + b
+
+    def echo(self, data: Any) -> Any:
+        """"""
+        return data
+
+    def fail(self) -> None:
+        """"""
+        raise ValueError("failed")
+
+
+class TestClient(ShmRpcClient):
+    """"""
+
+    __test__ = False
+
+    def __init__(self) -> None:
+        """"""
+        super().__init__(buffer_size=1024 * 1024)
+
+        self.received: list = []
+
+    def callback(self, topic: str, data: Any) -> None:
+        """"""
+        self.received.append((topic, data))
+
+
+def test_ring_wrap_around() -> None:
+    """Messages crossing the end of ring are read back intact"""
+    context: zmq.Context = zmq.Context()
+
+    consumer: ShmRingBuffer = ShmRingBuffer(size=1000)
+    producer: ShmRingBuffer = ShmRingBuffer(consumer.name)
+    consumer.open_consumer(context)
+    producer.open_producer(context)
+
+    try:
+        for i in range(100):
+            data: bytes = bytes([i]) * (i * 3)
+            assert producer.write([b"head", data])
+            assert [bytes(f) for f in consumer.read(1000)] == [b"head", data]
+
+        assert consumer.read(10) is None
+
+        # Producer can not overwrite unread data
+        while producer.write([bytes(100)]):
+            pass
+        consumer.read(1000)
+        assert producer.write([bytes(100)])
+    finally:
+        producer.close()
+        consumer.close()
+        context.term()
+
+
+def test_shm_rpc() -> None:
+    """Calls and published data go through shared memory"""
+    server: TestServer = TestServer()
+    server.start(REP_ADDRESS, PUB_ADDRESS)
+
+    client: TestClient = TestClient()
+    client.subscribe_topic("tick")
+    client.start(REP_ADDRESS)
+
+    try:
+        assert client.add(1, 2) == 3
+
+        array: np.ndarray = np.arange(10000, dtype=float)
+        assert (client.echo(array) == array).all()
+
+        with pytest.raises(RemoteException, match="failed"):
+            client.fail()
+
+        for i in range(100):
+            server.publish("tick", i)
+            server.publish("trade", i)
+        sleep(0.5)
+    finally:
+        client.stop()
+        client.join()
+        server.stop()
+        server.join()
+
+    assert client.received == [("tick", i) for i in range(100)]
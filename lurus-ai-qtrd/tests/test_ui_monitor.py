@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+pytest.importorskip("PySide6")
+
+from vnpy.event import EventEngine      # noqa: E402
+from vnpy.trader.constant import Direction, Exchange, Offset, OrderType, Status      # noqa: E402
+from vnpy.trader.engine import MainEngine      # noqa: E402
+from vnpy.trader.object import OrderData, PositionData      # noqa: E402
+from vnpy.trader.ui import QtWidgets      # noqa: E402
+from vnpy.trader.ui.widget import (      # noqa: E402
+    BaseCell,
+    MonitorModel,
+    OrderMonitor,
+    PositionMonitor,
+    TradingWidget
+)
+
+
+def create_order(orderid: str, traded: float, status: Status = Status.PARTTRADED) -> OrderData:
+    """"""
+    return OrderData(
+        gateway_name="TEST",
+        symbol="rb2501",
+        exchange=Exchange.SHFE,
+        orderid=orderid,
+        type=OrderType.LIMIT,
+        direction=Direction.LONG,
+        offset=Offset.OPEN,
+        price=3000,
+        volume=10,
+        traded=traded,
+        status=status
+    )
+
+
+def test_monitor_model() -> None:
+    """Buffered updates keep latest data of each key, newest row on top"""
+    model: MonitorModel = MonitorModel(OrderMonitor.headers, OrderMonitor.data_key)
+
+    changed: list[tuple[int, int]] = []
+    model.dataChanged.connect(lambda top, bottom: changed.append((top.row(), bottom.row())))
+
+    model.update_data([create_order(str(i), 0) for i in range(5)])
+    assert model.rowCount() == 5
+    assert model.get_data(0).orderid == "4"
+
+    # Many updates of same orders in one batch
+    data_list: list[OrderData] = []
+    for traded in range(1, 10):
+        for orderid in ["0", "1", "3"]:
+            data_list.append(create_order(orderid, traded))
+    data_list.append(create_order("5", 0))
+    model.update_data(data_list)
+
+    assert model.rowCount() == 6
+    assert model.get_data(0).orderid == "5"
+
+    # Rows of order 3, 1, 0 are 1, 3, 4 before inserting order 5
+    assert changed == [(1, 1), (3, 4)]
+
+    traded_column: int = model.fields.index("traded")
+    assert model.index(5, traded_column).data() == "9"
+    assert model.index(1, traded_column).data() == "0"
+
+
+class OldTradingWidget(TradingWidget):
+    """Subclass overriding hook of cell"""
+
+    def update_with_cell(self, cell: BaseCell) -> None:
+        """"""
+        self.cell: BaseCell = cell
+        super().update_with_cell(cell)
+
+
+def test_double_click_cell() -> None:
+    """Slot of itemDoubleClicked receives cell of row double clicked"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    event_engine: EventEngine = EventEngine()
+    main_engine: MainEngine = MainEngine(event_engine)
+
+    try:
+        monitor: PositionMonitor = PositionMonitor(main_engine, event_engine)
+        widget: OldTradingWidget = OldTradingWidget(main_engine, event_engine)
+        widget.exchange_combo.addItem(Exchange.SHFE.value)
+        monitor.itemDoubleClicked.connect(widget.update_with_cell)
+
+        position: PositionData = PositionData(
+            gateway_name="TEST",
+            symbol="rb2501",
+            exchange=Exchange.SHFE,
+            direction=Direction.LONG,
+            volume=5
+        )
+        monitor.table_model.update_data([position])
+
+        column: int = monitor.table_model.fields.index("volume")
+        monitor.doubleClicked.emit(monitor.model().index(0, column))
+
+        assert widget.cell.get_data() is position
+        assert widget.cell.text() == "5"
+        assert widget.symbol_line.text() == "rb2501"
+        assert widget.direction_combo.currentText() == Direction.SHORT.value
+    finally:
+        main_engine.close()
@@ -1,11 +1,13 @@
 from .template import AlphaDataset
 from .utility import Segment, to_datetime
+from .analysis import FactorReport, analyze_factors
 from .processor import (
     process_drop_na,
     process_fill_na,
     process_cs_norm,
     process_robust_zscore_norm,
-    process_cs_rank_norm
+    process_cs_rank_norm,
+    RobustZScoreNorm
 )
 
 
@@ -13,9 +15,12 @@ __all__ = [
     "AlphaDataset",
     "Segment",
     "to_datetime",
+    "FactorReport",
+    "analyze_factors",
     "process_drop_na",
     "process_fill_na",
     "process_cs_norm",
     "process_robust_zscore_norm",
-    "process_cs_rank_norm"
+    "process_cs_rank_norm",
+    "RobustZScoreNorm"
 ]
@@ -0,0 +1,347 @@
+"""
+Factor analytics of all features at once, calculated on matrices of
+datetime by symbol
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import polars as pl
+import plotly.graph_objects as go               # type: ignore
+from plotly.subplots import make_subplots       # type: ignore
+from scipy.stats import rankdata                # type: ignore
+
+
+@dataclass
+class FactorReport:
+    """
+    Results of factor analysis.
+
+    summary: mean IC/RankIC and ICIR of each period (IC decay), spread of
+        top and bottom quantile returns, turnover and autocorrelation
+    daily: IC/RankIC, turnover and autocorrelation of each datetime
+    quantile_returns: mean forward return of each quantile, demeaned by
+        datetime
+    """
+
+    summary: pl.DataFrame
+    daily: pl.DataFrame
+    quantile_returns: pl.DataFrame
+
+
+def analyze_factors(
+    factor_df: pl.DataFrame,
+    price_df: pl.DataFrame,
+    names: list[str],
+    periods: tuple[int, ...] = (1, 5, 10),
+    quantiles: int = 10
+) -> FactorReport:
+    """
+    Analyze factors with forward returns of close price.
+
+    Observation without factor value or forward return of any period is
+    excluded, the same as alphalens, but forward return over suspended bar
+    is missing instead of using stale price. Quantiles are split by rank of
+    factor on each datetime, and turnover and autocorrelation are between
+    consecutive datetimes with factor value.
+    """
+    datetimes: pl.Series = price_df["datetime"].unique().sort()
+    symbols: pl.Series = price_df["vt_symbol"].unique().sort()
+    shape: tuple[int, int] = (len(datetimes), len(symbols))
+
+    # Forward returns on datetimes of price, NaN if bar missing
+    rows, cols, found = align_index(price_df, datetimes, symbols)
+    close: np.ndarray = to_matrix(price_df["close"], rows, cols, found, shape)
+
+    returns: list[np.ndarray] = []
+    for period in periods:
+        r: np.ndarray = np.full(shape, np.nan)
+        r[:-period] = close[period:] / close[:-period] - 1
+        returns.append(r)
+
+    valid: np.ndarray = np.logical_and.reduce([~np.isnan(r) for r in returns])
+    for r in returns:
+        r[~valid] = np.nan
+
+    return_ranks: list[np.ndarray] = [rankdata(r, axis=1, nan_policy="omit") for r in returns]
+    return_sorts: list[RowSort] = [RowSort(r) for r in returns]
+
+    # Factor values aligned to the same matrix
+    rows, cols, found = align_index(factor_df, datetimes, symbols)
+
+    summaries: list[dict] = []
+    dailies: list[pl.DataFrame] = []
+    quantile_dfs: list[pl.DataFrame] = []
+
+    for name in names:
+        x: np.ndarray = to_matrix(factor_df[name], rows, cols, found, shape)
+        x[~valid] = np.nan
+
+        has_value: np.ndarray = ~np.isnan(x)
+        count: np.ndarray = has_value.sum(axis=1)
+        rank: np.ndarray = rankdata(x, axis=1, nan_policy="omit")
+
+        # Ranks of returns changed on datetimes where some factor values missing
+        partial: np.ndarray = (count > 0) & (has_value != valid).any(axis=1)
+
+        # Pairs with factor value used for all periods, so deviations of factor reused
+        x_dev, x_ss = center_rows(x, has_value, count)
+        rank_dev, rank_ss = center_rows(rank, has_value, count)
+
+        # Quantile of each observation, 0 if excluded
+        with np.errstate(divide="ignore", invalid="ignore"):
+            quantile: np.ndarray = np.ceil(rank * quantiles / count[:, None])
+        quantile = np.where(has_value, quantile, 0).astype(np.int64)
+
+        summary: dict = {"name": name}
+        daily: dict = {}
+        quantile_returns: dict = {"name": name, "quantile": np.arange(1, quantiles + 1)}
+
+        for period, r, r_rank, r_sort in zip(periods, returns, return_ranks, return_sorts, strict=True):
+            y: np.ndarray = np.where(has_value, r, np.nan)
+
+            if partial.any():
+                r_rank = r_rank.copy()
+                r_rank[partial] = r_sort.rank(has_value, partial)
+
+            y_dev, y_ss = center_rows(y, has_value, count)
+            r_rank_dev, r_rank_ss = center_rows(r_rank, has_value, count)
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ic: np.ndarray = (x_dev * y_dev).sum(axis=1) / np.sqrt(x_ss * y_ss)
+                rank_ic: np.ndarray = (rank_dev * r_rank_dev).sum(axis=1) / np.sqrt(rank_ss * r_rank_ss)
+
+            daily[f"ic_{period}"] = ic
+            daily[f"rank_ic_{period}"] = rank_ic
+
+            summary[f"ic_{period}"] = nanmean(ic)
+            summary[f"icir_{period}"] = nanmean(ic) / nanstd(ic)
+            summary[f"rank_ic_{period}"] = nanmean(rank_ic)
+            summary[f"rank_icir_{period}"] = nanmean(rank_ic) / nanstd(rank_ic)
+
+            # Mean return of all observations in each quantile
+            with np.errstate(divide="ignore", invalid="ignore"):
+                demeaned: np.ndarray = y - (np.nansum(y, axis=1) / count)[:, None]
+                mean_return: np.ndarray = (
+                    np.bincount(quantile[has_value], demeaned[has_value], quantiles + 1)
+                    / np.bincount(quantile[has_value], minlength=quantiles + 1)
+                )[1:]
+
+            quantile_returns[f"return_{period}"] = mean_return
+            summary[f"spread_{period}"] = mean_return[-1] - mean_return[0]
+
+        # Compare consecutive datetimes with factor value
+        observed: np.ndarray = count > 0
+        observed_rank: np.ndarray = rank[observed]
+        observed_quantile: np.ndarray = quantile[observed]
+
+        daily["top_turnover"] = get_turnover(observed_quantile == quantiles)
+        daily["bottom_turnover"] = get_turnover(observed_quantile == 1)
+        daily["autocorr"] = np.concatenate([[np.nan], corr_rows(observed_rank[1:], observed_rank[:-1])])
+
+        summary["top_turnover"] = nanmean(daily["top_turnover"])
+        summary["bottom_turnover"] = nanmean(daily["bottom_turnover"])
+        summary["autocorr"] = nanmean(daily["autocorr"])
+
+        for key in daily:
+            if key.startswith(("ic_", "rank_ic_")):
+                daily[key] = daily[key][observed]
+
+        summaries.append(summary)
+        dailies.append(pl.DataFrame({"datetime": datetimes.filter(observed), "name": name} | daily))
+        quantile_dfs.append(pl.DataFrame(quantile_returns))
+
+    return FactorReport(
+        summary=pl.DataFrame(summaries, infer_schema_length=None),
+        daily=pl.concat(dailies).fill_nan(None),
+        quantile_returns=pl.concat(quantile_dfs).fill_nan(None)
+    )
+
+
+class RowSort:
+    """
+    Sorted order of each row, to rank values within any subset of row
+    without sorting again
+    """
+
+    def __init__(self, a: np.ndarray) -> None:
+        """Constructor"""
+        # NaN sorted last
+        self.order: np.ndarray = np.argsort(a, axis=1)
+        values: np.ndarray = np.take_along_axis(a, self.order, axis=1)
+
+        # First and last position in sorted row of values tied with each
+        n: int = a.shape[1]
+        position: np.ndarray = np.broadcast_to(np.arange(n), a.shape)
+
+        first: np.ndarray = np.ones(a.shape, dtype=bool)
+        first[:, 1:] = values[:, 1:] != values[:, :-1]
+
+        last: np.ndarray = np.ones(a.shape, dtype=bool)
+        last[:, :-1] = first[:, 1:]
+
+        self.start: np.ndarray = np.maximum.accumulate(np.where(first, position, 0), axis=1)
+        self.end: np.ndarray = np.minimum.accumulate(np.where(last, position, n)[:, ::-1], axis=1)[:, ::-1]
+
+    def rank(self, mask: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Average rank of values within mask on rows selected, NaN outside mask"""
+        order: np.ndarray = self.order[rows]
+        kept: np.ndarray = np.take_along_axis(mask[rows], order, axis=1)
+
+        # Ties ranked by mean of their positions among values kept
+        count: np.ndarray = np.cumsum(kept, axis=1)
+        start: np.ndarray = self.start[rows]
+        before: np.ndarray = np.take_along_axis(count, start, axis=1) - np.take_along_axis(kept, start, axis=1)
+        through: np.ndarray = np.take_along_axis(count, self.end[rows], axis=1)
+
+        sorted_rank: np.ndarray = np.where(kept, (before + 1 + through) / 2, np.nan)
+
+        rank: np.ndarray = np.empty(sorted_rank.shape)
+        np.put_along_axis(rank, order, sorted_rank, axis=1)
+        return rank
+
+
+def align_index(
+    df: pl.DataFrame,
+    datetimes: pl.Series,
+    symbols: pl.Series
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get row and column in matrix of rows found in matrix, and mask of them"""
+    index: pl.DataFrame = (
+        df
+        .select(pl.col("datetime").cast(datetimes.dtype), "vt_symbol")
+        .join(datetimes.to_frame().with_row_index("row"), on="datetime", how="left", maintain_order="left")
+        .join(symbols.to_frame().with_row_index("col"), on="vt_symbol", how="left", maintain_order="left")
+    )
+
+    found: np.ndarray = (index["row"].is_not_null() & index["col"].is_not_null()).to_numpy()
+    return index["row"].to_numpy()[found], index["col"].to_numpy()[found], found
+
+
+def to_matrix(
+    s: pl.Series,
+    rows: np.ndarray,
+    cols: np.ndarray,
+    found: np.ndarray,
+    shape: tuple[int, int]
+) -> np.ndarray:
+    """Scatter values into matrix of datetime by symbol, NaN if missing"""
+    matrix: np.ndarray = np.full(shape, np.nan)
+    matrix[rows, cols] = s.cast(pl.Float64).fill_null(np.nan).to_numpy()[found]
+    return matrix
+
+
+def center_rows(a: np.ndarray, mask: np.ndarray, count: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Deviation from mean of each row within mask (0 outside), and sum of squares"""
+    a = np.where(mask, a, 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dev: np.ndarray = np.where(mask, a - (a.sum(axis=1) / count)[:, None], 0)
+
+    return dev, (dev * dev).sum(axis=1)
+
+
+def corr_rows(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Pearson correlation of each row, ignoring pairs with NaN"""
+    mask: np.ndarray = ~(np.isnan(x) | np.isnan(y))
+    count: np.ndarray = mask.sum(axis=1)
+
+    x_dev, x_ss = center_rows(x, mask, count)
+    y_dev, y_ss = center_rows(y, mask, count)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (x_dev * y_dev).sum(axis=1) / np.sqrt(x_ss * y_ss)
+
+
+def get_turnover(selected: np.ndarray) -> np.ndarray:
+    """Proportion of symbols selected on each datetime, but not on the previous"""
+    turnover: np.ndarray = np.full(len(selected), np.nan)
+
+    if len(selected) > 1:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            kept: np.ndarray = (selected[1:] & selected[:-1]).sum(axis=1)
+            turnover[1:] = 1 - kept / selected[1:].sum(axis=1)
+
+    return turnover
+
+
+def nanmean(a: np.ndarray) -> float:
+    """Mean ignoring NaN, NaN if empty"""
+    a = a[~np.isnan(a)]
+    return float(a.mean()) if len(a) else np.nan
+
+
+def nanstd(a: np.ndarray) -> float:
+    """Sample standard deviation ignoring NaN, NaN if less than two values"""
+    a = a[~np.isnan(a)]
+    return float(a.std(ddof=1)) if len(a) > 1 else np.nan
+
+
+def plot_report(report: FactorReport, name: str) -> go.Figure:
+    """Plot analysis results of a factor"""
+    summary: pl.DataFrame = report.summary.filter(pl.col("name") == name)
+    daily: pl.DataFrame = report.daily.filter(pl.col("name") == name)
+    quantile_returns: pl.DataFrame = report.quantile_returns.filter(pl.col("name") == name)
+
+    periods: list[str] = [c.removeprefix("ic_") for c in summary.columns if c.startswith("ic_")]
+
+    fig: go.Figure = make_subplots(
+        rows=4,
+        cols=1,
+        subplot_titles=[
+            f"Rank IC ({periods[0]} Period)",
+            "IC Decay",
+            "Mean Return by Quantile",
+            "Turnover and Autocorrelation"
+        ],
+        vertical_spacing=0.06
+    )
+
+    rank_ic: pl.Series = daily[f"rank_ic_{periods[0]}"]
+    fig.add_trace(go.Bar(x=daily["datetime"], y=rank_ic, name="Rank IC"), row=1, col=1)
+    fig.add_trace(
+        go.Scatter(
+            x=daily["datetime"],
+            y=rank_ic.rolling_mean(20, min_samples=1),
+            mode="lines",
+            name="Rank IC 20 MA"
+        ),
+        row=1,
+        col=1
+    )
+
+    for prefix, label in [("ic", "IC"), ("rank_ic", "Rank IC")]:
+        fig.add_trace(
+            go.Bar(
+                x=periods,
+                y=[summary[f"{prefix}_{period}"].item() for period in periods],
+                name=f"Mean {label}"
+            ),
+            row=2,
+            col=1
+        )
+
+    for period in periods:
+        fig.add_trace(
+            go.Bar(
+                x=quantile_returns["quantile"],
+                y=quantile_returns[f"return_{period}"],
+                name=f"{period} Period Return"
+            ),
+            row=3,
+            col=1
+        )
+
+    for column, label in [
+        ("top_turnover", "Top Quantile Turnover"),
+        ("bottom_turnover", "Bottom Quantile Turnover"),
+        ("autocorr", "Rank Autocorrelation")
+    ]:
+        fig.add_trace(
+            go.Scatter(x=daily["datetime"], y=daily[column], mode="lines", name=label),
+            row=4,
+            col=1
+        )
+
+    fig.update_layout(height=1500, width=1200, title=name)
+    return fig
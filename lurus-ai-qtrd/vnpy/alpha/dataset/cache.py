@@ -0,0 +1,165 @@
+"""
+Feature columns cached on disk, shared by datasets calculating the same
+expression on the same bar data
+"""
+
+import ast
+import os
+import sys
+import hashlib
+from argparse import ArgumentParser, Namespace
+from contextlib import suppress
+from datetime import datetime
+from pathlib import Path
+from uuid import uuid4
+
+import polars as pl
+
+
+# Changed when operators give different results, so old files are missed
+CACHE_VERSION: int = 1
+
+SIZE_UNITS: dict[str, int] = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+class FeatureCache:
+    """
+    Feature columns saved as Parquet files, keyed by hash of expression
+    source code in canonical form and fingerprint of bar data.
+
+    Modification time of file is updated when read, and least recently
+    used files are removed when total size exceeds max_size.
+    """
+
+    def __init__(self, cache_path: str | Path, max_size: int = 1024 ** 3) -> None:
+        """Constructor"""
+        self.cache_path: Path = Path(cache_path)
+        self.max_size: int = max_size
+
+        if not self.cache_path.exists():
+            self.cache_path.mkdir(parents=True)
+
+    def get_fingerprint(self, df: pl.DataFrame) -> str:
+        """
+        Get fingerprint of bar data, including columns, symbols and values
+        of all rows in order
+        """
+        hasher = hashlib.sha256()
+        hasher.update(str(df.schema).encode())
+        hasher.update("\n".join(df["vt_symbol"].unique().sort()).encode())
+        hasher.update(df.hash_rows(seed=0, seed_1=1, seed_2=2, seed_3=3).to_numpy().tobytes())
+        hasher.update(pl.__version__.encode())
+        return hasher.hexdigest()
+
+    def get_key(self, expression: str, fingerprint: str) -> str:
+        """Get key of expression calculated on data of fingerprint"""
+        canonical: str = ast.unparse(ast.parse(expression.strip(), mode="eval"))
+
+        hasher = hashlib.sha256()
+        hasher.update(f"{CACHE_VERSION}\n{canonical}\n{fingerprint}".encode())
+        return hasher.hexdigest()[:32]
+
+    def load(self, key: str, height: int) -> pl.Series | None:
+        """Load feature column, None if not cached"""
+        file_path: Path = self.cache_path.joinpath(f"{key}.parquet")
+
+        try:
+            s: pl.Series = pl.read_parquet(file_path).to_series()
+        except (OSError, pl.exceptions.PolarsError):
+            return None
+
+        if len(s) != height:
+            return None
+
+        # Mark as recently used, may be removed by others meanwhile
+        with suppress(OSError):
+            os.utime(file_path)
+
+        return s
+
+    def save(self, key: str, expression: str, s: pl.Series) -> None:
+        """Save feature column"""
+        file_path: Path = self.cache_path.joinpath(f"{key}.parquet")
+
+        # Written to temporary file first, so partial file is never read
+        temp_path: Path = self.cache_path.joinpath(f"{uuid4().hex}.tmp")
+        s.to_frame("data").write_parquet(temp_path, metadata={"expression": expression})
+        temp_path.replace(file_path)
+
+    def list_files(self) -> list[tuple[Path, os.stat_result]]:
+        """List cached files with stat, most recently used first"""
+        files: list[tuple[Path, os.stat_result]] = []
+
+        for file_path in self.cache_path.glob("*.parquet"):
+            try:
+                files.append((file_path, file_path.stat()))
+            except OSError:
+                continue
+
+        files.sort(key=lambda item: item[1].st_mtime, reverse=True)
+        return files
+
+    def prune(self, max_size: int) -> int:
+        """Remove least recently used files until total size within max_size, return number removed"""
+        total: int = 0
+        count: int = 0
+
+        for file_path, stat in self.list_files():
+            total += stat.st_size
+
+            if total > max_size:
+                file_path.unlink(missing_ok=True)
+                count += 1
+
+        return count
+
+    def clear(self) -> int:
+        """Remove all cached files"""
+        return self.prune(0)
+
+
+def parse_size(text: str) -> int:
+    """Parse size with unit like 512M or 2G"""
+    text = text.strip().upper().removesuffix("B")
+
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line to inspect and prune feature cache"""
+    parser: ArgumentParser = ArgumentParser(
+        prog="python -m vnpy.alpha.dataset.cache",
+        description="Inspect and prune feature cache of AlphaLab"
+    )
+    parser.add_argument("lab_path", help="path of AlphaLab")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("info", help="show number and total size of cached files")
+    subparsers.add_parser("list", help="list cached files, most recently used first")
+    prune_parser: ArgumentParser = subparsers.add_parser("prune", help="remove least recently used files")
+    prune_parser.add_argument("max_size", help="size to keep, e.g. 512M or 2G")
+    subparsers.add_parser("clear", help="remove all cached files")
+
+    args: Namespace = parser.parse_args(argv)
+    cache: FeatureCache = FeatureCache(Path(args.lab_path).joinpath("feature"))
+
+    if args.command == "info":
+        files: list[tuple[Path, os.stat_result]] = cache.list_files()
+        size: int = sum(stat.st_size for _, stat in files)
+        print(f"{len(files)} files, {size / 1024 ** 2:.1f} MB in {cache.cache_path}")
+    elif args.command == "list":
+        for file_path, stat in cache.list_files():
+            expression: str = pl.read_parquet_metadata(file_path).get("expression", "")
+            used: str = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{file_path.stem}  {stat.st_size / 1024:>10.1f} KB  {used}  {expression}")
+    elif args.command == "prune":
+        count: int = cache.prune(parse_size(args.max_size))
+        print(f"{count} files removed")
+    else:
+        print(f"{cache.clear()} files removed")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,157 @@
+"""
+Plan rows to recalculate when new bars are appended to dataset
+"""
+
+import ast
+from collections.abc import Callable
+
+import numpy as np
+import polars as pl
+
+from .utility import BATCH_GROUP, load_operators
+
+
+# Operators referring to rows before (positive window) or after (negative
+# window) the current row, instead of rows inside a window ending with it
+SHIFT_OPERATORS: set[str] = {"ts_delay", "ts_delta"}
+
+
+def get_children(node: ast.expr) -> list[ast.expr]:
+    """Get arguments of call or operands of other node"""
+    if isinstance(node, ast.Call):
+        return node.args + [kw.value for kw in node.keywords]
+
+    return [child for child in ast.iter_child_nodes(node) if isinstance(child, ast.expr)]
+
+
+def get_operator_window(node: ast.expr, operators: dict[str, tuple[Callable, str]]) -> tuple[int, int] | None:
+    """
+    Get number of rows before and after current row of the same symbol
+    needed by operator itself, None if depending on all history.
+    """
+    if not isinstance(node, ast.Call):
+        return 0, 0
+
+    name: str = node.func.id if isinstance(node.func, ast.Name) else ""
+    if name not in operators:
+        return None
+
+    # TA-Lib functions are recursive or carry NaN forward
+    group: str = operators[name][1]
+    if group == BATCH_GROUP:
+        return None
+    elif group != "vt_symbol":
+        return 0, 0
+
+    for arg in get_children(node):
+        try:
+            window = ast.literal_eval(arg)
+        except ValueError:
+            continue
+
+        if isinstance(window, int):
+            break
+    else:
+        # Element-wise operators like ts_log
+        return 0, 0
+
+    if name in SHIFT_OPERATORS:
+        return (window, 0) if window >= 0 else (0, -window)
+
+    return max(window - 1, 0), 0
+
+
+class UpdatePlanner:
+    """
+    Find datetime ranges for updating features after new bars appended.
+
+    Rows of each symbol are counted on its own bars, so a window reaches
+    back further in datetime for a symbol with suspended days. Each nested
+    operator moves the range by its window on every symbol, and the
+    earliest datetime is taken, so cross-section of the inner expression
+    is also complete.
+    """
+
+    def __init__(self, df: pl.DataFrame) -> None:
+        """Constructor"""
+        self.operators: dict[str, tuple[Callable, str]] = load_operators()
+
+        self.datetimes: list[np.ndarray] = [
+            data["datetime"].sort().to_numpy()
+            for data in df.select("vt_symbol", "datetime").partition_by("vt_symbol")
+        ]
+
+        self.shifts: dict[tuple[np.datetime64, int], np.datetime64] = {}
+
+    def shift(self, start: np.datetime64, rows: int) -> np.datetime64:
+        """Get earliest datetime of rows before start by number of rows in any symbol"""
+        if not rows:
+            return start
+
+        key: tuple[np.datetime64, int] = (start, rows)
+        if key in self.shifts:
+            return self.shifts[key]
+
+        result: np.datetime64 = start
+        for datetimes in self.datetimes:
+            ix: int = int(np.searchsorted(datetimes, start))
+
+            # Symbol without data after start is not referred
+            if ix < len(datetimes):
+                result = min(result, datetimes[max(ix - rows, 0)])
+
+        self.shifts[key] = result
+        return result
+
+    def get_update_start(self, expression: str, new_start: np.datetime64) -> np.datetime64 | None:
+        """
+        Get earliest datetime of rows whose value is changed by bars after
+        new_start, None if not affected.
+        """
+        tree: ast.Expression = ast.parse(expression.strip(), mode="eval")
+        return self.get_node_update_start(tree.body, new_start)
+
+    def get_node_update_start(self, node: ast.expr, new_start: np.datetime64) -> np.datetime64 | None:
+        """"""
+        if isinstance(node, ast.Name):
+            return new_start
+
+        starts: list[np.datetime64] = []
+        for child in get_children(node):
+            child_start: np.datetime64 | None = self.get_node_update_start(child, new_start)
+            if child_start is not None:
+                starts.append(child_start)
+
+        if not starts:
+            return None
+
+        window: tuple[int, int] | None = get_operator_window(node, self.operators)
+        after: int = window[1] if window else 0
+
+        return self.shift(min(starts), after)
+
+    def get_data_start(self, expression: str, start: np.datetime64) -> np.datetime64 | None:
+        """
+        Get earliest datetime of source data needed to calculate rows from
+        start, None if all history is needed.
+        """
+        tree: ast.Expression = ast.parse(expression.strip(), mode="eval")
+        return self.get_node_data_start(tree.body, start)
+
+    def get_node_data_start(self, node: ast.expr, start: np.datetime64) -> np.datetime64 | None:
+        """"""
+        window: tuple[int, int] | None = get_operator_window(node, self.operators)
+        if window is None:
+            return None
+
+        start = self.shift(start, window[0])
+        result: np.datetime64 = start
+
+        for child in get_children(node):
+            child_start: np.datetime64 | None = self.get_node_data_start(child, start)
+            if child_start is None:
+                return None
+
+            result = min(result, child_start)
+
+        return result
@@ -11,10 +11,7 @@ def process_drop_na(df: pl.DataFrame, names: list[str] | None = None) -> pl.Data
     if names is None:
         names = df.columns[2:-1]
 
-    for name in names:
-        df = df.with_columns(
-            pl.col(name).fill_nan(None)
-        )
+    df = df.with_columns([pl.col(name).fill_nan(None) for name in names])
     df = df.drop_nulls(subset=names)
     return df
 
@@ -37,89 +34,125 @@ def process_cs_norm(
     method: str         # robust/zscore
 ) -> pl.DataFrame:
     """Cross-sectional normalization"""
-    _df: pl.DataFrame = df.fill_nan(None)
+    # Statistics ignore NaN
+    values: list[pl.Expr] = [pl.col(col).fill_nan(None) for col in names]
+
+    # Statistics of all columns aggregated by datetime in one pass
+    lf: pl.LazyFrame = df.lazy()
 
     # Median method
     if method == "robust":
-        for col in names:
-            df = df.with_columns(
-                _df.select(
-                    (pl.col(col) - pl.col(col).median()).over("datetime").alias(col),
-                )
-            )
-
-            df = df.with_columns(
-                df.select(
-                    pl.col(col).abs().median().over("datetime").alias("mad"),
-                )
-            )
-
-            df = df.with_columns(
-                (pl.col(col) / pl.col("mad") / 1.4826).clip(-3, 3).alias(col)
-            ).drop(["mad"])
+        lf = join_stats(lf, [value.median().alias(f"__median_{i}") for i, value in enumerate(values)])
+
+        deviations: list[pl.Expr] = [value - pl.col(f"__median_{i}") for i, value in enumerate(values)]
+        lf = join_stats(lf, [deviation.abs().median().alias(f"__mad_{i}") for i, deviation in enumerate(deviations)])
+
+        exprs: list[pl.Expr] = [
+            (deviation / pl.col(f"__mad_{i}") / 1.4826).clip(-3, 3).alias(col)
+            for i, (col, deviation) in enumerate(zip(names, deviations, strict=True))
+        ]
     # Z-Score method
     else:
-        for col in names:
-            df = df.with_columns(
-                _df.select(
-                    pl.col(col).mean().over("datetime").alias("mean"),
-                    pl.col(col).std().over("datetime").alias("std"),
-                )
-            )
-
-            df = df.with_columns(
-                (pl.col(col) - pl.col("mean")) / pl.col("std").alias(col)
-            ).drop(["mean", "std"])
+        lf = join_stats(
+            lf,
+            [value.mean().alias(f"__mean_{i}") for i, value in enumerate(values)]
+            + [value.std().alias(f"__std_{i}") for i, value in enumerate(values)]
+        )
 
-    return df
+        exprs = [
+            ((pl.col(col) - pl.col(f"__mean_{i}")) / pl.col(f"__std_{i}")).alias(col)
+            for i, col in enumerate(names)
+        ]
 
+    return lf.with_columns(exprs).select(df.columns).collect()
 
-def process_robust_zscore_norm(
-    df: pl.DataFrame,
-    fit_start_time: datetime | str | None = None,
-    fit_end_time: datetime | str | None = None,
-    clip_outlier: bool = True
-) -> pl.DataFrame:
-    """Robust Z-Score normalization"""
-    _df: pl.DataFrame = df.fill_nan(None)
 
-    if fit_start_time and fit_end_time:
-        fit_start_time = to_datetime(fit_start_time)
-        fit_end_time = to_datetime(fit_end_time)
-        _df = _df.filter((pl.col("datetime") >= fit_start_time) & (pl.col("datetime") <= fit_end_time))
+def join_stats(lf: pl.LazyFrame, aggs: list[pl.Expr]) -> pl.LazyFrame:
+    """Join statistics aggregated by datetime to each row"""
+    stats: pl.LazyFrame = lf.group_by("datetime").agg(aggs)
+    return lf.join(stats, on="datetime", how="left", maintain_order="left")
 
-    cols = df.columns[2:-1]
-    X = _df.select(cols).to_numpy()
 
-    mean_train = np.nanmedian(X, axis=0)
-    std_train = np.nanmedian(np.abs(X - mean_train), axis=0)
-    std_train += 1e-12
-    std_train *= 1.4826
+class RobustZScoreNorm:
+    """
+    Robust Z-Score normalization with median and MAD of training data.
 
-    for name in cols:
-        normalized_col = (
-            (pl.col(name) - mean_train[cols.index(name)]) / std_train[cols.index(name)]
-        ).cast(pl.Float64)
+    Statistics are fitted on the first call (or by fit), then kept in the
+    processor saved with dataset, so inference data is transformed with
+    the same statistics without fitting again.
+    """
 
-        if clip_outlier:
-            normalized_col = normalized_col.clip(-3, 3)
+    def __init__(
+        self,
+        fit_start_time: datetime | str | None = None,
+        fit_end_time: datetime | str | None = None,
+        clip_outlier: bool = True
+    ) -> None:
+        """Constructor"""
+        self.fit_start_time: datetime | str | None = fit_start_time
+        self.fit_end_time: datetime | str | None = fit_end_time
+        self.clip_outlier: bool = clip_outlier
 
-        df = df.with_columns(normalized_col.alias(name))
+        # Fitted statistics of each column
+        self.mean: dict[str, float] = {}
+        self.std: dict[str, float] = {}
 
-    return df
+    def __call__(self, df: pl.DataFrame) -> pl.DataFrame:
+        """Fit if not fitted yet, then transform"""
+        if not self.mean:
+            self.fit(df)
+        return self.transform(df)
+
+    def fit(self, df: pl.DataFrame) -> None:
+        """Calculate statistics of feature columns within fit period"""
+        cols: list[str] = df.columns[2:-1]
+
+        if self.fit_start_time and self.fit_end_time:
+            fit_start_time: datetime = to_datetime(self.fit_start_time)
+            fit_end_time: datetime = to_datetime(self.fit_end_time)
+            df = df.filter((pl.col("datetime") >= fit_start_time) & (pl.col("datetime") <= fit_end_time))
+
+        X: np.ndarray = df.select(cols).fill_nan(None).to_numpy()
+
+        mean_train: np.ndarray = np.nanmedian(X, axis=0)
+        std_train: np.ndarray = np.nanmedian(np.abs(X - mean_train), axis=0)
+        std_train += 1e-12
+        std_train *= 1.4826
+
+        self.mean = dict(zip(cols, mean_train.tolist(), strict=True))
+        self.std = dict(zip(cols, std_train.tolist(), strict=True))
+
+    def transform(self, df: pl.DataFrame) -> pl.DataFrame:
+        """Normalize feature columns with fitted statistics in one pass"""
+        exprs: list[pl.Expr] = []
+
+        for col, mean in self.mean.items():
+            expr: pl.Expr = ((pl.col(col) - mean) / self.std[col]).cast(pl.Float64)
+
+            if self.clip_outlier:
+                expr = expr.clip(-3, 3)
+
+            exprs.append(expr.alias(col))
+
+        return df.with_columns(exprs)
+
+
+def process_robust_zscore_norm(
+    df: pl.DataFrame,
+    fit_start_time: datetime | str | None = None,
+    fit_end_time: datetime | str | None = None,
+    clip_outlier: bool = True
+) -> pl.DataFrame:
+    """Robust Z-Score normalization, fitted again on every call"""
+    return RobustZScoreNorm(fit_start_time, fit_end_time, clip_outlier)(df)
 
 
 def process_cs_rank_norm(df: pl.DataFrame, names: list[str]) -> pl.DataFrame:
     """Cross-sectional rank normalization"""
-    _df: pl.DataFrame = df.fill_nan(None)
-
-    _df = _df.with_columns([
-        ((pl.col(col).rank("average").over("datetime") / pl.col("datetime").count().over("datetime")) - 0.5) * 3.46
+    return df.with_columns([
+        (
+            (pl.col(col).fill_nan(None).rank("average").over("datetime") / pl.col("datetime").count().over("datetime"))
+            - 0.5
+        ) * 3.46
         for col in names
     ])
-
-    df = df.with_columns([
-        _df[col].alias(col) for col in names
-    ])
-
-    return df
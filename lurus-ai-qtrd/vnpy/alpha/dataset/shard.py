@@ -0,0 +1,183 @@
+"""
+Plan expressions calculated on shards of data, to bound working memory
+"""
+
+import ast
+import sys
+from collections.abc import Callable, Iterable
+from pathlib import Path
+
+import polars as pl
+
+from .utility import load_operators
+
+
+class ShardPlan:
+    """
+    Expressions split for calculating on shards of data.
+
+    Sub-expression without cross-section operator only refers to bars of
+    the same symbol, so is calculated on shards of symbols with all their
+    history. Expression containing cross-section operator is rewritten
+    with its time-series sub-expressions replaced by columns of the first
+    pass, then calculated on partitions of datetime with all symbols.
+
+    Time-series operator on result of cross-section needs both complete,
+    so expression like that is calculated on whole data of the columns it
+    refers in the last pass.
+    """
+
+    def __init__(self, expressions: list[tuple[str, str]]) -> None:
+        """Constructor"""
+        self.operators: dict[str, tuple[Callable, str]] = load_operators()
+
+        # Expressions calculated on symbol shards, including final features
+        # of time-series only and replaced sub-expressions
+        self.series: dict[str, str] = {}
+        self.series_names: dict[str, str] = {}
+
+        # Rewritten expressions calculated on datetime partitions
+        self.sections: dict[str, str] = {}
+
+        # Rewritten expressions calculated on whole data
+        self.mixed: dict[str, str] = {}
+
+        for name, expression in expressions:
+            self.add_expression(name, expression)
+
+    def add_expression(self, name: str, expression: str) -> None:
+        """Split expression into parts"""
+        tree: ast.Expression = ast.parse(expression.strip(), mode="eval")
+
+        if not self.has_group(tree.body, "datetime"):
+            self.series[name] = expression
+            return
+
+        rewritten: str = ast.unparse(self.rewrite(tree.body))
+
+        if self.has_group(ast.parse(rewritten, mode="eval").body, ""):
+            self.mixed[name] = rewritten
+        else:
+            self.sections[name] = rewritten
+
+    def has_group(self, node: ast.expr, group: str) -> bool:
+        """
+        Check if node contains operator with window over group, or any
+        window except cross-section if group is empty
+        """
+        for child in ast.walk(node):
+            if not isinstance(child, ast.Call) or not isinstance(child.func, ast.Name):
+                continue
+
+            operator: tuple[Callable, str] | None = self.operators.get(child.func.id, None)
+            if not operator:
+                continue
+
+            if group and operator[1] == group:
+                return True
+            elif not group and operator[1] not in {"", "datetime"}:
+                return True
+
+        return False
+
+    def rewrite(self, node: ast.expr) -> ast.expr:
+        """Replace maximal time-series sub-expressions with columns"""
+        has_name: bool = any(isinstance(child, ast.Name) for child in ast.walk(node))
+
+        # Constant arguments like window are kept
+        if not has_name:
+            return node
+
+        if not self.has_group(node, "datetime"):
+            return ast.Name(id=self.add_series(node), ctx=ast.Load())
+
+        if isinstance(node, ast.Call):
+            node.args = [self.rewrite(arg) for arg in node.args]
+            for keyword in node.keywords:
+                keyword.value = self.rewrite(keyword.value)
+            return node
+
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, ast.expr):
+                setattr(node, field, self.rewrite(value))
+            elif isinstance(value, list):
+                setattr(node, field, [self.rewrite(v) if isinstance(v, ast.expr) else v for v in value])
+
+        return node
+
+    def add_series(self, node: ast.expr) -> str:
+        """Add sub-expression calculated on symbol shards, return its column name"""
+        key: str = ast.unparse(node)
+
+        name: str | None = self.series_names.get(key, None)
+        if not name:
+            name = f"__series_{len(self.series_names)}"
+            self.series_names[key] = name
+            self.series[name] = key
+
+        return name
+
+
+def get_names(expressions: Iterable[str]) -> list[str]:
+    """Get names of columns referred by expressions"""
+    names: set[str] = set()
+
+    for expression in expressions:
+        tree: ast.Expression = ast.parse(expression, mode="eval")
+        nodes: list[ast.AST] = list(ast.walk(tree))
+
+        # Function names are excluded
+        funcs: set[int] = {id(node.func) for node in nodes if isinstance(node, ast.Call)}
+        names.update(node.id for node in nodes if isinstance(node, ast.Name) and id(node) not in funcs)
+
+    return sorted(names)
+
+
+def split_by_rows(df: pl.DataFrame, column: str, max_rows: int) -> list[pl.Series]:
+    """Split values of column into groups, each with rows no more than max_rows if possible"""
+    counts: pl.DataFrame = df.group_by(column, maintain_order=True).len().sort(column)
+
+    groups: list[pl.Series] = []
+    start: int = 0
+    rows: int = 0
+
+    for ix, count in enumerate(counts["len"]):
+        if rows and rows + count > max_rows:
+            groups.append(counts[column][start:ix])
+            start = ix
+            rows = 0
+        rows += count
+
+    if rows:
+        groups.append(counts[column][start:])
+
+    return groups
+
+
+def read_columns(files: list[Path], names: list[str]) -> list[pl.Series]:
+    """
+    Read columns from files in order of source rows, one column at a time
+    so only one is copied when reordered
+    """
+    if not files or not names:
+        return []
+
+    lf: pl.LazyFrame = pl.scan_parquet(files)
+    order: pl.Series = lf.select("__row").collect().to_series().arg_sort()
+
+    return [lf.select(name).collect().to_series().gather(order) for name in names]
+
+
+def get_peak_rss() -> float:
+    """Peak resident memory of this process in MB, 0 if not supported"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+
+    usage: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Bytes on macOS, kilobytes on Linux
+    if sys.platform == "darwin":
+        return usage / 1024 ** 2
+    return usage / 1024
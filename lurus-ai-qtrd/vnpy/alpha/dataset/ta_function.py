@@ -2,41 +2,425 @@
 Technical Analysis Operators
 """
 
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
 import talib
+import numpy as np
 import polars as pl
-import pandas as pd
 
 from .utility import DataProxy
 
 
-def to_pd_series(feature: DataProxy) -> pd.Series:
-    """Convert to pandas.Series data structure"""
-    series: pd.Series = feature.df.to_pandas().set_index(["datetime", "vt_symbol"])["data"]
-    return series
+# TA-Lib releases GIL while calculating, so symbols are split into
+# several parts running in threads
+MAX_WORKERS: int = min(8, os.cpu_count() or 1)
+
+executor: ThreadPoolExecutor | None = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get thread pool shared by all operators"""
+    global executor
+
+    if executor is None:
+        executor = ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="ta_function")
+
+    return executor
+
+
+def calculate_by_symbol(
+    inputs: list[DataProxy],
+    func: Callable[..., np.ndarray | tuple[np.ndarray, ...]],
+    fields: list[str] | None = None
+) -> DataProxy:
+    """
+    Run TA-Lib function on contiguous data of each symbol.
+
+    Rows are stably sorted by symbol so data of each symbol is a slice of
+    NumPy arrays in time order, then results are put back to original rows.
+    If fields are given, func returns one array for each field, and result
+    is a struct of them.
+    """
+    names: list[str] = [f"input_{i}" for i in range(len(inputs))]
+
+    dtype: pl.DataType = pl.Float64
+    if fields:
+        dtype = pl.Struct({field: pl.Float64 for field in fields})
+
+    def calculate(s: pl.Series) -> pl.Series:
+        """"""
+        df: pl.DataFrame = (
+            s.struct.unnest()
+            .with_row_index("index")
+            .sort("vt_symbol", maintain_order=True)
+        )
+
+        arrays: list[np.ndarray] = [df[name].cast(pl.Float64).to_numpy() for name in names]
+        counts: pl.Series = df.group_by("vt_symbol", maintain_order=True).len()["len"]
+        offsets: list[int] = [0, *np.cumsum(counts.to_numpy()).tolist()]
+
+        results: np.ndarray = np.full((len(fields or [None]), len(df)), np.nan)
+
+        def run(symbol_offsets: list[int]) -> None:
+            """Calculate a part of symbols"""
+            for start, end in zip(symbol_offsets[:-1], symbol_offsets[1:], strict=True):
+                values = func(*[array[start: end] for array in arrays])
+                results[:, start: end] = values
+
+        # Split symbols into parts with similar number of rows
+        parts: int = min(MAX_WORKERS, len(counts)) or 1
+        bounds: np.ndarray = np.searchsorted(offsets, np.linspace(0, len(df), parts + 1))
+        list(get_executor().map(run, [offsets[a: b + 1] for a, b in zip(bounds[:-1], bounds[1:], strict=True)]))
+
+        output: np.ndarray = np.empty_like(results)
+        output[:, df["index"].to_numpy()] = results
+
+        if not fields:
+            return pl.Series(s.name, output[0], nan_to_null=True)
+
+        columns: list[pl.Series] = [
+            pl.Series(field, values, nan_to_null=True) for field, values in zip(fields, output, strict=True)
+        ]
+        return pl.DataFrame(columns).to_struct(s.name)
+
+    data: pl.Expr = pl.struct(
+        pl.col("vt_symbol"),
+        *[proxy.expr.alias(name) for proxy, name in zip(inputs, names, strict=True)]
+    )
+    return DataProxy(data.map_batches(calculate, return_dtype=dtype))
+
+
+def ta_sma(close: DataProxy, window: int) -> DataProxy:
+    """Calculate simple moving average by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.SMA(cl, window))
+
+
+def ta_ema(close: DataProxy, window: int) -> DataProxy:
+    """Calculate exponential moving average by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.EMA(cl, window))
+
+
+def ta_kama(close: DataProxy, window: int) -> DataProxy:
+    """Calculate Kaufman adaptive moving average by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.KAMA(cl, window))
+
+
+def ta_wma(close: DataProxy, window: int) -> DataProxy:
+    """Calculate weighted moving average by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.WMA(cl, window))
+
+
+def ta_apo(close: DataProxy, fast_period: int, slow_period: int) -> DataProxy:
+    """Calculate APO indicator by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.APO(cl, fast_period, slow_period))
+
 
+def ta_ppo(close: DataProxy, fast_period: int, slow_period: int) -> DataProxy:
+    """Calculate PPO indicator by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.PPO(cl, fast_period, slow_period))
 
-def to_pl_dataframe(series: pd.Series) -> pl.DataFrame:
-    """Convert to polars.DataFrame data structure"""
-    return pl.from_pandas(series.reset_index().rename(columns={0: "data"}))
+
+def ta_cmo(close: DataProxy, window: int) -> DataProxy:
+    """Calculate CMO indicator by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.CMO(cl, window))
+
+
+def ta_mom(close: DataProxy, window: int) -> DataProxy:
+    """Calculate momentum by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.MOM(cl, window))
+
+
+def ta_roc(close: DataProxy, window: int) -> DataProxy:
+    """Calculate rate of change by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.ROC(cl, window))
+
+
+def ta_rocp(close: DataProxy, window: int) -> DataProxy:
+    """Calculate rate of change percentage by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.ROCP(cl, window))
+
+
+def ta_rocr(close: DataProxy, window: int) -> DataProxy:
+    """Calculate rate of change ratio by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.ROCR(cl, window))
+
+
+def ta_trix(close: DataProxy, window: int) -> DataProxy:
+    """Calculate TRIX indicator by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.TRIX(cl, window))
+
+
+def ta_std(close: DataProxy, window: int) -> DataProxy:
+    """Calculate standard deviation by contract"""
+    return calculate_by_symbol([close], lambda cl: talib.STDDEV(cl, window))
 
 
 def ta_rsi(close: DataProxy, window: int) -> DataProxy:
     """Calculate RSI indicator by contract"""
-    close_: pd.Series = to_pd_series(close)
+    return calculate_by_symbol([close], lambda cl: talib.RSI(cl, window))
+
+
+def ta_obv(close: DataProxy, volume: DataProxy) -> DataProxy:
+    """Calculate on balance volume by contract"""
+    return calculate_by_symbol([close, volume], talib.OBV)
 
-    result: pd.Series = talib.RSI(close_, timeperiod=window)   # type: ignore
 
-    df: pl.DataFrame = to_pl_dataframe(result)
-    return DataProxy(df)
+def ta_cci(high: DataProxy, low: DataProxy, close: DataProxy, window: int) -> DataProxy:
+    """Calculate CCI indicator by contract"""
+    return calculate_by_symbol([high, low, close], lambda hi, lo, cl: talib.CCI(hi, lo, cl, window))
 
 
 def ta_atr(high: DataProxy, low: DataProxy, close: DataProxy, window: int) -> DataProxy:
     """Calculate ATR indicator by contract"""
-    high_: pd.Series = to_pd_series(high)
-    low_: pd.Series = to_pd_series(low)
-    close_: pd.Series = to_pd_series(close)
+    return calculate_by_symbol([high, low, close], lambda hi, lo, cl: talib.ATR(hi, lo, cl, window))
+
+
+def ta_natr(high: DataProxy, low: DataProxy, close: DataProxy, window: int) -> DataProxy:
+    """Calculate normalized ATR indicator by contract"""
+    return calculate_by_symbol([high, low, close], lambda hi, lo, cl: talib.NATR(hi, lo, cl, window))
+
+
+def ta_trange(high: DataProxy, low: DataProxy, close: DataProxy) -> DataProxy:
+    """Calculate true range by contract"""
+    return calculate_by_symbol([high, low, close], talib.TRANGE)
+
+
+def ta_adx(high: DataProxy, low: DataProxy, close: DataProxy, window: int) -> DataProxy:
+    """Calculate ADX indicator by contract"""
+    return calculate_by_symbol([high, low, close], lambda hi, lo, cl: talib.ADX(hi, lo, cl, window))
+
+
+def ta_adxr(high: DataProxy, low: DataProxy, close: DataProxy, window: int) -> DataProxy:
+    """Calculate ADXR indicator by contract"""
+    return calculate_by_symbol([high, low, close], lambda hi, lo, cl: talib.ADXR(hi, lo, cl, window))
+
+
+def ta_dx(high: DataProxy, low: DataProxy, close: DataProxy, window: int) -> DataProxy:
+    """Calculate DX indicator by contract"""
+    return calculate_by_symbol([high, low, close], lambda hi, lo, cl: talib.DX(hi, lo, cl, window))
+
+
+def ta_minus_di(high: DataProxy, low: DataProxy, close: DataProxy, window: int) -> DataProxy:
+    """Calculate minus directional indicator by contract"""
+    return calculate_by_symbol([high, low, close], lambda hi, lo, cl: talib.MINUS_DI(hi, lo, cl, window))
+
+
+def ta_plus_di(high: DataProxy, low: DataProxy, close: DataProxy, window: int) -> DataProxy:
+    """Calculate plus directional indicator by contract"""
+    return calculate_by_symbol([high, low, close], lambda hi, lo, cl: talib.PLUS_DI(hi, lo, cl, window))
+
+
+def ta_minus_dm(high: DataProxy, low: DataProxy, window: int) -> DataProxy:
+    """Calculate minus directional movement by contract"""
+    return calculate_by_symbol([high, low], lambda hi, lo: talib.MINUS_DM(hi, lo, window))
+
+
+def ta_plus_dm(high: DataProxy, low: DataProxy, window: int) -> DataProxy:
+    """Calculate plus directional movement by contract"""
+    return calculate_by_symbol([high, low], lambda hi, lo: talib.PLUS_DM(hi, lo, window))
+
+
+def ta_willr(high: DataProxy, low: DataProxy, close: DataProxy, window: int) -> DataProxy:
+    """Calculate Williams' %R by contract"""
+    return calculate_by_symbol([high, low, close], lambda hi, lo, cl: talib.WILLR(hi, lo, cl, window))
+
+
+def ta_ultosc(
+    high: DataProxy,
+    low: DataProxy,
+    close: DataProxy,
+    time_period1: int = 7,
+    time_period2: int = 14,
+    time_period3: int = 28
+) -> DataProxy:
+    """Calculate ultimate oscillator by contract"""
+    return calculate_by_symbol(
+        [high, low, close],
+        lambda hi, lo, cl: talib.ULTOSC(hi, lo, cl, time_period1, time_period2, time_period3)
+    )
+
+
+def ta_aroonosc(high: DataProxy, low: DataProxy, window: int) -> DataProxy:
+    """Calculate Aroon oscillator by contract"""
+    return calculate_by_symbol([high, low], lambda hi, lo: talib.AROONOSC(hi, lo, window))
+
+
+def ta_mfi(high: DataProxy, low: DataProxy, close: DataProxy, volume: DataProxy, window: int) -> DataProxy:
+    """Calculate money flow index by contract"""
+    return calculate_by_symbol([high, low, close, volume], lambda hi, lo, cl, vo: talib.MFI(hi, lo, cl, vo, window))
+
+
+def ta_ad(high: DataProxy, low: DataProxy, close: DataProxy, volume: DataProxy) -> DataProxy:
+    """Calculate Chaikin A/D line by contract"""
+    return calculate_by_symbol([high, low, close, volume], talib.AD)
+
+
+def ta_adosc(
+    high: DataProxy,
+    low: DataProxy,
+    close: DataProxy,
+    volume: DataProxy,
+    fast_period: int,
+    slow_period: int
+) -> DataProxy:
+    """Calculate Chaikin A/D oscillator by contract"""
+    return calculate_by_symbol(
+        [high, low, close, volume],
+        lambda hi, lo, cl, vo: talib.ADOSC(hi, lo, cl, vo, fast_period, slow_period)
+    )
+
+
+def ta_bop(open: DataProxy, high: DataProxy, low: DataProxy, close: DataProxy) -> DataProxy:
+    """Calculate balance of power by contract"""
+    return calculate_by_symbol([open, high, low, close], talib.BOP)
+
+
+def ta_sar(high: DataProxy, low: DataProxy, acceleration: float, maximum: float) -> DataProxy:
+    """Calculate parabolic SAR by contract"""
+    return calculate_by_symbol([high, low], lambda hi, lo: talib.SAR(hi, lo, acceleration, maximum))
+
+
+def get_macd(close: DataProxy, fast_period: int, slow_period: int, signal_period: int) -> DataProxy:
+    """Calculate MACD, signal and histogram by contract"""
+    return calculate_by_symbol(
+        [close],
+        lambda cl: talib.MACD(cl, fast_period, slow_period, signal_period),
+        ["macd", "signal", "hist"]
+    )
+
+
+def ta_macd(close: DataProxy, fast_period: int, slow_period: int, signal_period: int) -> DataProxy:
+    """Calculate MACD line by contract"""
+    return DataProxy(get_macd(close, fast_period, slow_period, signal_period).expr.struct.field("macd"))
+
+
+def ta_macd_signal(close: DataProxy, fast_period: int, slow_period: int, signal_period: int) -> DataProxy:
+    """Calculate MACD signal line by contract"""
+    return DataProxy(get_macd(close, fast_period, slow_period, signal_period).expr.struct.field("signal"))
+
+
+def ta_macd_hist(close: DataProxy, fast_period: int, slow_period: int, signal_period: int) -> DataProxy:
+    """Calculate MACD histogram by contract"""
+    return DataProxy(get_macd(close, fast_period, slow_period, signal_period).expr.struct.field("hist"))
+
+
+def get_boll(close: DataProxy, window: int, dev: float) -> DataProxy:
+    """Calculate Bollinger channel by contract"""
+    def calculate(cl: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """"""
+        mid: np.ndarray = talib.SMA(cl, window)
+        std: np.ndarray = talib.STDDEV(cl, window, 1)
+        return mid + std * dev, mid - std * dev
+
+    return calculate_by_symbol([close], calculate, ["up", "down"])
+
+
+def ta_boll_up(close: DataProxy, window: int, dev: float) -> DataProxy:
+    """Calculate up line of Bollinger channel by contract"""
+    return DataProxy(get_boll(close, window, dev).expr.struct.field("up"))
+
+
+def ta_boll_down(close: DataProxy, window: int, dev: float) -> DataProxy:
+    """Calculate down line of Bollinger channel by contract"""
+    return DataProxy(get_boll(close, window, dev).expr.struct.field("down"))
+
+
+def get_keltner(high: DataProxy, low: DataProxy, close: DataProxy, window: int, dev: float) -> DataProxy:
+    """Calculate Keltner channel by contract"""
+    def calculate(hi: np.ndarray, lo: np.ndarray, cl: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """"""
+        mid: np.ndarray = talib.SMA(cl, window)
+        atr: np.ndarray = talib.ATR(hi, lo, cl, window)
+        return mid + atr * dev, mid - atr * dev
+
+    return calculate_by_symbol([high, low, close], calculate, ["up", "down"])
+
+
+def ta_keltner_up(high: DataProxy, low: DataProxy, close: DataProxy, window: int, dev: float) -> DataProxy:
+    """Calculate up line of Keltner channel by contract"""
+    return DataProxy(get_keltner(high, low, close, window, dev).expr.struct.field("up"))
+
+
+def ta_keltner_down(high: DataProxy, low: DataProxy, close: DataProxy, window: int, dev: float) -> DataProxy:
+    """Calculate down line of Keltner channel by contract"""
+    return DataProxy(get_keltner(high, low, close, window, dev).expr.struct.field("down"))
+
+
+def get_donchian(high: DataProxy, low: DataProxy, window: int) -> DataProxy:
+    """Calculate Donchian channel by contract"""
+    return calculate_by_symbol(
+        [high, low],
+        lambda hi, lo: (talib.MAX(hi, window), talib.MIN(lo, window)),
+        ["up", "down"]
+    )
+
+
+def ta_donchian_up(high: DataProxy, low: DataProxy, window: int) -> DataProxy:
+    """Calculate up line of Donchian channel by contract"""
+    return DataProxy(get_donchian(high, low, window).expr.struct.field("up"))
+
+
+def ta_donchian_down(high: DataProxy, low: DataProxy, window: int) -> DataProxy:
+    """Calculate down line of Donchian channel by contract"""
+    return DataProxy(get_donchian(high, low, window).expr.struct.field("down"))
+
+
+def get_aroon(high: DataProxy, low: DataProxy, window: int) -> DataProxy:
+    """Calculate Aroon indicator by contract"""
+    return calculate_by_symbol(
+        [high, low],
+        lambda hi, lo: talib.AROON(hi, lo, window)[::-1],
+        ["up", "down"]
+    )
+
+
+def ta_aroon_up(high: DataProxy, low: DataProxy, window: int) -> DataProxy:
+    """Calculate Aroon up by contract"""
+    return DataProxy(get_aroon(high, low, window).expr.struct.field("up"))
+
+
+def ta_aroon_down(high: DataProxy, low: DataProxy, window: int) -> DataProxy:
+    """Calculate Aroon down by contract"""
+    return DataProxy(get_aroon(high, low, window).expr.struct.field("down"))
+
+
+def get_stoch(
+    high: DataProxy,
+    low: DataProxy,
+    close: DataProxy,
+    fastk_period: int,
+    slowk_period: int,
+    slowd_period: int
+) -> DataProxy:
+    """Calculate stochastic oscillator by contract"""
+    return calculate_by_symbol(
+        [high, low, close],
+        lambda hi, lo, cl: talib.STOCH(hi, lo, cl, fastk_period, slowk_period, 0, slowd_period, 0),
+        ["k", "d"]
+    )
+
+
+def ta_stoch_k(
+    high: DataProxy,
+    low: DataProxy,
+    close: DataProxy,
+    fastk_period: int,
+    slowk_period: int,
+    slowd_period: int
+) -> DataProxy:
+    """Calculate slow K line of stochastic oscillator by contract"""
+    return DataProxy(get_stoch(high, low, close, fastk_period, slowk_period, slowd_period).expr.struct.field("k"))
 
-    result: pd.Series = talib.ATR(high_, low_, close_, timeperiod=window)   # type: ignore
 
-    df: pl.DataFrame = to_pl_dataframe(result)
-    return DataProxy(df)
+def ta_stoch_d(
+    high: DataProxy,
+    low: DataProxy,
+    close: DataProxy,
+    fastk_period: int,
+    slowk_period: int,
+    slowd_period: int
+) -> DataProxy:
+    """Calculate slow D line of stochastic oscillator by contract"""
+    return DataProxy(get_stoch(high, low, close, fastk_period, slowk_period, slowd_period).expr.struct.field("d"))
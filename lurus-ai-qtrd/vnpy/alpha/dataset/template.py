@@ -1,23 +1,26 @@
-import time
+import tempfile
 from datetime import datetime
+from pathlib import Path
 from typing import cast
 from collections.abc import Callable
-from multiprocessing import get_context
-from multiprocessing.context import BaseContext
 
+import numpy as np
 import polars as pl
-import pandas as pd
 from tqdm import tqdm
-from alphalens.utils import get_clean_factor_and_forward_returns    # type: ignore
-from alphalens.tears import create_full_tear_sheet                  # type: ignore
 
 from ..logger import logger
 from .utility import (
     to_datetime,
+    to_filter_table,
+    filter_by_intervals,
     Segment,
-    calculate_by_expression,
-    calculate_by_polars
+    ExpressionCompiler
 )
+from .worker import WorkerPool, get_worker_pool
+from .incremental import UpdatePlanner
+from .cache import FeatureCache
+from .shard import ShardPlan, get_names, split_by_rows, read_columns, get_peak_rss
+from .analysis import FactorReport, analyze_factors, plot_report
 
 
 class AlphaDataset:
@@ -50,6 +53,7 @@ class AlphaDataset:
         self.feature_expressions: dict[str, str | pl.expr.expr.Expr] = {}
         self.feature_results: dict[str, pl.DataFrame] = {}
         self.label_expression: str = ""
+        self.filters: pl.DataFrame | None = None
 
         self.process_type: str = process_type
         self.infer_processors: list = []
@@ -87,80 +91,413 @@ class AlphaDataset:
         else:
             self.learn_processors.append(processor)
 
-    def prepare_data(self, filters: dict | None = None, max_workers: int | None = None) -> None:
+    def prepare_data(
+        self,
+        filters: pl.DataFrame | dict | None = None,
+        max_workers: int | None = None,
+        cache: FeatureCache | None = None,
+        shard_size: int | None = None
+    ) -> None:
         """
         Generate required data
+
+        Expressions are compiled together, windows shared by features are
+        calculated only once as intermediate columns, then all features are
+        calculated in one lazy query parallelized by polars itself.
+
+        If max_workers is more than 1, expression strings are split among
+        worker processes of a pool reused by later calls, which read the
+        source data from a memory mapped file.
+
+        If cache is given, expression strings already calculated on the
+        same bar data are loaded from it, and others are saved into it.
+
+        If shard_size is given, expression strings are calculated on
+        shards of about shard_size rows, with intermediate results kept in
+        temporary Parquet files. This only bounds the working memory of
+        calculating, not the peak memory: bar data is still sliced from
+        df in memory, and result_df and raw_df hold all features of all
+        symbols in memory as before. Expressions with time-series operator
+        on cross section also load the columns they refer of all rows.
+        """
+        self.filters = load_filters(filters)
+
+        logger.info("开始计算表达式因子特征")
+
+        expressions: list[tuple[str, str | pl.expr.expr.Expr]] = self.get_expressions()
+
+        if cache:
+            result_df: pl.DataFrame = self.calculate_by_cache(self.df, expressions, max_workers, cache, shard_size)
+        else:
+            result_df = self.calculate_features(self.df, expressions, max_workers, shard_size)
+
+        self.result_df, self.raw_df = self.generate_data(result_df, self.filters)
+
+        self.infer_df = self.raw_df
+        self.learn_df = self.raw_df
+
+    def update_data(
+        self,
+        df: pl.DataFrame,
+        filters: pl.DataFrame | dict | None = None,
+        max_workers: int | None = None,
+        verify: bool = False
+    ) -> None:
         """
-        # List for feature data results
-        results: list = []
+        Append new bars and update data incrementally
+
+        Lookback and lookahead of each expression are summed from windows
+        of its operators. Only rows whose features are changed by the new
+        bars (including labels referring to them) are recalculated, from
+        source data as far back as their windows reach. Expressions with
+        TA-Lib functions or of polars expression depend on all history.
+
+        Filters of prepare_data are used if not given. Processors are
+        applied again if any added. With verify, result is checked to be
+        the same as rebuilding from all data. Rolling sums carry rounding
+        error of earlier values, so after values drop by orders of
+        magnitude, ts_sum features may differ from rebuild.
+        """
+        if not self.df.is_empty() and df["datetime"].min() <= self.df["datetime"].max():     # type: ignore
+            raise ValueError("New bars must be later than existing data")
+
+        self.df = pl.concat([self.df, df.select(self.df.columns)])
+
+        if filters is not None:
+            self.filters = load_filters(filters)
+
+        # Find rows changed and source data needed
+        expressions: list[tuple[str, str | pl.expr.expr.Expr]] = self.get_expressions()
+
+        planner: UpdatePlanner = UpdatePlanner(self.df)
+        new_start: np.datetime64 = df["datetime"].to_numpy().min()
+
+        start: np.datetime64 = new_start
+        for _, expression in expressions:
+            if isinstance(expression, str):
+                update_start: np.datetime64 | None = planner.get_update_start(expression, new_start)
+            else:
+                update_start = self.df["datetime"].to_numpy().min()
+
+            if update_start is not None:
+                start = min(start, update_start)
+
+        data_start: np.datetime64 | None = start
+        for _, expression in expressions:
+            expression_start: np.datetime64 | None = None
+            if isinstance(expression, str):
+                expression_start = planner.get_data_start(expression, start)
+
+            if expression_start is None or data_start is None:
+                data_start = None
+            else:
+                data_start = min(data_start, expression_start)
+
+        source_df: pl.DataFrame = self.df
+        if data_start is not None:
+            source_df = source_df.filter(pl.col("datetime") >= data_start)
+
+        logger.info(f"增量计算表达式因子特征，使用{source_df.height}/{self.df.height}行数据")
+
+        # Replace rows changed with result of source data
+        result_df: pl.DataFrame = self.calculate_features(source_df, expressions, max_workers)
+        result_df = result_df.filter(pl.col("datetime") >= start)
+
+        result_df, raw_df = self.generate_data(result_df, self.filters)
+
+        self.result_df = pl.concat([self.result_df.filter(pl.col("datetime") < start), result_df])
+        self.raw_df = pl.concat([self.raw_df.filter(pl.col("datetime") < start), raw_df])
 
-        # Iterate through expressions for calculation
+        if "label" in self.result_df:
+            self.result_df = self.result_df.sort(["datetime", "vt_symbol"])
+        self.raw_df = self.raw_df.sort(["datetime", "vt_symbol"])
+
+        self.infer_df = self.raw_df
+        self.learn_df = self.raw_df
+
+        if self.infer_processors or self.learn_processors:
+            self.process_data()
+
+        if verify:
+            self.verify_data(max_workers)
+
+    def verify_data(self, max_workers: int | None = None) -> None:
+        """
+        Check data updated incrementally is the same as rebuilding from
+        all data, which is kept afterwards
+        """
+        updated: dict[str, pl.DataFrame] = {
+            "result_df": self.result_df,
+            "raw_df": self.raw_df,
+            "infer_df": self.infer_df,
+            "learn_df": self.learn_df,
+        }
+
+        self.prepare_data(self.filters, max_workers)
+        if self.infer_processors or self.learn_processors:
+            self.process_data()
+
+        for name, df in updated.items():
+            columns: list[str] = compare_data(df, getattr(self, name))
+            if columns:
+                raise ValueError(f"Incremental update of {name} differs from rebuild in columns: {columns}")
+
+        logger.info("增量更新数据与全量重建结果一致")
+
+    def get_expressions(self) -> list[tuple[str, str | pl.expr.expr.Expr]]:
+        """
+        Get feature expressions with label expression at the end
+        """
         expressions: list[tuple[str, str | pl.expr.expr.Expr]] = list(self.feature_expressions.items())
 
         if self.label_expression:
             expressions.append(("label", self.label_expression))
 
-        # Create process pool
-        logger.info("开始计算表达式因子特征")
+        return expressions
 
-        args: list[tuple] = [(self.df, name, expression) for name, expression in expressions]
+    def calculate_features(
+        self,
+        df: pl.DataFrame,
+        expressions: list[tuple[str, str | pl.expr.expr.Expr]],
+        max_workers: int | None,
+        shard_size: int | None = None
+    ) -> pl.DataFrame:
+        """
+        Calculate expressions on source data
+        """
+        if shard_size:
+            return self.calculate_by_shards(df, expressions, max_workers, shard_size)
+        elif max_workers and max_workers > 1:
+            return self.calculate_by_workers(df, expressions, max_workers)
+        else:
+            return self.calculate_by_query(df, expressions)
+
+    def calculate_by_cache(
+        self,
+        df: pl.DataFrame,
+        expressions: list[tuple[str, str | pl.expr.expr.Expr]],
+        max_workers: int | None,
+        cache: FeatureCache,
+        shard_size: int | None = None
+    ) -> pl.DataFrame:
+        """
+        Load expressions cached, calculate and save others
+        """
+        fingerprint: str = cache.get_fingerprint(df)
+        keys: dict[str, str] = {
+            name: cache.get_key(expression, fingerprint)
+            for name, expression in expressions if isinstance(expression, str)
+        }
+
+        hits: list[pl.Series] = []
+        for name, key in keys.items():
+            s: pl.Series | None = cache.load(key, df.height)
+            if s is not None:
+                hits.append(s.alias(name))
+
+        loaded: set[str] = {s.name for s in hits}
+        misses: list[tuple[str, str | pl.expr.expr.Expr]] = [(n, e) for n, e in expressions if n not in loaded]
+        logger.info(f"特征缓存命中{len(hits)}个，需计算{len(misses)}个")
 
-        context: BaseContext = get_context("spawn")
+        result_df: pl.DataFrame = df
+        if misses:
+            result_df = self.calculate_features(df, misses, max_workers, shard_size)
 
-        with context.Pool(processes=max_workers) as pool:
-            # Calculate all expressions in parallel
-            it = pool.imap(calculate_feature, args)
+            for name, expression in misses:
+                if name in keys:
+                    cache.save(keys[name], expression, result_df[name])      # type: ignore
 
-            # Collect results
-            for result in tqdm(it, total=len(args)):
-                results.append(result)
+            cache.prune(cache.max_size)
 
-        self.result_df = self.df.with_columns(results)
+        # Keep columns in the same order as expressions
+        columns: list[str] = df.columns + [name for name, _ in expressions]
+        return result_df.with_columns(hits).select(columns)
 
+    def generate_data(
+        self,
+        result_df: pl.DataFrame,
+        filters: pl.DataFrame | None
+    ) -> tuple[pl.DataFrame, pl.DataFrame]:
+        """
+        Merge result data factor features, and generate raw data
+        """
         # Merge result data factor features
         logger.info("开始合并结果数据因子特征")
 
-        label_exist: bool = "label" in self.result_df
+        label_exist: bool = "label" in result_df
         for name, feature_result in tqdm(self.feature_results.items()):
             feature_result = feature_result.rename({"data": name})
-            self.result_df = self.result_df.join(feature_result, on=["datetime", "vt_symbol"], how="left")
+            result_df = result_df.join(feature_result, on=["datetime", "vt_symbol"], how="left")
 
         if label_exist:
             # Put label at the last column
-            cols: list = [col for col in self.result_df.columns if col != "label"] + ["label"]
-            self.result_df = self.result_df.select(cols).sort(["datetime", "vt_symbol"])
+            cols: list = [col for col in result_df.columns if col != "label"] + ["label"]
+            result_df = result_df.select(cols).sort(["datetime", "vt_symbol"])
 
         # Generate raw data
-        raw_df = self.result_df.fill_null(float("nan"))
+        raw_df = result_df.fill_null(float("nan"))
+
+        # Result with label is sorted already, copy of sorting is saved
+        if not label_exist:
+            raw_df = raw_df.sort(["datetime", "vt_symbol"])
 
-        if filters:
+        if filters is not None:
             logger.info("开始筛选成分股数据")
+            raw_df = filter_by_intervals(raw_df, filters)
 
-            dfs: list[pl.DataFrame] = []
+        # Only keep feature columns
+        select_columns: list[str] = ["datetime", "vt_symbol"] + raw_df.columns[self.df.width:]
+        raw_df = raw_df.select(select_columns)
 
-            for vt_symbol, ranges in tqdm(filters.items(), total=len(filters)):
-                for start, end in ranges:
-                    temp_df = raw_df.filter(
-                        (pl.col("vt_symbol") == vt_symbol)
-                        & (pl.col("datetime") >= pl.lit(start))
-                        & (pl.col("datetime") <= pl.lit(end))
-                    )
-                    dfs.append(temp_df)
+        return result_df, raw_df
 
-            raw_df = pl.concat(dfs)
+    def calculate_by_query(
+        self,
+        df: pl.DataFrame,
+        expressions: list[tuple[str, str | pl.expr.expr.Expr]]
+    ) -> pl.DataFrame:
+        """
+        Calculate all expressions in one query of this process
+        """
+        compiler: ExpressionCompiler = ExpressionCompiler(df.columns)
+        compiler.count_references([e for _, e in expressions if isinstance(e, str)])
 
-        # Only keep feature columns
-        select_columns: list[str] = ["datetime", "vt_symbol"] + raw_df.columns[self.df.width:]
-        self.raw_df = raw_df.select(select_columns).sort(["datetime", "vt_symbol"])
+        exprs: list[pl.Expr] = []
+        for name, expression in expressions:
+            if isinstance(expression, str):
+                expression = compiler.compile(expression)
+            exprs.append(expression.alias(name))
 
-        self.infer_df = self.raw_df
-        self.learn_df = self.raw_df
+        result_df: pl.DataFrame = compiler.calculate(df, exprs)
+
+        count, references, saved = compiler.get_reuse_statistics()
+        logger.info(f"公共子表达式复用{count}个，共引用{references}次，节省计算耗时约{saved:.2f}秒")
+
+        return result_df
+
+    def calculate_by_workers(
+        self,
+        df: pl.DataFrame,
+        expressions: list[tuple[str, str | pl.expr.expr.Expr]],
+        max_workers: int
+    ) -> pl.DataFrame:
+        """
+        Calculate expression strings in worker processes, and polars
+        expressions in this process
+        """
+        strings: list[tuple[str, str]] = [(n, e) for n, e in expressions if isinstance(e, str)]
+        exprs: list[pl.Expr] = [e.alias(n) for n, e in expressions if not isinstance(e, str)]
+
+        pool: WorkerPool = get_worker_pool(max_workers)
+        logger.info(f"使用{max_workers}个工作进程计算{len(strings)}个表达式")
+
+        result_df: pl.DataFrame = df
+        if strings:
+            result_df = result_df.hstack(pool.calculate(df, strings))
+
+        # Keep columns in the same order as expressions
+        columns: list[str] = df.columns + [name for name, _ in expressions]
+        return result_df.with_columns(exprs).select(columns)
+
+    def calculate_by_shards(
+        self,
+        df: pl.DataFrame,
+        expressions: list[tuple[str, str | pl.expr.expr.Expr]],
+        max_workers: int | None,
+        shard_size: int
+    ) -> pl.DataFrame:
+        """
+        Calculate expression strings on shards of symbols and then on
+        partitions of datetime, see ShardPlan.
+
+        Shards are sliced from df in memory, and results of all shards
+        are gathered into the returned frame, so only memory used by
+        intermediate columns is bounded by shard_size.
+        """
+        plan: ShardPlan = ShardPlan([(n, e) for n, e in expressions if isinstance(e, str)])
+        keys: list[str] = ["datetime", "vt_symbol"]
+
+        logger.info(
+            f"分片计算{len(plan.series)}个时序表达式、{len(plan.sections)}个截面表达式、"
+            f"{len(plan.mixed)}个混合表达式"
+        )
+
+        # Index of rows in source data, to put results back in order
+        indexed_df: pl.DataFrame = df.select(pl.int_range(pl.len(), dtype=pl.UInt32).alias("__row"), *keys)
+        keys = ["__row"] + keys
+
+        results: list[pl.Series] = []
+
+        with tempfile.TemporaryDirectory(prefix="vnpy_alpha_") as folder:
+            # Time-series expressions on symbol shards
+            series_files: list[Path] = []
+            series: list[tuple[str, str | pl.expr.expr.Expr]] = list(plan.series.items())
+
+            for symbols in tqdm(split_by_rows(df, "vt_symbol", shard_size)):
+                selected: pl.Expr = pl.col("vt_symbol").is_in(symbols.to_list())
+                shard_df: pl.DataFrame = df.filter(selected).with_columns(indexed_df.filter(selected)["__row"])
+                shard_df = self.calculate_features(shard_df, series, max_workers)
+
+                # Sorted by datetime so partitions of later pass read less
+                path: Path = Path(folder).joinpath(f"series_{len(series_files)}.parquet")
+                shard_df.select(keys + list(plan.series)).sort("datetime").write_parquet(path)
+                series_files.append(path)
+
+                del shard_df
+
+            results.extend(read_columns(series_files, [n for n, _ in expressions if n in plan.series]))
+
+            # Cross-section expressions on datetime partitions
+            section_files: list[Path] = []
+            sections: list[tuple[str, str | pl.expr.expr.Expr]] = list(plan.sections.items())
+            columns: list[str] = keys + get_names(plan.sections.values())
+
+            for datetimes in tqdm(split_by_rows(df, "datetime", shard_size) if sections else []):
+                part_df: pl.DataFrame = (
+                    pl.scan_parquet(series_files)
+                    .select(columns)
+                    .filter(pl.col("datetime").is_between(datetimes.min(), datetimes.max()))
+                    .collect()
+                )
+                part_df = self.calculate_features(part_df, sections, max_workers)
+
+                path = Path(folder).joinpath(f"section_{len(section_files)}.parquet")
+                part_df.select(keys + list(plan.sections)).write_parquet(path)
+                section_files.append(path)
+
+                del part_df
+
+            results.extend(read_columns(section_files, list(plan.sections)))
+
+            # Time-series on cross-section on whole data of columns referred
+            if plan.mixed:
+                mixed_df: pl.DataFrame = (
+                    pl.scan_parquet(series_files)
+                    .select(keys + get_names(plan.mixed.values()))
+                    .collect()
+                    .sort("__row")
+                )
+                mixed_df = self.calculate_features(mixed_df, list(plan.mixed.items()), max_workers)
+
+                results.extend(mixed_df[name] for name in plan.mixed)
+                del mixed_df
+
+        # Polars expressions on source data
+        exprs: list[pl.Expr] = [e.alias(n) for n, e in expressions if not isinstance(e, str)]
+
+        logger.info(f"分片计算完成，进程峰值内存{get_peak_rss():.0f}MB")
+
+        # Keep columns in the same order as expressions
+        columns = df.columns + [name for name, _ in expressions]
+        return df.with_columns(results).with_columns(exprs).select(columns)
 
     def process_data(self) -> None:
         """
         Process data
         """
         # Generate inference data
+        self.infer_df = self.raw_df
+
         for processor in self.infer_processors:
             self.infer_df = processor(df=self.infer_df)
 
@@ -192,9 +529,14 @@ class AlphaDataset:
         start, end = self.data_periods[segment]
         return query_by_time(self.learn_df, start, end)
 
-    def show_feature_performance(self, name: str) -> None:
+    def analyze_features(
+        self,
+        names: list[str] | None = None,
+        periods: tuple[int, ...] = (1, 5, 10),
+        quantiles: int = 10
+    ) -> FactorReport:
         """
-        Perform performance analysis for a feature
+        Analyze performance of features (all if names not given) at once
         """
         starts: list[datetime] = []
         ends: list[datetime] = []
@@ -210,34 +552,17 @@ class AlphaDataset:
         result_df: pl.DataFrame = query_by_time(self.result_df, start, end)
         learn_df: pl.DataFrame = query_by_time(self.learn_df, start, end)
 
-        merged_df = (
-            result_df
-            .select(["datetime", "vt_symbol", "close"])
-            .join(
-                learn_df.select(["datetime", "vt_symbol", name]),
-                on=["datetime", "vt_symbol"],
-                how="inner"
-            )
-        )
-
-        # Fill NaN and drop nulls
-        merged_df = merged_df.fill_nan(None).drop_nulls()
-
-        # Extract feature
-        feature_df: pd.DataFrame = merged_df.select(["datetime", "vt_symbol", name]).to_pandas()
-        feature_df.set_index(["datetime", "vt_symbol"], inplace=True)
-
-        feature_s: pd.Series = feature_df[name]
+        if names is None:
+            names = [name for name in learn_df.columns[2:] if name != "label"]
 
-        # Extract price
-        price_df: pd.DataFrame = merged_df.select(["datetime", "vt_symbol", "close"]).to_pandas()
-        price_df = price_df.pivot(index="datetime", columns="vt_symbol", values="close")
+        return analyze_factors(learn_df, result_df, names, periods, quantiles)
 
-        # Merge data
-        clean_data: pd.DataFrame = get_clean_factor_and_forward_returns(feature_s, price_df, quantiles=10)
-
-        # Perform analysis
-        create_full_tear_sheet(clean_data)
+    def show_feature_performance(self, name: str) -> None:
+        """
+        Perform performance analysis for a feature
+        """
+        report: FactorReport = self.analyze_features([name])
+        plot_report(report, name).show()
 
     def show_signal_performance(self, signal: pl.DataFrame) -> None:
         """
@@ -250,25 +575,8 @@ class AlphaDataset:
         # Select range
         df: pl.DataFrame = query_by_time(self.result_df, start, end)
 
-        # Extract feature
-        signal_df: pd.DataFrame = signal.to_pandas()
-        signal_df.set_index(["datetime", "vt_symbol"], inplace=True)
-        signal_s: pd.Series = signal_df["signal"]
-
-        # Extract price
-        price_df: pd.DataFrame = df.select(["datetime", "vt_symbol", "close"]).to_pandas()
-        price_df = price_df.pivot(index="datetime", columns="vt_symbol", values="close")
-
-        # Merge data
-        clean_data: pd.DataFrame = get_clean_factor_and_forward_returns(
-            signal_s,
-            price_df,
-            max_loss=1.0,
-            quantiles=10
-        )
-
-        # Perform analysis
-        create_full_tear_sheet(clean_data)
+        report: FactorReport = analyze_factors(signal, df, ["signal"])
+        plot_report(report, "signal").show()
 
 
 def query_by_time(df: pl.DataFrame, start: datetime | str = "", end: datetime | str = "") -> pl.DataFrame:
@@ -286,20 +594,40 @@ def query_by_time(df: pl.DataFrame, start: datetime | str = "", end: datetime |
     return df.sort(["datetime", "vt_symbol"])
 
 
-def calculate_feature(args: tuple[pl.DataFrame, str, str | pl.expr.expr.Expr]) -> pl.Series:
+def compare_data(df1: pl.DataFrame, df2: pl.DataFrame, rtol: float = 1e-9) -> list[str]:
     """
-    Calculate feature by expression
+    Get columns with different values, float rounding of rolling windows
+    started at different rows is tolerated
     """
-    start = time.time()
+    if df1.columns != df2.columns or df1.height != df2.height:
+        return df1.columns
+
+    df1 = df1.sort(["datetime", "vt_symbol"])
+    df2 = df2.sort(["datetime", "vt_symbol"])
 
-    df, name, expression = args
+    columns: list[str] = []
 
-    if isinstance(expression, pl.expr.expr.Expr):
-        result = calculate_by_polars(df, expression)["data"].alias(name)
-    else:
-        result = calculate_by_expression(df, expression)["data"].alias(name)
+    for name in df1.columns:
+        s1: pl.Series = df1[name]
+        s2: pl.Series = df2[name]
 
-    end = time.time()
-    print(f"Feature calculation {name} took: {end - start} seconds | {expression}")
+        if not s1.dtype.is_float():
+            if not s1.equals(s2):
+                columns.append(name)
+        elif (
+            not s1.is_null().equals(s2.is_null())
+            or not np.allclose(s1.to_numpy(), s2.to_numpy(), rtol=rtol, atol=rtol, equal_nan=True)
+        ):
+            columns.append(name)
 
-    return result
+    return columns
+
+
+def load_filters(filters: pl.DataFrame | dict | None) -> pl.DataFrame | None:
+    """
+    Convert filters of symbol ranges into interval table, empty dict
+    means no filter
+    """
+    if filters is None or (isinstance(filters, dict) and not filters):
+        return None
+    return to_filter_table(filters)
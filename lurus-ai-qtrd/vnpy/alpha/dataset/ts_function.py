@@ -1,296 +1,294 @@
 """Time Series Operators"""
 
-from typing import cast
+from collections.abc import Callable
 
-from scipy import stats
 import polars as pl
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
-from .utility import DataProxy
+from .utility import DataProxy, to_expr
 
 
 def ts_delay(feature: DataProxy, window: int) -> DataProxy:
     """Get the value from a fixed time in the past"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").shift(window).over("vt_symbol")
-    )
-    return DataProxy(df)
+    return DataProxy(feature.expr.shift(window).over("vt_symbol"))
+
+
+def get_sample_counts(s: pl.Series, window: int) -> np.ndarray:
+    """Count of non-null values within rolling window"""
+    cumsum: np.ndarray = np.concatenate([[0], np.cumsum(s.is_not_null().to_numpy())])
+    starts: np.ndarray = np.maximum(np.arange(1, len(s) + 1) - window, 0)
+    return cumsum[1:] - cumsum[starts]      # type: ignore
+
+
+# Rows calculated at a time in rolling kernels, to limit memory used by
+# temporary arrays of windows
+ROLLING_BLOCK = 4096
+
+
+def rolling_apply(
+    feature: DataProxy,
+    window: int,
+    func: Callable[[np.ndarray], np.ndarray],
+    min_samples: int | None = None
+) -> DataProxy:
+    """
+    Apply vectorized kernel on rolling windows of each symbol.
+
+    Same as rolling_map: windows are padded with NaN at the beginning,
+    nulls are passed as NaN, and result is null if count of non-null
+    values in window is less than min_samples (default to window).
+    Kernel is called on blocks of ROLLING_BLOCK windows.
+    """
+    if min_samples is None:
+        min_samples = window
+
+    def apply(s: pl.Series) -> pl.Series:
+        """"""
+        if s.is_empty():
+            return s.cast(pl.Float64)
+
+        data: np.ndarray = s.cast(pl.Float64).to_numpy()
+        padded: np.ndarray = np.concatenate([np.full(window - 1, np.nan), data])
+        windows: np.ndarray = sliding_window_view(padded, window)
+
+        values: np.ndarray = np.empty(len(data))
+
+        with np.errstate(all="ignore"):
+            for start in range(0, len(data), ROLLING_BLOCK):
+                values[start: start + ROLLING_BLOCK] = func(windows[start: start + ROLLING_BLOCK])
+
+        result: pl.Series = pl.Series(s.name, values, dtype=pl.Float64)
+        return result.set(pl.Series(get_sample_counts(s, window) < min_samples), None)      # type: ignore
+
+    return DataProxy(feature.expr.map_batches(apply, return_dtype=pl.Float64).over("vt_symbol"))
+
+
+def get_argmax(windows: np.ndarray) -> np.ndarray:
+    """First index of maximum value ignoring NaN, 0 if all values are NaN"""
+    isnan: np.ndarray = np.isnan(windows)
+    index: np.ndarray = np.where(isnan, -np.inf, windows).argmax(axis=1)
+
+    # NaN is picked only if other values are all -inf
+    picked: np.ndarray = isnan[np.arange(len(windows)), index] & ~isnan.all(axis=1)
+    index[picked] = (~isnan[picked]).argmax(axis=1)
+    return index
+
+
+def get_argmin(windows: np.ndarray) -> np.ndarray:
+    """First index of minimum value ignoring NaN, 0 if all values are NaN"""
+    return get_argmax(-windows)
+
+
+def get_nanmean(windows: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Same as np.nanmean, also return NaN mask and count of values"""
+    isnan: np.ndarray = np.isnan(windows)
+    count: np.ndarray = (~isnan).sum(axis=1)
+    mean: np.ndarray = np.where(isnan, 0, windows).sum(axis=1) / count
+    return mean, isnan, count
 
 
 def ts_min(feature: DataProxy, window: int) -> DataProxy:
     """Calculate the minimum value over a rolling window"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").rolling_min(window, min_samples=1).over("vt_symbol")
-    )
-    return DataProxy(df)
+    return DataProxy(feature.expr.rolling_min(window, min_samples=1).over("vt_symbol"))
 
 
 def ts_max(feature: DataProxy, window: int) -> DataProxy:
     """Calculate the maximum value over a rolling window"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").rolling_max(window, min_samples=1).over("vt_symbol")
-    )
-    return DataProxy(df)
+    return DataProxy(feature.expr.rolling_max(window, min_samples=1).over("vt_symbol"))
 
 
 def ts_argmax(feature: DataProxy, window: int) -> DataProxy:
     """Return the index of the maximum value over a rolling window"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").rolling_map(lambda s: cast(int, s.arg_max()) + 1, window).over("vt_symbol")
-    )
-    return DataProxy(df)
+    return rolling_apply(feature, window, lambda w: get_argmax(w) + 1)
 
 
 def ts_argmin(feature: DataProxy, window: int) -> DataProxy:
     """Return the index of the minimum value over a rolling window"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").rolling_map(lambda s: cast(int, s.arg_min()) + 1, window).over("vt_symbol")
-    )
-    return DataProxy(df)
+    return rolling_apply(feature, window, lambda w: get_argmin(w) + 1)
 
 
 def ts_rank(feature: DataProxy, window: int) -> DataProxy:
     """Calculate the percentile rank of the current value within the window"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").rolling_map(lambda s: stats.percentileofscore(s, s[-1]) / 100, window).over("vt_symbol")
-    )
-    return DataProxy(df)
+    def rank_func(windows: np.ndarray) -> np.ndarray:
+        """Same as stats.percentileofscore with kind of rank"""
+        score: np.ndarray = windows[:, -1:]
+        left: np.ndarray = np.count_nonzero(windows < score, axis=1)
+        right: np.ndarray = np.count_nonzero(windows <= score, axis=1)
+
+        percent: np.ndarray = (left + right + 1) * (50.0 / window)
+        percent[np.isnan(windows).any(axis=1)] = np.nan
+        return percent / 100
+
+    return rolling_apply(feature, window, rank_func)
 
 
 def ts_sum(feature: DataProxy, window: int) -> DataProxy:
     """Calculate the sum over a rolling window"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").rolling_sum(window).over("vt_symbol")
-    )
-    return DataProxy(df)
+    return DataProxy(feature.expr.rolling_sum(window).over("vt_symbol"))
 
 
 def ts_mean(feature: DataProxy, window: int) -> DataProxy:
     """Calculate the mean over a rolling window"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").rolling_map(lambda s: np.nanmean(s), window, min_samples=1).over("vt_symbol")
-    )
-    return DataProxy(df)
+    return rolling_apply(feature, window, lambda w: get_nanmean(w)[0], min_samples=1)
 
 
 def ts_std(feature: DataProxy, window: int) -> DataProxy:
     """Calculate the standard deviation over a rolling window"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").rolling_map(lambda s: np.nanstd(s, ddof=0), window, min_samples=1).over("vt_symbol")
-    )
-    return DataProxy(df)
+    def std_func(windows: np.ndarray) -> np.ndarray:
+        """Same as np.nanstd with ddof of 0"""
+        mean, isnan, count = get_nanmean(windows)
+        deviation: np.ndarray = np.where(isnan, 0, windows - mean[:, None])
+        return np.sqrt((deviation * deviation).sum(axis=1) / count)
+
+    return rolling_apply(feature, window, std_func, min_samples=1)
+
+
+# Rows calculated at a time in rolling regression, to limit memory used
+# by deviations of windows
+REGRESSION_BLOCK = 4096
+
+REGRESSION_FIELDS: list[str] = ["slope", "intercept", "rsquare", "resi"]
+
+
+def get_regression_values(data: np.ndarray, window: int) -> np.ndarray:
+    """
+    Calculate linear regression on x = 0, 1, ..., window-1 over rolling
+    window, with deviations of x and y from their mean values.
+
+    Return array of shape (4, len(data)) ordered as REGRESSION_FIELDS,
+    NaN if there is NaN in window.
+    """
+    mean_x: float = (window - 1) / 2
+    deviation_x: np.ndarray = np.arange(window) - mean_x
+    sum_x2: float = float(deviation_x @ deviation_x)
+
+    padded: np.ndarray = np.concatenate([np.full(window - 1, np.nan), data])
+    windows: np.ndarray = sliding_window_view(padded, window)
+
+    result: np.ndarray = np.empty((len(REGRESSION_FIELDS), len(data)))
+
+    for start in range(0, len(data), REGRESSION_BLOCK):
+        block: np.ndarray = windows[start: start + REGRESSION_BLOCK]
+
+        # Shift by first value, so deviations of constant window are exactly zero
+        first: np.ndarray = block[:, :1]
+        shifted: np.ndarray = block - first
+        mean_y: np.ndarray = shifted.mean(axis=1)
+        deviation_y: np.ndarray = shifted - mean_y[:, None]
+
+        sum_xy: np.ndarray = deviation_y @ deviation_x
+        sum_y2: np.ndarray = (deviation_y * deviation_y).sum(axis=1)
+
+        slope: np.ndarray = sum_xy / sum_x2
+        intercept: np.ndarray = first[:, 0] + mean_y - slope * mean_x
+        rsquare: np.ndarray = sum_xy * sum_xy / (sum_x2 * sum_y2)
+        resi: np.ndarray = deviation_y[:, -1] - slope * mean_x
+
+        result[:, start: start + len(block)] = [slope, intercept, rsquare, resi]
+
+    return result
+
+
+def get_regression(feature: DataProxy, window: int) -> DataProxy:
+    """
+    Calculate slope, intercept, R-squared and residual of linear regression
+    over a rolling window in one pass, returned as struct of REGRESSION_FIELDS.
+
+    Result is null if window is not filled with non-null values, and
+    NaN if there is NaN in window (null for R-squared).
+    """
+    dtype: pl.Struct = pl.Struct({field: pl.Float64 for field in REGRESSION_FIELDS})
+
+    def apply(s: pl.Series) -> pl.Series:
+        """"""
+        data: np.ndarray = s.cast(pl.Float64).to_numpy()
+
+        with np.errstate(all="ignore"):
+            values: np.ndarray = get_regression_values(data, window)
+
+        invalid: np.ndarray = get_sample_counts(s, window) < window
+
+        columns: list[pl.Series] = []
+        for field, value in zip(REGRESSION_FIELDS, values, strict=True):
+            mask: np.ndarray = invalid
+
+            # R-squared of constant or NaN window is null
+            if field == "rsquare":
+                mask = invalid | ~np.isfinite(value)
+
+            column: pl.Series = pl.Series(field, value, dtype=pl.Float64)
+            columns.append(column.set(pl.Series(mask), None))      # type: ignore
+
+        return pl.DataFrame(columns).to_struct(s.name)
+
+    return DataProxy(feature.expr.map_batches(apply, return_dtype=dtype).over("vt_symbol"))
 
 
 def ts_slope(feature: DataProxy, window: int) -> DataProxy:
-    """Calculate the slope of linear regression over a rolling window (optimized)"""
-    # 预计算 x 相关的常数 (x = 0, 1, 2, ..., window-1)
-    n = window
-    sum_x = n * (n - 1) / 2  # 等差数列求和
-    sum_x2 = (n - 1) * n * (2 * n - 1) / 6  # 平方和公式
-    denominator = n * sum_x2 - sum_x * sum_x
-
-    # 计算 sum(i * y[t-window+1+i]) for i in 0..window-1
-    # 等价于 sum((window-1-j) * y[t-j]) for j in 0..window-1
-    sum_xy_expr: pl.Expr = pl.sum_horizontal([
-        (window - 1 - j) * pl.col("data").shift(j)
-        for j in range(window)
-    ])
-
-    df: pl.DataFrame = feature.df.with_columns([
-        pl.col("data").rolling_sum(window, min_samples=window).over("vt_symbol").alias("sum_y"),
-        sum_xy_expr.over("vt_symbol").alias("sum_xy")
-    ])
-
-    df = df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        ((n * pl.col("sum_xy") - sum_x * pl.col("sum_y")) / denominator).alias("data")
-    )
-    return DataProxy(df)
+    """Calculate the slope of linear regression over a rolling window"""
+    return DataProxy(get_regression(feature, window).expr.struct.field("slope"))
 
 
-def ts_quantile(feature: DataProxy, window: int, quantile: float) -> DataProxy:
-    """Calculate the quantile value over a rolling window"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").rolling_map(lambda s: s.quantile(quantile=quantile, interpolation="linear"), window).over("vt_symbol")
-    )
-    return DataProxy(df)
+def ts_intercept(feature: DataProxy, window: int) -> DataProxy:
+    """Calculate the intercept of linear regression over a rolling window"""
+    return DataProxy(get_regression(feature, window).expr.struct.field("intercept"))
 
 
 def ts_rsquare(feature: DataProxy, window: int) -> DataProxy:
-    """Calculate the R-squared value of linear regression over a rolling window (optimized)"""
-    # 预计算 x 相关的常数 (x = 0, 1, 2, ..., window-1)
-    n = window
-    sum_x2 = (n - 1) * n * (2 * n - 1) / 6  # 平方和公式
-    mean_x = (n - 1) / 2
-    var_x = sum_x2 / n - mean_x * mean_x  # 总体方差
-
-    # 计算 sum(i * y[t-window+1+i]) for i in 0..window-1
-    sum_xy_expr: pl.Expr = pl.sum_horizontal([
-        (window - 1 - j) * pl.col("data").shift(j)
-        for j in range(window)
-    ])
-
-    df: pl.DataFrame = feature.df.with_columns([
-        pl.col("data").rolling_sum(window, min_samples=window).over("vt_symbol").alias("sum_y"),
-        pl.col("data").rolling_var(window, min_samples=window, ddof=0).over("vt_symbol").alias("var_y"),
-        sum_xy_expr.over("vt_symbol").alias("sum_xy")
-    ])
-
-    # mean_y 和 cov(x, y) = E(xy) - E(x)E(y)
-    df = df.with_columns([
-        (pl.col("sum_y") / n).alias("mean_y"),
-    ])
-
-    df = df.with_columns([
-        (pl.col("sum_xy") / n - mean_x * pl.col("mean_y")).alias("cov_xy")
-    ])
-
-    # r = cov(x,y) / (std_x * std_y), r^2 = cov(x,y)^2 / (var_x * var_y)
-    df = df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        (pl.col("cov_xy").pow(2) / (var_x * pl.col("var_y"))).alias("data")
-    )
-
-    df = df.with_columns(
-        pl.when(pl.col("data").is_infinite() | pl.col("data").is_nan())
-        .then(None)
-        .otherwise(pl.col("data"))
-        .alias("data")
-    )
-
-    return DataProxy(df)
+    """Calculate the R-squared value of linear regression over a rolling window"""
+    return DataProxy(get_regression(feature, window).expr.struct.field("rsquare"))
 
 
 def ts_resi(feature: DataProxy, window: int) -> DataProxy:
-    """Calculate the residual of linear regression over a rolling window (optimized)"""
-    # 预计算 x 相关的常数 (x = 0, 1, 2, ..., window-1)
-    n = window
-    sum_x = n * (n - 1) / 2  # 等差数列求和
-    sum_x2 = (n - 1) * n * (2 * n - 1) / 6  # 平方和公式
-    mean_x = (n - 1) / 2
-    denominator = n * sum_x2 - sum_x * sum_x
-
-    # 计算 sum(i * y[t-window+1+i]) for i in 0..window-1
-    sum_xy_expr: pl.Expr = pl.sum_horizontal([
-        (window - 1 - j) * pl.col("data").shift(j)
-        for j in range(window)
-    ])
-
-    df: pl.DataFrame = feature.df.with_columns([
-        pl.col("data").rolling_sum(window, min_samples=window).over("vt_symbol").alias("sum_y"),
-        sum_xy_expr.over("vt_symbol").alias("sum_xy")
-    ])
-
-    # 计算 slope 和 intercept
-    df = df.with_columns([
-        ((n * pl.col("sum_xy") - sum_x * pl.col("sum_y")) / denominator).alias("slope"),
-        (pl.col("sum_y") / n).alias("mean_y"),
-    ])
-
-    df = df.with_columns([
-        (pl.col("mean_y") - pl.col("slope") * mean_x).alias("intercept")
-    ])
-
-    # residual = y - (slope * (n-1) + intercept)，最后一个点的 x = n-1
-    df = df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        (pl.col("data") - (pl.col("slope") * (n - 1) + pl.col("intercept"))).alias("data")
-    )
-
-    return DataProxy(df)
+    """Calculate the residual of linear regression over a rolling window"""
+    return DataProxy(get_regression(feature, window).expr.struct.field("resi"))
 
 
-def ts_corr(feature1: DataProxy, feature2: DataProxy, window: int) -> DataProxy:
-    """Calculate the correlation between two features over a rolling window"""
-    df_merged: pl.DataFrame = feature1.df.join(feature2.df, on=["datetime", "vt_symbol"])
+def ts_quantile(feature: DataProxy, window: int, quantile: float) -> DataProxy:
+    """Calculate the quantile value over a rolling window"""
+    # NaN is sorted as the largest value, same as polars
+    index: float = (window - 1) * quantile
+    lower: int = int(np.floor(index))
+    upper: int = int(np.ceil(index))
+
+    def quantile_func(windows: np.ndarray) -> np.ndarray:
+        """Linear interpolation between sorted values"""
+        data: np.ndarray = np.sort(windows, axis=1)
+        if lower == upper:
+            return data[:, lower]
+        return data[:, lower] + (data[:, upper] - data[:, lower]) * (index - lower)
+
+    return rolling_apply(feature, window, quantile_func)
 
-    df: pl.DataFrame = df_merged.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.rolling_corr("data", "data_right", window_size=window, min_samples=1).over("vt_symbol").alias("data")
-    )
 
-    df = df.with_columns(
-        pl.when(pl.col("data").is_infinite()).then(None).otherwise(pl.col("data")).alias("data")
-    )
+def ts_corr(feature1: DataProxy, feature2: DataProxy, window: int) -> DataProxy:
+    """Calculate the correlation between two features over a rolling window"""
+    corr: pl.Expr = pl.rolling_corr(
+        feature1.expr, feature2.expr, window_size=window, min_samples=1
+    ).over("vt_symbol")
 
-    return DataProxy(df)
+    return DataProxy(pl.when(corr.is_infinite()).then(None).otherwise(corr))
 
 
 def ts_less(feature1: DataProxy, feature2: DataProxy | float) -> DataProxy:
     """Return the minimum value between two features"""
-    if isinstance(feature2, DataProxy):
-        df_merged: pl.DataFrame = feature1.df.join(feature2.df, on=["datetime", "vt_symbol"])
-    else:
-        df_merged = feature1.df.with_columns(pl.lit(feature2).alias("data_right"))
-
-    df: pl.DataFrame = df_merged.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.min_horizontal("data", "data_right").over("vt_symbol").alias("data")
-    )
-
-    return DataProxy(df)
+    return DataProxy(pl.min_horizontal(feature1.expr, to_expr(feature2)))
 
 
 def ts_greater(feature1: DataProxy, feature2: DataProxy | float) -> DataProxy:
     """Return the maximum value between two features"""
-    if isinstance(feature2, DataProxy):
-        df_merged: pl.DataFrame = feature1.df.join(feature2.df, on=["datetime", "vt_symbol"])
-
-    else:
-        df_merged = feature1.df.with_columns(pl.lit(feature2).alias("data_right"))
-
-    df: pl.DataFrame = df_merged.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.max_horizontal("data", "data_right").over("vt_symbol").alias("data")
-    )
-
-    return DataProxy(df)
+    return DataProxy(pl.max_horizontal(feature1.expr, to_expr(feature2)))
 
 
 def ts_log(feature: DataProxy) -> DataProxy:
     """Calculate the natural logarithm of the feature"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").log().over("vt_symbol")
-    )
-    return DataProxy(df)
+    return DataProxy(feature.expr.log())
 
 
 def ts_abs(feature: DataProxy) -> DataProxy:
     """Calculate the absolute value of the feature"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").abs().over("vt_symbol")
-    )
-    return DataProxy(df)
+    return DataProxy(feature.expr.abs())
 
 
 def ts_delta(feature: DataProxy, window: int) -> DataProxy:
@@ -305,24 +303,10 @@ def ts_cov(feature1: DataProxy, feature2: DataProxy, window: int) -> DataProxy:
 
 def ts_decay_linear(feature: DataProxy, window: int) -> DataProxy:
     """Calculate linear decay weighted average"""
-    def decay_func(s: pl.Series) -> float:
-        """Calculate linear decay weighted average for a series"""
-        weights = pl.Series(range(window, 0, -1))
-        return float((s * weights).sum() / (window * (window + 1) / 2))
-
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").rolling_map(lambda s: decay_func(s), window).over("vt_symbol")
-    )
-    return DataProxy(df)
+    weights: np.ndarray = np.arange(window, 0, -1, dtype=float)
+    return rolling_apply(feature, window, lambda w: w @ weights / (window * (window + 1) / 2))
 
 
 def ts_product(feature: DataProxy, window: int) -> DataProxy:
     """Calculate the product over a rolling window"""
-    df: pl.DataFrame = feature.df.select(
-        pl.col("datetime"),
-        pl.col("vt_symbol"),
-        pl.col("data").rolling_map(lambda s: s.product(), window).over("vt_symbol")
-    )
-    return DataProxy(df)
+    return rolling_apply(feature, window, lambda w: w.prod(axis=1))
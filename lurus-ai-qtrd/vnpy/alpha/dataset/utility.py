@@ -1,165 +1,448 @@
+import ast
+import operator
+from time import perf_counter
 from datetime import datetime
 from enum import Enum
 from typing import Union
+from collections.abc import Callable
 
 import polars as pl
 
 
 class DataProxy:
-    """Feature data proxy"""
+    """Feature data proxy, holding the polars expression of feature"""
 
-    def __init__(self, df: pl.DataFrame) -> None:
+    def __init__(self, expr: pl.Expr) -> None:
         """Constructor"""
-        self.name: str = df.columns[-1]
-        self.df: pl.DataFrame = df.rename({self.name: "data"})
+        self.expr: pl.Expr = expr
 
-        # Note that for numerical expressions, variables should be placed before numbers. e.g. a * 2
-
-    def result(self, s: pl.Series) -> "DataProxy":
-        """Convert series data to feature object"""
-        result: pl.DataFrame = self.df[["datetime", "vt_symbol"]]
-        result = result.with_columns(other=s)
+        # Window groups used in expression and number of query stages
+        # required before evaluation, set by ExpressionCompiler
+        self.groups: frozenset[str] = frozenset()
+        self.level: int = 0
 
-        return DataProxy(result)
+        # Note that for numerical expressions, variables should be placed before numbers. e.g. a * 2
 
     def __add__(self, other: Union["DataProxy", int, float]) -> "DataProxy":
         """Addition operation"""
-        if isinstance(other, DataProxy):
-            s: pl.Series = self.df["data"] + other.df["data"]
-        else:
-            s = self.df["data"] + other
-        return self.result(s)
+        return DataProxy(self.expr + to_expr(other))
 
     def __sub__(self, other: Union["DataProxy", int, float]) -> "DataProxy":
         """Subtraction operation"""
-        if isinstance(other, DataProxy):
-            s: pl.Series = self.df["data"] - other.df["data"]
-        else:
-            s = self.df["data"] - other
-        return self.result(s)
+        return DataProxy(self.expr - to_expr(other))
 
     def __mul__(self, other: Union["DataProxy", int, float]) -> "DataProxy":
         """Multiplication operation"""
-        if isinstance(other, DataProxy):
-            s: pl.Series = self.df["data"] * other.df["data"]
-        else:
-            s = self.df["data"] * other
-        return self.result(s)
+        return DataProxy(self.expr * to_expr(other))
 
     def __rmul__(self, other: Union["DataProxy", int, float]) -> "DataProxy":
         """Right multiplication operation"""
-        if isinstance(other, DataProxy):
-            s: pl.Series = self.df["data"] * other.df["data"]
-        else:
-            s = self.df["data"] * other
-        return self.result(s)
+        return DataProxy(self.expr * to_expr(other))
 
     def __truediv__(self, other: Union["DataProxy", int, float]) -> "DataProxy":
         """Division operation"""
-        if isinstance(other, DataProxy):
-            s: pl.Series = self.df["data"] / other.df["data"]
-        else:
-            s = self.df["data"] / other
-        return self.result(s)
+        return DataProxy(self.expr / to_expr(other))
 
     def __abs__(self) -> "DataProxy":
         """Get absolute value"""
-        s: pl.Series = self.df["data"].abs()
-        return self.result(s)
+        return DataProxy(self.expr.abs())
 
     def __gt__(self, other: Union["DataProxy", int, float]) -> "DataProxy":
         """Greater than comparison"""
-        if isinstance(other, DataProxy):
-            s: pl.Series = self.df["data"] > other.df["data"]
-        else:
-            s = self.df["data"] > other
-        return self.result(s.cast(pl.Int32))
+        return DataProxy((self.expr > to_expr(other)).cast(pl.Int32))
 
     def __ge__(self, other: Union["DataProxy", int, float]) -> "DataProxy":
         """Greater than or equal comparison"""
-        if isinstance(other, DataProxy):
-            s: pl.Series = self.df["data"] >= other.df["data"]
-        else:
-            s = self.df["data"] >= other
-        return self.result(s.cast(pl.Int32))
+        return DataProxy((self.expr >= to_expr(other)).cast(pl.Int32))
 
     def __lt__(self, other: Union["DataProxy", int, float]) -> "DataProxy":
         """Less than comparison"""
-        if isinstance(other, DataProxy):
-            s: pl.Series = self.df["data"] < other.df["data"]
-        else:
-            s = self.df["data"] < other
-        return self.result(s.cast(pl.Int32))
+        return DataProxy((self.expr < to_expr(other)).cast(pl.Int32))
 
     def __le__(self, other: Union["DataProxy", int, float]) -> "DataProxy":
         """Less than or equal comparison"""
-        if isinstance(other, DataProxy):
-            s: pl.Series = self.df["data"] <= other.df["data"]
-        else:
-            s = self.df["data"] <= other
-        return self.result(s.cast(pl.Int32))
+        return DataProxy((self.expr <= to_expr(other)).cast(pl.Int32))
 
     def __eq__(self, other: Union["DataProxy", int, float]) -> "DataProxy":    # type: ignore
         """Equal comparison"""
-        if isinstance(other, DataProxy):
-            s = self.df["data"] == other.df["data"]
+        return DataProxy((self.expr == to_expr(other)).cast(pl.Int32))
+
+
+def to_expr(value: DataProxy | int | float) -> pl.Expr:
+    """Convert feature or number to polars expression"""
+    if isinstance(value, DataProxy):
+        return value.expr
+    return pl.lit(value)
+
+
+# Group of operators without window, e.g. TA-Lib functions on whole column
+BATCH_GROUP = "*"
+
+BINARY_OPERATORS: dict[type, Callable] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+COMPARE_OPERATORS: dict[type, Callable] = {
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Eq: operator.eq,
+}
+
+# Operators referring to argument more than once, polars does not
+# eliminate common window expressions so argument with window is
+# calculated as intermediate column first
+REUSE_OPERATORS: set[str] = {
+    "ts_delta", "ts_corr", "ts_cov",
+    "cs_scale",
+    "sign", "pow1", "pow2"
+}
+
+# Operators returning one field of shared calculation, fields requested
+# with the same arguments are calculated in one pass
+FIELD_OPERATORS: dict[str, tuple[str, str]] = {
+    "ts_slope": ("get_regression", "slope"),
+    "ts_intercept": ("get_regression", "intercept"),
+    "ts_rsquare": ("get_regression", "rsquare"),
+    "ts_resi": ("get_regression", "resi"),
+    "ta_macd": ("get_macd", "macd"),
+    "ta_macd_signal": ("get_macd", "signal"),
+    "ta_macd_hist": ("get_macd", "hist"),
+    "ta_boll_up": ("get_boll", "up"),
+    "ta_boll_down": ("get_boll", "down"),
+    "ta_keltner_up": ("get_keltner", "up"),
+    "ta_keltner_down": ("get_keltner", "down"),
+    "ta_donchian_up": ("get_donchian", "up"),
+    "ta_donchian_down": ("get_donchian", "down"),
+    "ta_aroon_up": ("get_aroon", "up"),
+    "ta_aroon_down": ("get_aroon", "down"),
+    "ta_stoch_k": ("get_stoch", "k"),
+    "ta_stoch_d": ("get_stoch", "d"),
+}
+
+
+def load_operators() -> dict[str, tuple[Callable, str]]:
+    """Load operator functions with the group their window is over"""
+    # Import operators locally to avoid circular import
+    from . import ts_function, cs_function, ta_function, math_function
+
+    operators: dict[str, tuple[Callable, str]] = {}
+
+    for module, prefix, group in [
+        (ts_function, "ts_", "vt_symbol"),
+        (cs_function, "cs_", "datetime"),
+        (ta_function, "ta_", BATCH_GROUP),
+    ]:
+        for name in dir(module):
+            if name.startswith(prefix):
+                operators[name] = (getattr(module, name), group)
+
+    for name in [
+        "less", "greater", "log", "abs",
+        "sign", "pow1", "pow2",
+        "quesval", "quesval2"
+    ]:
+        operators[name] = (getattr(math_function, name), "")
+
+    return operators
+
+
+def load_shared_operators() -> dict[str, tuple[Callable, str]]:
+    """Load shared calculations of FIELD_OPERATORS with the group of their window"""
+    from . import ts_function, ta_function
+
+    shared_operators: dict[str, tuple[Callable, str]] = {
+        "get_regression": (ts_function.get_regression, "vt_symbol")
+    }
+
+    for name in ["get_macd", "get_boll", "get_keltner", "get_donchian", "get_aroon", "get_stoch"]:
+        shared_operators[name] = (getattr(ta_function, name), BATCH_GROUP)
+
+    return shared_operators
+
+
+def is_field_operator(node: ast.expr) -> bool:
+    """Check if node is call of field operator"""
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FIELD_OPERATORS
+
+
+def get_shared_node(node: ast.Call) -> ast.Call:
+    """Get node of shared calculation called with the same arguments as field operator"""
+    name: str = FIELD_OPERATORS[node.func.id][0]       # type: ignore
+    return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=node.args, keywords=node.keywords)
+
+
+class ExpressionCompiler:
+    """
+    Compile expression strings into polars expressions.
+
+    Expression is parsed into syntax tree and compiled node by node, the
+    same sub-expression is only compiled once for all expressions.
+
+    Polars evaluates window expression nested inside another window within
+    each group of the outer one. So input of time-series operator containing
+    cross-section window (or the opposite) is added as an intermediate column
+    in an earlier stage of the query.
+
+    Sub-expressions with window referred by several expressions (counted by
+    count_references before compiling) are also added as intermediate
+    columns, so they are calculated only once. So are shared calculations
+    of field operators, e.g. regression of ts_slope and ts_rsquare.
+    """
+
+    def __init__(self, columns: list[str]) -> None:
+        """Constructor"""
+        self.operators: dict[str, tuple[Callable, str]] = load_operators()
+        self.shared_operators: dict[str, tuple[Callable, str]] = load_shared_operators()
+
+        # Compiled sub-expressions by their source code
+        self.proxies: dict[str, DataProxy] = {}
+
+        for column in columns:
+            # Filter index columns
+            if column in {"datetime", "vt_symbol"}:
+                continue
+
+            self.proxies[column] = DataProxy(pl.col(column))
+
+        # Intermediate columns of each stage
+        self.stages: list[dict[str, pl.Expr]] = []
+        self.intermediate_keys: dict[str, str] = {}
+
+        # Number of references and time cost of sub-expressions
+        self.references: dict[str, int] = {}
+        self.costs: dict[str, float] = {}
+
+    def count_references(self, expressions: list[str]) -> None:
+        """Count references of sub-expressions in expressions to be compiled"""
+        counted: set[str] = set()
+
+        for expression in expressions:
+            tree: ast.Expression = ast.parse(expression.strip(), mode="eval")
+            self.count_node(tree.body, counted)
+
+    def count_node(self, node: ast.expr, counted: set[str]) -> None:
+        """Count reference of node, and its children only for the first time"""
+        key: str = ast.unparse(node)
+        self.references[key] = self.references.get(key, 0) + 1
+
+        if key in counted:
+            return
+        counted.add(key)
+
+        if is_field_operator(node):
+            self.count_node(get_shared_node(node), counted)     # type: ignore
+            return
+
+        children: list[ast.expr]
+        if isinstance(node, ast.Call):
+            children = node.args + [kw.value for kw in node.keywords]
+        else:
+            children = [child for child in ast.iter_child_nodes(node) if isinstance(child, ast.expr)]
+
+        for child in children:
+            self.count_node(child, counted)
+
+    def compile(self, expression: str) -> pl.Expr:
+        """Compile expression string into polars expression"""
+        tree: ast.Expression = ast.parse(expression.strip(), mode="eval")
+
+        result: DataProxy | int | float = self.evaluate(tree.body)
+        return to_expr(result)
+
+    def create_query(self, df: pl.DataFrame | pl.LazyFrame, exprs: list[pl.Expr]) -> pl.LazyFrame:
+        """Create lazy query adding compiled expressions as columns"""
+        lf: pl.LazyFrame = df.lazy()
+        names: list[str] = []
+
+        for stage in self.stages:
+            lf = lf.with_columns([expr.alias(name) for name, expr in stage.items()])
+            names.extend(stage.keys())
+
+        return lf.with_columns(exprs).drop(names)
+
+    def calculate(self, df: pl.DataFrame, exprs: list[pl.Expr]) -> pl.DataFrame:
+        """
+        Calculate intermediate columns one by one recording their time
+        cost, then all compiled expressions in one query.
+        """
+        for stage in self.stages:
+            for name, expr in stage.items():
+                start: float = perf_counter()
+                df = df.with_columns(expr.alias(name))
+                self.costs[self.intermediate_keys[name]] = perf_counter() - start
+
+        names: list[str] = list(self.intermediate_keys.keys())
+        return df.lazy().with_columns(exprs).drop(names).collect()
+
+    def get_reuse_statistics(self) -> tuple[int, int, float]:
+        """
+        Get number of intermediate results reused, number of references
+        to them and estimated time saved by calculating them only once.
+        """
+        count: int = 0
+        references: int = 0
+        saved: float = 0
+
+        for key, cost in self.costs.items():
+            n: int = self.references.get(key, 0)
+            if n > 1:
+                count += 1
+                references += n
+                saved += cost * (n - 1)
+
+        return count, references, saved
+
+    def evaluate(self, node: ast.expr) -> DataProxy | int | float:
+        """Compile a node of syntax tree"""
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, int | float) and not isinstance(node.value, bool):
+                return node.value
+            raise ValueError(f"Unsupported constant: {ast.unparse(node)}")
+
+        key: str = ast.unparse(node)
+
+        proxy: DataProxy | None = self.proxies.get(key, None)
+        if proxy is not None:
+            return proxy
+
+        args: list[DataProxy | int | float]
+        group: str = ""
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub | ast.UAdd):
+            operand: DataProxy | int | float = self.evaluate(node.operand)
+
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            elif not isinstance(operand, DataProxy):
+                return -operand
+
+            args = [operand]
+            result: DataProxy = operand * -1
+        elif isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            args = [self.evaluate(node.left), self.evaluate(node.right)]
+            result = BINARY_OPERATORS[type(node.op)](*args)
+        elif (
+            isinstance(node, ast.Compare)
+            and len(node.ops) == 1
+            and type(node.ops[0]) in COMPARE_OPERATORS
+        ):
+            args = [self.evaluate(node.left), self.evaluate(node.comparators[0])]
+            result = COMPARE_OPERATORS[type(node.ops[0])](*args)
+        elif is_field_operator(node):
+            shared: DataProxy = self.evaluate_shared(get_shared_node(node))     # type: ignore
+
+            args = [shared]
+            result = DataProxy(shared.expr.struct.field(FIELD_OPERATORS[node.func.id][1]))     # type: ignore
+        elif (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in self.operators
+        ):
+            func, group = self.operators[node.func.id]
+            reused: bool = node.func.id in REUSE_OPERATORS
+
+            args = [self.prepare_argument(arg, group, reused) for arg in node.args]
+            kwargs: dict = {kw.arg: self.prepare_argument(kw.value, group, reused) for kw in node.keywords}
+
+            result = func(*args, **kwargs)
+            args.extend(kwargs.values())
+        elif isinstance(node, ast.Name | ast.Call):
+            raise ValueError(f"Unknown feature or function: {key}")
         else:
-            s = self.df["data"] == other
-        return self.result(s.cast(pl.Int32))
+            raise ValueError(f"Unsupported syntax: {key}")
 
+        if not isinstance(result, DataProxy):
+            return result
 
-def calculate_by_expression(df: pl.DataFrame, expression: str) -> pl.DataFrame:
-    """Execute calculation based on expression"""
-    # Import operators locally to avoid polluting global namespace
-    from .ts_function import (              # noqa
-        ts_delay,
-        ts_min, ts_max,
-        ts_argmax, ts_argmin,
-        ts_rank, ts_sum,
-        ts_mean, ts_std,
-        ts_slope, ts_quantile,
-        ts_rsquare, ts_resi,
-        ts_corr,
-        ts_less, ts_greater,
-        ts_log, ts_abs,
-        ts_delta, ts_cov,
-        ts_decay_linear,
-        ts_product
-    )
-    from .cs_function import (              # noqa
-        cs_rank,
-        cs_mean,
-        cs_std,
-        cs_sum,
-        cs_scale
-    )
-    from .ta_function import (              # noqa
-        ta_rsi,
-        ta_atr
-    )
-    from .math_function import (              # noqa
-        less, greater, log, abs,
-        sign, pow1, pow2,
-        quesval, quesval2
-    )
+        return self.update_proxy(key, result, args, group)
+
+    def evaluate_shared(self, node: ast.Call) -> DataProxy:
+        """Compile shared calculation of field operators"""
+        key: str = ast.unparse(node)
+
+        proxy: DataProxy | None = self.proxies.get(key, None)
+        if proxy is not None:
+            return proxy
+
+        func, group = self.shared_operators[node.func.id]      # type: ignore
+
+        args: list[DataProxy | int | float] = [self.prepare_argument(arg, group, False) for arg in node.args]
+        kwargs: dict = {kw.arg: self.prepare_argument(kw.value, group, False) for kw in node.keywords}
+
+        result: DataProxy = func(*args, **kwargs)
+        args.extend(kwargs.values())
+
+        return self.update_proxy(key, result, args, group)
+
+    def update_proxy(
+        self,
+        key: str,
+        result: DataProxy,
+        args: list[DataProxy | int | float],
+        group: str
+    ) -> DataProxy:
+        """Set window groups and stage level of compiled sub-expression"""
+        proxies: list[DataProxy] = [arg for arg in args if isinstance(arg, DataProxy)]
+
+        groups: set[str] = {group} if group else set()
+        for arg in proxies:
+            groups.update(arg.groups)
+
+        result.groups = frozenset(groups)
+        result.level = max([arg.level for arg in proxies], default=0)
+
+        # Calculate window referred by several expressions only once
+        if result.groups and self.references.get(key, 0) > 1:
+            return self.add_intermediate(key, result)
+
+        self.proxies[key] = result
+        return result
+
+    def prepare_argument(self, node: ast.expr, group: str, reused: bool) -> DataProxy | int | float:
+        """Compile argument of operator, which is over window of group"""
+        value: DataProxy | int | float = self.evaluate(node)
+
+        if not isinstance(value, DataProxy) or not value.groups:
+            return value
+
+        if reused or (group and group != BATCH_GROUP and value.groups - {group}):
+            value = self.add_intermediate(ast.unparse(node), value)
 
-    # Extract feature objects to local space
-    d: dict = locals()
+        return value
 
-    for column in df.columns:
-        # Filter index columns
-        if column in {"datetime", "vt_symbol"}:
-            continue
+    def add_intermediate(self, key: str, proxy: DataProxy) -> DataProxy:
+        """Add sub-expression as intermediate column"""
+        while len(self.stages) <= proxy.level:
+            self.stages.append({})
 
-        # Cache feature df
-        column_df = df[["datetime", "vt_symbol", column]]
-        d[column] = DataProxy(column_df)
+        name: str = f"__intermediate_{len(self.intermediate_keys)}"
+        self.intermediate_keys[name] = key
 
-    # Use eval to execute calculation
-    other: DataProxy = eval(expression, {}, d)
+        self.stages[proxy.level][name] = proxy.expr
 
-    # Return result DataFrame
-    return other.df
+        column: DataProxy = DataProxy(pl.col(name))
+        column.level = proxy.level + 1
+
+        self.proxies[key] = column
+        return column
+
+
+def calculate_by_expression(df: pl.DataFrame, expression: str) -> pl.DataFrame:
+    """Execute calculation based on expression"""
+    compiler: ExpressionCompiler = ExpressionCompiler(df.columns)
+    compiler.count_references([expression])
+    expr: pl.Expr = compiler.compile(expression)
+
+    return (
+        compiler.create_query(df, [expr.alias("data")])
+        .select(["datetime", "vt_symbol", "data"])
+        .collect()
+    )
 
 
 def calculate_by_polars(df: pl.DataFrame, expression: pl.expr.expr.Expr) -> pl.DataFrame:
@@ -184,6 +467,62 @@ def to_datetime(arg: datetime | str) -> datetime:
         return arg
 
 
+def to_filter_table(filters: dict[str, list[tuple[datetime, datetime]]] | pl.DataFrame) -> pl.DataFrame:
+    """
+    Convert filters into table of intervals with columns vt_symbol,
+    start and end, overlapping intervals of a symbol are merged
+    """
+    if isinstance(filters, dict):
+        filters = pl.DataFrame(
+            [(vt_symbol, start, end) for vt_symbol, ranges in filters.items() for start, end in ranges],
+            schema={"vt_symbol": pl.String, "start": pl.Datetime, "end": pl.Datetime},
+            orient="row"
+        )
+
+    # New interval starts after all previous ones ended
+    return (
+        filters
+        .select("vt_symbol", "start", "end")
+        .sort(["vt_symbol", "start"])
+        .with_columns(
+            (pl.col("start") > pl.col("end").cum_max().shift(1).over("vt_symbol"))
+            .fill_null(True)
+            .cum_sum()
+            .alias("group")
+        )
+        .group_by(["vt_symbol", "group"], maintain_order=True)
+        .agg(pl.col("start").min(), pl.col("end").max())
+        .drop("group")
+    )
+
+
+def filter_by_intervals(df: pl.DataFrame, intervals: pl.DataFrame) -> pl.DataFrame:
+    """
+    Keep rows of df (sorted by datetime) within intervals of its symbol,
+    by one as-of join with interval started last
+    """
+    dtype: pl.DataType = df.schema["datetime"]
+
+    intervals = intervals.select(
+        "vt_symbol",
+        pl.col("start").cast(dtype).alias("__start"),
+        pl.col("end").cast(dtype).alias("__end")
+    ).sort("__start")
+
+    return (
+        df.join_asof(
+            intervals,
+            left_on="datetime",
+            right_on="__start",
+            by="vt_symbol",
+            strategy="backward",
+            check_sortedness=False
+        )
+        .filter(pl.col("datetime") <= pl.col("__end"))
+        .drop(["__start", "__end"])
+    )
+
+
 class Segment(Enum):
     """Data segment enumeration values"""
 
@@ -0,0 +1,101 @@
+"""
+Worker processes calculating features of dataset
+"""
+
+import atexit
+import shutil
+import tempfile
+from contextlib import suppress
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from uuid import uuid4
+
+import polars as pl
+
+from .utility import ExpressionCompiler
+
+
+class WorkerPool:
+    """
+    Process pool reused by all datasets, imports of worker processes
+    are only paid once.
+
+    Source frame is written once to an uncompressed Arrow IPC file, which
+    workers read as memory map without copying or unpickling it.
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        """Constructor"""
+        self.max_workers: int = max_workers
+
+        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(
+            max_workers, mp_context=get_context("spawn")
+        )
+        self.folder: Path = Path(tempfile.mkdtemp(prefix="vnpy_alpha_"))
+
+    def calculate(self, df: pl.DataFrame, expressions: list[tuple[str, str]]) -> pl.DataFrame:
+        """
+        Calculate expressions split into parts for workers, return
+        feature columns in the same order as expressions.
+        """
+        path: Path = self.folder.joinpath(f"{uuid4().hex}.arrow")
+        df.write_ipc(path, compression="uncompressed")
+
+        try:
+            # Contiguous parts keep features sharing windows together
+            size: int = -(-len(expressions) // self.max_workers)
+            parts: list[list[tuple[str, str]]] = [
+                expressions[i: i + size] for i in range(0, len(expressions), size)
+            ]
+
+            results: list[pl.DataFrame] = list(
+                self.executor.map(calculate_features, [str(path)] * len(parts), parts)
+            )
+        finally:
+            # File may still be mapped on Windows
+            with suppress(OSError):
+                path.unlink()
+
+        return pl.DataFrame([column for result in results for column in result.get_columns()])
+
+    def close(self) -> None:
+        """Shutdown worker processes and remove shared files"""
+        self.executor.shutdown()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+pool: WorkerPool | None = None
+
+
+def get_worker_pool(max_workers: int) -> WorkerPool:
+    """Get worker pool, which is recreated only if max_workers changed"""
+    global pool
+
+    if pool is None or pool.max_workers != max_workers:
+        close_worker_pool()
+        pool = WorkerPool(max_workers)
+
+    return pool
+
+
+@atexit.register
+def close_worker_pool() -> None:
+    """Close worker pool if started"""
+    global pool
+
+    if pool is not None:
+        pool.close()
+        pool = None
+
+
+def calculate_features(path: str, expressions: list[tuple[str, str]]) -> pl.DataFrame:
+    """Calculate feature columns in worker process"""
+    df: pl.DataFrame = pl.read_ipc(path, memory_map=True)
+
+    compiler: ExpressionCompiler = ExpressionCompiler(df.columns)
+    compiler.count_references([expression for _, expression in expressions])
+
+    exprs: list[pl.Expr] = [compiler.compile(expression).alias(name) for name, expression in expressions]
+
+    return compiler.calculate(df, exprs).select([name for name, _ in expressions])
@@ -3,7 +3,6 @@ import shelve
 import pickle
 from pathlib import Path
 from datetime import datetime, timedelta
-from collections import defaultdict
 from functools import lru_cache
 
 import polars as pl
@@ -14,6 +13,7 @@ from vnpy.trader.utility import extract_vt_symbol
 
 from .logger import logger
 from .dataset import AlphaDataset, to_datetime
+from .dataset.cache import FeatureCache
 from .model import AlphaModel
 
 
@@ -32,6 +32,7 @@ class AlphaLab:
         self.dataset_path: Path = self.lab_path.joinpath("dataset")
         self.model_path: Path = self.lab_path.joinpath("model")
         self.signal_path: Path = self.lab_path.joinpath("signal")
+        self.feature_path: Path = self.lab_path.joinpath("feature")
 
         self.contract_path: Path = self.lab_path.joinpath("contract.json")
 
@@ -43,11 +44,15 @@ class AlphaLab:
             self.component_path,
             self.dataset_path,
             self.model_path,
-            self.signal_path
+            self.signal_path,
+            self.feature_path
         ]:
             if not path.exists():
                 path.mkdir(parents=True)
 
+        # Feature columns shared by datasets, see vnpy.alpha.dataset.cache
+        self.feature_cache: FeatureCache = FeatureCache(self.feature_path)
+
     def save_bar_data(self, bars: list[BarData]) -> None:
         """Save bar data"""
         if not bars:
@@ -303,8 +308,11 @@ class AlphaLab:
         index_symbol: str,
         start: datetime | str,
         end: datetime | str
-    ) -> dict[str, list[tuple[datetime, datetime]]]:
-        """Collect index component duration filters"""
+    ) -> pl.DataFrame:
+        """
+        Collect index component duration filters, as table of continuous
+        holding periods with columns vt_symbol, start and end
+        """
         index_components: dict[datetime, list[str]] = self.load_component_data(
             index_symbol,
             start,
@@ -314,37 +322,32 @@ class AlphaLab:
         # Get all trading dates and sort
         trading_dates: list[datetime] = sorted(index_components.keys())
 
-        # Initialize component duration dictionary
-        component_filters: dict[str, list[tuple[datetime, datetime]]] = defaultdict(list)
+        df: pl.DataFrame = pl.DataFrame(
+            [
+                (ix, trading_date, vt_symbol)
+                for ix, trading_date in enumerate(trading_dates)
+                for vt_symbol in set(index_components[trading_date])
+            ],
+            schema={"index": pl.Int64, "datetime": pl.Datetime, "vt_symbol": pl.String},
+            orient="row"
+        )
 
-        # Get all component symbols
-        all_symbols: set[str] = set()
-        for vt_symbols in index_components.values():
-            all_symbols.update(vt_symbols)
-
-        # Iterate through each component to identify its duration in the index
-        for vt_symbol in all_symbols:
-            period_start: datetime | None = None
-            period_end: datetime | None = None
-
-            # Iterate through each trading day to identify continuous holding periods
-            for trading_date in trading_dates:
-                if vt_symbol in index_components[trading_date]:
-                    if period_start is None:
-                        period_start = trading_date
-
-                    period_end = trading_date
-                else:
-                    if period_start and period_end:
-                        component_filters[vt_symbol].append((period_start, period_end))
-                        period_start = None
-                        period_end = None
-
-            # Handle the last holding period
-            if period_start and period_end:
-                component_filters[vt_symbol].append((period_start, period_end))
-
-        return component_filters
+        # Holding period breaks when component missed on any trading date
+        return (
+            df.sort(["vt_symbol", "index"])
+            .with_columns(
+                (pl.col("index").diff().over("vt_symbol") != 1)
+                .fill_null(True)
+                .cum_sum()
+                .alias("period")
+            )
+            .group_by(["vt_symbol", "period"], maintain_order=True)
+            .agg(
+                pl.col("datetime").min().alias("start"),
+                pl.col("datetime").max().alias("end")
+            )
+            .drop("period")
+        )
 
     def add_contract_setting(
         self,
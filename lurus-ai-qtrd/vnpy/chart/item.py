@@ -1,5 +1,8 @@
 from abc import abstractmethod
+from collections import OrderedDict
+from math import ceil, log2
 
+import numpy as np
 import pyqtgraph as pg      # type: ignore
 
 from vnpy.trader.ui import QtCore, QtGui, QtWidgets
@@ -9,6 +12,21 @@ from .base import BLACK_COLOR, UP_COLOR, DOWN_COLOR, PEN_WIDTH, BAR_WIDTH
 from .manager import BarManager
 
 
+# Number of pixel buckets in one cached level-of-detail tile
+LOD_TILE_SIZE = 256
+LOD_CACHE_SIZE = 1000
+
+
+def get_lod_level(pixels_per_bar: float) -> int:
+    """
+    Get level of detail, buckets of 2 ** level bars fill at least one pixel.
+    Level 0 means each bar is drawn on its own.
+    """
+    if pixels_per_bar <= 0 or pixels_per_bar >= 1:
+        return 0
+    return ceil(log2(1 / pixels_per_bar))
+
+
 class ChartItem(pg.GraphicsObject):
     """"""
 
@@ -35,6 +53,9 @@ class ChartItem(pg.GraphicsObject):
 
         self._rect_area: tuple[float, float] | None = None
 
+        # Level-of-detail tiles: key is (level, tile index)
+        self._lod_pictures: OrderedDict[tuple[int, int], QtGui.QPicture] = OrderedDict()
+
         # Very important! Only redraw the visible part and improve speed a lot.
         self.setFlag(self.GraphicsItemFlag.ItemUsesExtendedStyleOption)
 
@@ -48,6 +69,14 @@ class ChartItem(pg.GraphicsObject):
         """
         pass
 
+    def _draw_envelope_picture(self, envelope: dict[str, np.ndarray], size: int) -> QtGui.QPicture | None:
+        """
+        Draw picture for bars aggregated into buckets of size bars, when
+        zoomed out too far to draw each bar. Return None if not supported,
+        then all bars are drawn one by one.
+        """
+        return None
+
     @abstractmethod
     def boundingRect(self) -> QtCore.QRectF:
         """
@@ -76,10 +105,9 @@ class ChartItem(pg.GraphicsObject):
         Update a list of bar data.
         """
         self._bar_picutures.clear()
+        self._lod_pictures.clear()
 
-        bars: list[BarData] = self._manager.get_all_bars()
-
-        for ix, _ in enumerate(bars):
+        for ix in range(self._manager.get_count()):
             self._bar_picutures[ix] = None
 
         self.update()
@@ -94,6 +122,11 @@ class ChartItem(pg.GraphicsObject):
 
         self._bar_picutures[ix] = None
 
+        # Drop tiles containing the bar on every level
+        for level, tile in list(self._lod_pictures.keys()):
+            if tile == ix // (LOD_TILE_SIZE << level):
+                self._lod_pictures.pop((level, tile))
+
         self.update()
 
     def update(self) -> None:
@@ -121,6 +154,11 @@ class ChartItem(pg.GraphicsObject):
         max_ix: int = int(rect.right())
         max_ix = min(max_ix, len(self._bar_picutures))
 
+        # Draw cached tiles of buckets when more bars than pixels are visible
+        level: int = get_lod_level(painter.worldTransform().m11())
+        if level and self._paint_lod(painter, level, min_ix, max_ix):
+            return
+
         rect_area: tuple = (min_ix, max_ix)
         if (
             self._to_update
@@ -134,6 +172,37 @@ class ChartItem(pg.GraphicsObject):
         if self._item_picuture:
             self._item_picuture.play(painter)
 
+    def _paint_lod(self, painter: QtGui.QPainter, level: int, min_ix: int, max_ix: int) -> bool:
+        """
+        Paint tiles of level intersecting the range, returns False if
+        level of detail is not supported by the item.
+        """
+        tile_bars: int = LOD_TILE_SIZE << level
+
+        for tile in range(max(min_ix, 0) // tile_bars, max(max_ix, 0) // tile_bars + 1):
+            key: tuple[int, int] = (level, tile)
+
+            picture: QtGui.QPicture | None = self._lod_pictures.get(key, None)
+            if picture:
+                self._lod_pictures.move_to_end(key)
+            else:
+                start: int = tile * tile_bars
+                envelope: dict[str, np.ndarray] = self._manager.get_envelope(start, start + tile_bars, 1 << level)
+                if not len(envelope["index"]):
+                    continue
+
+                picture = self._draw_envelope_picture(envelope, 1 << level)
+                if not picture:
+                    return False
+
+                self._lod_pictures[key] = picture
+                if len(self._lod_pictures) > LOD_CACHE_SIZE:
+                    self._lod_pictures.popitem(last=False)
+
+            picture.play(painter)
+
+        return True
+
     def _draw_item_picture(self, min_ix: int, max_ix: int) -> None:
         """
         Draw the picture of item in specific range.
@@ -162,6 +231,7 @@ class ChartItem(pg.GraphicsObject):
         """
         self._item_picuture = None
         self._bar_picutures.clear()
+        self._lod_pictures.clear()
         self.update()
 
 
@@ -212,6 +282,30 @@ class CandleItem(ChartItem):
         painter.end()
         return candle_picture
 
+    def _draw_envelope_picture(self, envelope: dict[str, np.ndarray], size: int) -> QtGui.QPicture:
+        """
+        Draw one high-low line for each bucket, colored by its open and close.
+        """
+        picture: QtGui.QPicture = QtGui.QPicture()
+        painter: QtGui.QPainter = QtGui.QPainter(picture)
+
+        x: np.ndarray = envelope["index"] + (size - 1) / 2
+        up: np.ndarray = envelope["close"] >= envelope["open"]
+
+        for mask, pen in [(up, self._up_pen), (~up, self._down_pen)]:
+            lines: list[QtCore.QLineF] = [
+                QtCore.QLineF(ix, low, ix, high)
+                for ix, low, high in zip(
+                    x[mask].tolist(), envelope["low"][mask].tolist(), envelope["high"][mask].tolist(), strict=True
+                )
+            ]
+            if lines:
+                painter.setPen(pen)
+                painter.drawLines(lines)
+
+        painter.end()
+        return picture
+
     def boundingRect(self) -> QtCore.QRectF:
         """"""
         min_price, max_price = self._manager.get_price_range()
@@ -299,6 +393,28 @@ class VolumeItem(ChartItem):
         painter.end()
         return volume_picture
 
+    def _draw_envelope_picture(self, envelope: dict[str, np.ndarray], size: int) -> QtGui.QPicture:
+        """
+        Draw one line of max volume for each bucket.
+        """
+        picture: QtGui.QPicture = QtGui.QPicture()
+        painter: QtGui.QPainter = QtGui.QPainter(picture)
+
+        x: np.ndarray = envelope["index"] + (size - 1) / 2
+        up: np.ndarray = envelope["close"] >= envelope["open"]
+
+        for mask, pen in [(up, self._up_pen), (~up, self._down_pen)]:
+            lines: list[QtCore.QLineF] = [
+                QtCore.QLineF(ix, 0, ix, volume)
+                for ix, volume in zip(x[mask].tolist(), envelope["volume"][mask].tolist(), strict=True)
+            ]
+            if lines:
+                painter.setPen(pen)
+                painter.drawLines(lines)
+
+        painter.end()
+        return picture
+
     def boundingRect(self) -> QtCore.QRectF:
         """"""
         min_volume, max_volume = self._manager.get_volume_range()
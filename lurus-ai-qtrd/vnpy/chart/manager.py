@@ -1,170 +1,411 @@
+from collections.abc import Callable
 from datetime import datetime
-from _collections_abc import dict_keys
+
+import numpy as np
 
 from vnpy.trader.object import BarData
 
 from .base import to_int
 
 
+class RangeTree:
+    """
+    Segment tree over a NumPy array, answering min or max of any index
+    range in O(log n). Setting one element (including appending at the
+    end) also costs O(log n), capacity is doubled when full.
+    """
+
+    def __init__(self, ufunc: np.ufunc, capacity: int = 1024) -> None:
+        """
+        ufunc is np.minimum or np.maximum.
+        """
+        self._ufunc: np.ufunc = ufunc
+        self._combine: Callable[[float, float], float] = min if ufunc is np.minimum else max
+        self._identity: float = np.inf if ufunc is np.minimum else -np.inf
+
+        self._count: int = 0
+        self._capacity: int = 1
+        self._tree: np.ndarray = np.empty(0)
+
+        self._allocate(capacity)
+        self._build()
+
+    def _allocate(self, capacity: int) -> None:
+        """
+        Allocate tree with leaves for at least capacity elements.
+        """
+        size: int = 1
+        while size < capacity:
+            size *= 2
+
+        leaves: np.ndarray = self._tree[self._capacity: self._capacity + self._count]
+
+        self._capacity = size
+        self._tree = np.full(2 * size, self._identity)
+        self._tree[size: size + len(leaves)] = leaves
+
+    def _build(self) -> None:
+        """
+        Compute all parent nodes level by level.
+        """
+        end: int = 2 * self._capacity
+        start: int = self._capacity
+
+        while start > 1:
+            self._tree[start // 2: end // 2] = self._ufunc(self._tree[start: end: 2], self._tree[start + 1: end: 2])
+            start, end = start // 2, end // 2
+
+    def set_data(self, data: np.ndarray) -> None:
+        """
+        Replace all elements.
+        """
+        self._count = 0
+        self._tree = np.empty(0)
+        self._allocate(max(len(data), 1024))
+
+        self._tree[self._capacity: self._capacity + len(data)] = data
+        self._count = len(data)
+        self._build()
+
+    def set_value(self, ix: int, value: float) -> None:
+        """
+        Update element at ix, or append it if ix equals count.
+        """
+        if ix >= self._capacity:
+            self._allocate(ix + 1)
+            self._build()
+
+        self._count = max(self._count, ix + 1)
+
+        tree: np.ndarray = self._tree
+        combine: Callable[[float, float], float] = self._combine
+
+        node: int = ix + self._capacity
+        tree[node] = value
+
+        # Plain float operations are faster than NumPy scalars for a single path
+        node //= 2
+        while node:
+            tree[node] = combine(tree.item(2 * node), tree.item(2 * node + 1))
+            node //= 2
+
+    def query(self, min_ix: int, max_ix: int) -> float:
+        """
+        Get min or max of elements from min_ix to max_ix (included).
+        """
+        nodes: list[int] = []
+
+        left: int = min_ix + self._capacity
+        right: int = max_ix + self._capacity + 1
+
+        while left < right:
+            if left & 1:
+                nodes.append(left)
+                left += 1
+            if right & 1:
+                right -= 1
+                nodes.append(right)
+
+            left //= 2
+            right //= 2
+
+        return float(self._ufunc.reduce(self._tree[nodes]))
+
+    def clear(self) -> None:
+        """"""
+        self.set_data(np.empty(0))
+
+
+# Columns kept by BarManager in addition to datetime
+BAR_COLUMNS: dict[str, str] = {
+    "open": "open_price",
+    "high": "high_price",
+    "low": "low_price",
+    "close": "close_price",
+    "volume": "volume",
+}
+
+
+def to_timestamp(dt: datetime) -> int:
+    """
+    Convert datetime into microseconds since epoch.
+    """
+    return round(dt.timestamp() * 1_000_000)
+
+
 class BarManager:
-    """"""
+    """
+    Columnar bar store of chart.
+
+    Datetimes (datetime64[us] in UTC) and OHLCV are kept in NumPy arrays
+    with spare capacity, so live bars are appended in amortized O(1) and
+    index lookup is a binary search. Bars are only sorted again when
+    history older than existing bars is merged in.
+    """
 
     def __init__(self) -> None:
         """"""
-        self._bars: dict[datetime, BarData] = {}
-        self._datetime_index_map: dict[datetime, int] = {}
-        self._index_datetime_map: dict[int, datetime] = {}
+        self._count: int = 0
+        self._bars: list[BarData] = []
+        self._datetimes: np.ndarray = np.empty(0, dtype="datetime64[us]")
+        self._columns: dict[str, np.ndarray] = {name: np.empty(0) for name in BAR_COLUMNS}
 
-        self._price_ranges: dict[tuple[int, int], tuple[float, float]] = {}
-        self._volume_ranges: dict[tuple[int, int], tuple[float, float]] = {}
+        # Range trees answer min/max queries of visible window
+        self._high_tree: RangeTree = RangeTree(np.maximum)
+        self._low_tree: RangeTree = RangeTree(np.minimum)
+        self._volume_tree: RangeTree = RangeTree(np.maximum)
 
     def update_history(self, history: list[BarData]) -> None:
         """
         Update a list of bar data.
         """
-        # Put all new bars into dict
-        for bar in history:
-            self._bars[bar.datetime] = bar
+        if not history:
+            return
+
+        timestamps: np.ndarray = np.fromiter((to_timestamp(bar.datetime) for bar in history), dtype=np.int64, count=len(history))
+        datetimes: np.ndarray = timestamps.view("datetime64[us]")
+
+        # Fast path: sorted history newer than all existing bars
+        if (
+            (not self._count or datetimes[0] > self._datetimes[self._count - 1])
+            and (len(datetimes) == 1 or (np.diff(timestamps) > 0).all())
+        ):
+            self._append(history, datetimes)
+        else:
+            self._merge(history, datetimes)
+
+        self._build_trees()
+
+    def _append(self, history: list[BarData], datetimes: np.ndarray) -> None:
+        """
+        Append sorted bars after existing ones.
+        """
+        start: int = self._count
+        end: int = start + len(history)
+        self._reserve(end)
 
-        # Sort bars dict according to bar.datetime
-        self._bars = dict(sorted(self._bars.items(), key=lambda tp: tp[0]))
+        self._datetimes[start: end] = datetimes
+        for name, attr in BAR_COLUMNS.items():
+            self._columns[name][start: end] = [getattr(bar, attr) for bar in history]
 
-        # Update map relationiship
-        ix_list: range = range(len(self._bars))
-        dt_list: dict_keys = self._bars.keys()
+        self._bars.extend(history)
+        self._count = end
 
-        self._datetime_index_map = dict(zip(dt_list, ix_list, strict=False))
-        self._index_datetime_map = dict(zip(ix_list, dt_list, strict=False))
+    def _merge(self, history: list[BarData], datetimes: np.ndarray) -> None:
+        """
+        Merge out-of-order bars, new bars replace existing ones with same datetime.
+        """
+        bars: list[BarData] = self._bars + history
+        all_datetimes: np.ndarray = np.concatenate([self._datetimes[: self._count], datetimes])
+
+        # Stable sort keeps new bar after old one of the same datetime
+        order: np.ndarray = np.argsort(all_datetimes, kind="stable")
+        sorted_datetimes: np.ndarray = all_datetimes[order]
+
+        keep: np.ndarray = np.ones(len(order), dtype=bool)
+        keep[:-1] = sorted_datetimes[1:] != sorted_datetimes[:-1]
+        order = order[keep]
+
+        self._count = 0
+        self._bars = []
+        self._append([bars[ix] for ix in order], sorted_datetimes[keep])
+
+    def _reserve(self, size: int) -> None:
+        """
+        Grow arrays by doubling capacity.
+        """
+        capacity: int = len(self._datetimes)
+        if size <= capacity:
+            return
+
+        capacity = max(size, capacity * 2, 1024)
 
-        # Clear data range cache
-        self._clear_cache()
+        datetimes: np.ndarray = np.empty(capacity, dtype="datetime64[us]")
+        datetimes[: self._count] = self._datetimes[: self._count]
+        self._datetimes = datetimes
+
+        for name, column in self._columns.items():
+            new_column: np.ndarray = np.empty(capacity)
+            new_column[: self._count] = column[: self._count]
+            self._columns[name] = new_column
+
+    def _build_trees(self) -> None:
+        """"""
+        self._high_tree.set_data(self._columns["high"][: self._count])
+        self._low_tree.set_data(self._columns["low"][: self._count])
+        self._volume_tree.set_data(self._columns["volume"][: self._count])
 
     def update_bar(self, bar: BarData) -> None:
         """
         Update one single bar data.
         """
-        dt: datetime = bar.datetime
+        dt: np.datetime64 = np.datetime64(to_timestamp(bar.datetime), "us")
 
-        if dt not in self._datetime_index_map:
-            ix: int = len(self._bars)
-            self._datetime_index_map[dt] = ix
-            self._index_datetime_map[ix] = dt
+        # Append new bar or update existing one, most likely the last
+        if not self._count or dt > self._datetimes[self._count - 1]:
+            ix: int = self._count
+            self._reserve(ix + 1)
 
-        self._bars[dt] = bar
+            self._datetimes[ix] = dt
+            self._bars.append(bar)
+            self._count += 1
+        else:
+            ix = self._search(dt)
+            if ix < 0:
+                self.update_history([bar])
+                return
+
+            self._bars[ix] = bar
+
+        for name, attr in BAR_COLUMNS.items():
+            self._columns[name][ix] = getattr(bar, attr)
+
+        # Only the path from updated leaf to root is recomputed
+        self._high_tree.set_value(ix, bar.high_price)
+        self._low_tree.set_value(ix, bar.low_price)
+        self._volume_tree.set_value(ix, bar.volume)
+
+    def _search(self, dt: np.datetime64) -> int:
+        """
+        Binary search index of datetime, -1 if not found.
+        """
+        # Live update is usually for the last bar
+        last: int = self._count - 1
+        if last >= 0 and self._datetimes[last] == dt:
+            return last
 
-        self._clear_cache()
+        ix: int = int(np.searchsorted(self._datetimes[: self._count], dt))
+        if ix < self._count and self._datetimes[ix] == dt:
+            return ix
+        return -1
 
     def get_count(self) -> int:
         """
         Get total number of bars.
         """
-        return len(self._bars)
+        return self._count
 
     def get_index(self, dt: datetime) -> int | None:
         """
         Get index with datetime.
         """
-        return self._datetime_index_map.get(dt, None)
+        ix: int = self._search(np.datetime64(to_timestamp(dt), "us"))
+        if ix < 0:
+            return None
+        return ix
 
     def get_datetime(self, ix: float) -> datetime | None:
         """
         Get datetime with index.
         """
-        ix = to_int(ix)
-        return self._index_datetime_map.get(ix, None)
+        bar: BarData | None = self.get_bar(ix)
+        if not bar:
+            return None
+
+        return bar.datetime
 
     def get_bar(self, ix: float) -> BarData | None:
         """
         Get bar data with index.
         """
         ix = to_int(ix)
-        dt: datetime | None = self._index_datetime_map.get(ix, None)
-        if not dt:
+        if ix < 0 or ix >= self._count:
             return None
 
-        return self._bars[dt]
+        return self._bars[ix]
 
     def get_all_bars(self) -> list[BarData]:
         """
         Get all bar data.
         """
-        return list(self._bars.values())
+        return list(self._bars)
 
-    def get_price_range(self, min_ix: float | None = None, max_ix: float | None = None) -> tuple[float, float]:
+    def get_datetimes(self) -> np.ndarray:
         """
-        Get price range to show within given index range.
+        Get datetime64[us] array of all bars in UTC, read only view.
         """
-        if not self._bars:
-            return 0, 1
+        return self._get_view(self._datetimes)
 
-        if min_ix is None or max_ix is None:
-            min_ix = 0
-            max_ix = len(self._bars) - 1
-        else:
-            min_ix = to_int(min_ix)
-            max_ix = to_int(max_ix)
-            max_ix = min(max_ix, self.get_count())
+    def get_array(self, name: str) -> np.ndarray:
+        """
+        Get array of open/high/low/close/volume of all bars, read only view.
+        """
+        return self._get_view(self._columns[name])
 
-        buf: tuple[float, float] | None = self._price_ranges.get((min_ix, max_ix), None)
-        if buf:
-            return buf
+    def get_envelope(self, start: int, end: int, size: int) -> dict[str, np.ndarray]:
+        """
+        Aggregate bars from start to end (excluded) into buckets of size bars:
+        first open, highest high, lowest low, last close and max volume.
+        """
+        end = min(end, self._count)
+        if start >= end:
+            return {name: np.empty(0) for name in ["index", *BAR_COLUMNS]}
+
+        starts: np.ndarray = np.arange(start, end, size)
+        offsets: np.ndarray = starts - start
+        lasts: np.ndarray = np.minimum(starts + size, end) - 1
+
+        columns: dict[str, np.ndarray] = self._columns
+        return {
+            "index": starts,
+            "open": columns["open"][starts],
+            "high": np.maximum.reduceat(columns["high"][start: end], offsets),
+            "low": np.minimum.reduceat(columns["low"][start: end], offsets),
+            "close": columns["close"][lasts],
+            "volume": np.maximum.reduceat(columns["volume"][start: end], offsets),
+        }
+
+    def _get_view(self, array: np.ndarray) -> np.ndarray:
+        """"""
+        view: np.ndarray = array[: self._count]
+        view.flags.writeable = False
+        return view
 
-        bar_list: list[BarData] = list(self._bars.values())[min_ix:max_ix + 1]
-        first_bar: BarData = bar_list[0]
-        max_price: float = first_bar.high_price
-        min_price: float = first_bar.low_price
+    def get_price_range(self, min_ix: float | None = None, max_ix: float | None = None) -> tuple[float, float]:
+        """
+        Get price range to show within given index range.
+        """
+        if not self._count:
+            return 0, 1
 
-        for bar in bar_list[1:]:
-            max_price = max(max_price, bar.high_price)
-            min_price = min(min_price, bar.low_price)
+        min_ix, max_ix = self._get_index_range(min_ix, max_ix)
 
-        self._price_ranges[(min_ix, max_ix)] = (min_price, max_price)
+        min_price: float = self._low_tree.query(min_ix, max_ix)
+        max_price: float = self._high_tree.query(min_ix, max_ix)
         return min_price, max_price
 
     def get_volume_range(self, min_ix: float | None = None, max_ix: float | None = None) -> tuple[float, float]:
         """
         Get volume range to show within given index range.
         """
-        if not self._bars:
+        if not self._count:
             return 0, 1
 
-        if min_ix is None or max_ix is None:
-            min_ix = 0
-            max_ix = len(self._bars) - 1
-        else:
-            min_ix = to_int(min_ix)
-            max_ix = to_int(max_ix)
-            max_ix = min(max_ix, self.get_count())
-
-        buf: tuple[float, float] | None = self._volume_ranges.get((min_ix, max_ix), None)
-        if buf:
-            return buf
-
-        bar_list: list[BarData] = list(self._bars.values())[min_ix:max_ix + 1]
+        min_ix, max_ix = self._get_index_range(min_ix, max_ix)
 
-        first_bar: BarData = bar_list[0]
-        max_volume = first_bar.volume
-        min_volume = 0
+        max_volume: float = self._volume_tree.query(min_ix, max_ix)
+        return 0, max_volume
 
-        for bar in bar_list[1:]:
-            max_volume = max(max_volume, bar.volume)
-
-        self._volume_ranges[(min_ix, max_ix)] = (min_volume, max_volume)
-        return min_volume, max_volume
-
-    def _clear_cache(self) -> None:
+    def _get_index_range(self, min_ix: float | None, max_ix: float | None) -> tuple[int, int]:
         """
-        Clear cached range data.
+        Limit index range within existing bars.
         """
-        self._price_ranges.clear()
-        self._volume_ranges.clear()
+        last_ix: int = self._count - 1
+
+        if min_ix is None or max_ix is None:
+            return 0, last_ix
+
+        max_ix = min(max(to_int(max_ix), 0), last_ix)
+        min_ix = min(max(to_int(min_ix), 0), max_ix)
+        return min_ix, max_ix
 
     def clear_all(self) -> None:
         """
         Clear all data in manager.
         """
-        self._bars.clear()
-        self._datetime_index_map.clear()
-        self._index_datetime_map.clear()
+        self._count = 0
+        self._bars = []
 
-        self._clear_cache()
+        self._high_tree.clear()
+        self._low_tree.clear()
+        self._volume_tree.clear()
@@ -1,8 +1,12 @@
-from .client import RpcClient
+from .client import RpcClient, MultiplexRpcClient
 from .server import RpcServer
+from .shm import ShmRpcServer, ShmRpcClient
 
 
 __all__ = [
     "RpcClient",
+    "MultiplexRpcClient",
     "RpcServer",
+    "ShmRpcServer",
+    "ShmRpcClient",
 ]
@@ -0,0 +1,121 @@
+import threading
+from typing import Any
+
+
+# Reserved topic of cache invalidation published by RpcServer
+CACHE_TOPIC = "rpc_cache"
+
+
+def make_cache_key(args: tuple, kwargs: dict) -> tuple | None:
+    """
+    Key of call arguments, None if they are not hashable.
+    """
+    key: tuple = (args, tuple(sorted(kwargs.items())))
+
+    try:
+        hash(key)
+    except TypeError:
+        return None
+
+    return key
+
+
+class RpcCache:
+    """
+    Results of cacheable functions kept by RpcClient.
+
+    Version of each function is (server epoch, counter). Server bumps
+    counter on every invalidation and publishes it on CACHE_TOPIC, with
+    new results of some arguments as delta. A missed version or another
+    server epoch drops all results of the function.
+
+    Cached results are shared by callers and should be treated as read only.
+    """
+
+    def __init__(self) -> None:
+        """"""
+        self._lock: threading.Lock = threading.Lock()
+
+        self._versions: dict[str, tuple[str, int]] = {}
+        self._results: dict[str, dict[tuple, Any]] = {}
+
+        self.hit_count: int = 0
+        self.miss_count: int = 0
+
+    def get(self, name: str, key: tuple | None) -> tuple[bool, Any]:
+        """
+        Return (True, result) if call is cached, otherwise (False, None).
+        """
+        with self._lock:
+            results: dict[tuple, Any] | None = self._results.get(name, None)
+
+            if results is None or key is None or key not in results:
+                self.miss_count += 1
+                return False, None
+
+            self.hit_count += 1
+            return True, results[key]
+
+    def set(self, name: str, key: tuple | None, result: Any, version: tuple[str, int]) -> None:
+        """
+        Save result of a call computed by server at version.
+        """
+        if key is None:
+            return
+
+        with self._lock:
+            known: tuple[str, int] | None = self._versions.get(name, None)
+
+            if known and known[0] == version[0]:
+                # Result is older than an invalidation already received
+                if version[1] < known[1]:
+                    return
+                # Invalidation was missed, cached results can not be trusted
+                elif version[1] > known[1]:
+                    self._results.pop(name, None)
+            else:
+                self._results.pop(name, None)
+
+            self._versions[name] = version
+            self._results.setdefault(name, {})[key] = result
+
+    def update(self, name: str, version: tuple[str, int], delta: dict[tuple, Any] | None) -> None:
+        """
+        Apply invalidation published by server.
+
+        delta maps positional arguments to new results, None to drop all
+        results of the function. Results of calls with keyword arguments
+        can not be matched with delta, so they are dropped.
+        """
+        with self._lock:
+            known: tuple[str, int] | None = self._versions.get(name, None)
+
+            # Duplicate or stale message
+            if known and known[0] == version[0] and version[1] <= known[1]:
+                return
+
+            self._versions[name] = version
+
+            results: dict[tuple, Any] | None = self._results.get(name, None)
+            if results is None:
+                return
+
+            in_order: bool = bool(known) and known[0] == version[0] and version[1] == known[1] + 1      # type: ignore
+
+            if delta is None or not in_order:
+                self._results.pop(name)
+                return
+
+            for key in [key for key in results if key[1]]:
+                results.pop(key)
+
+            for args, result in delta.items():
+                results[(tuple(args), ())] = result
+
+    def clear(self) -> None:
+        """
+        Drop all cached results, e.g. after connection is lost.
+        """
+        with self._lock:
+            self._versions.clear()
+            self._results.clear()
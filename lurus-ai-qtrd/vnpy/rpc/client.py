@@ -1,11 +1,18 @@
+import asyncio
+import heapq
 import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from itertools import count
 from time import time
 from functools import lru_cache
 from typing import Any
 
 import zmq
 
-from .common import HEARTBEAT_TOPIC, HEARTBEAT_TOLERANCE
+from .cache import CACHE_TOPIC, RpcCache, make_cache_key
+from .common import HEARTBEAT_TOPIC, HEARTBEAT_TOLERANCE, HANDSHAKE_FRAME
+from .serializer import Serializer, get_serializer, get_default_serializers, serialize, deserialize
 
 
 class RemoteException(Exception):
@@ -29,8 +36,22 @@ class RemoteException(Exception):
 class RpcClient:
     """"""
 
-    def __init__(self) -> None:
-        """Constructor"""
+    def __init__(self, serializers: list[str] | None = None, cache: bool = False) -> None:
+        """
+        Constructor
+
+        serializers are names of accepted serializers in preference
+        order, negotiated with server before the first request.
+
+        cache enables answering calls of functions registered as
+        cacheable on server locally, until server invalidates them.
+        """
+        # Serializer related
+        if not serializers:
+            serializers = get_default_serializers()
+        self._serializers: dict[str, Serializer] = {name: get_serializer(name) for name in serializers}
+        self._req_serializers: list[Serializer] = []
+
         # zmq port related
         self._context: zmq.Context = zmq.Context()
 
@@ -52,6 +73,21 @@ class RpcClient:
 
         self._last_received_ping: float = time()
 
+        # Heartbeat is always required for connection check
+        self._socket_sub.setsockopt_string(zmq.SUBSCRIBE, HEARTBEAT_TOPIC)
+
+        # Sequenced topic related, value is sequence and server epoch of last processed data
+        self._sequences: dict[str, int] = {}
+        self._epochs: dict[str, str] = {}
+        self._sequence_lock: threading.RLock = threading.RLock()
+        self.gap_count: int = 0
+
+        # Client cache related
+        self._cache: RpcCache | None = None
+        if cache:
+            self._cache = RpcCache()
+            self.subscribe_topic(CACHE_TOPIC)
+
     @lru_cache(100)  # noqa
     def __getattr__(self, name: str) -> Any:
         """
@@ -62,12 +98,22 @@ class RpcClient:
             # Get timeout value from kwargs, default value is 30 seconds
             timeout: int = kwargs.pop("timeout", 30000)
 
+            # Answer from cache if possible
+            if self._cache:
+                key: tuple | None = make_cache_key(args, kwargs)
+                found, result = self._cache.get(name, key)
+                if found:
+                    return result
+
             # Generate request
             req: list = [name, args, kwargs]
 
             # Send request and wait for response
             with self._lock:
-                self._socket_req.send_pyobj(req)
+                if not self._req_serializers:
+                    self.negotiate(timeout)
+
+                self._socket_req.send_multipart(serialize(self._req_serializers, req), copy=False)
 
                 # Timeout reached without any data
                 n: int = self._socket_req.poll(timeout)
@@ -75,16 +121,42 @@ class RpcClient:
                     msg: str = f"Timeout of {timeout}ms reached for {req}"
                     raise RemoteException(msg)
 
-                rep = self._socket_req.recv_pyobj()
+                frames: list = self._socket_req.recv_multipart(copy=False)
+
+            # Server failed to decode request
+            if not frames[0].bytes:
+                raise RemoteException(frames[1].bytes.decode())
+
+            rep = deserialize(self._serializers, [f.buffer for f in frames])
 
             # Return response if successed; Trigger exception if failed
             if rep[0]:
+                # Result of cacheable function comes with its version
+                if self._cache and len(rep) > 2:
+                    self._cache.set(name, key, rep[1], rep[2])
                 return rep[1]
             else:
                 raise RemoteException(rep[1])
 
         return dorpc
 
+    def negotiate(self, timeout: int) -> None:
+        """
+        Agree on serializers with server, called with lock held.
+        """
+        names: str = ",".join(self._serializers.keys())
+        self._socket_req.send_multipart([HANDSHAKE_FRAME, names.encode()])
+
+        if not self._socket_req.poll(timeout):
+            raise RemoteException(f"Timeout of {timeout}ms reached for serializer negotiation")
+
+        frames: list = self._socket_req.recv_multipart()
+        common: list[str] = [name for name in frames[1].decode().split(",") if name]
+        if not common:
+            raise RemoteException(f"No serializer in {names} is accepted by server")
+
+        self._req_serializers = [self._serializers[name] for name in common]
+
     def start(
         self,
         req_address: str,
@@ -133,22 +205,42 @@ class RpcClient:
 
         while self._active:
             if not self._socket_sub.poll(pull_tolerance):
+                self.clear_cache()
                 self.on_disconnected()
                 continue
 
             # Receive data from subscribe socket
-            topic, data = self._socket_sub.recv_pyobj(flags=zmq.NOBLOCK)
+            frames: list = self._socket_sub.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+            self.process_published([f.buffer for f in frames])
+
+        # Close socket
+        self._socket_req.close()
+        self._socket_sub.close()
+
+    def process_published(self, frames: list) -> None:
+        """
+        Decode published message buffers and pass data to callback.
+        """
+        topic: str = bytes(frames[0]).decode()
+
+        # Unpack batch published by server, marked by empty BATCH_FRAME
+        if not len(frames[1]):
+            batch: list = deserialize(self._serializers, frames[2:])
+        else:
+            batch = [deserialize(self._serializers, frames[1:])]
 
+        for data in batch:
             if topic == HEARTBEAT_TOPIC:
                 self._last_received_ping = data
+            elif topic == CACHE_TOPIC:
+                if self._cache:
+                    self._cache.update(*data)
+            elif topic in self._sequences:
+                self.process_sequenced(topic, *data)
             else:
                 # Process data by callable function
                 self.callback(topic, data)
 
-        # Close socket
-        self._socket_req.close()
-        self._socket_sub.close()
-
     def callback(self, topic: str, data: Any) -> None:
         """
         Callable function
@@ -161,9 +253,376 @@ class RpcClient:
         """
         self._socket_sub.setsockopt_string(zmq.SUBSCRIBE, topic)
 
+    def subscribe_sequenced(self, topic: str) -> None:
+        """
+        Subscribe topic which is sequenced on server.
+
+        State of topic is loaded by sync_topic when the first data
+        arrives, and missed data is recovered the same way.
+        """
+        with self._sequence_lock:
+            self._sequences.setdefault(topic, 0)
+
+        self.subscribe_topic(topic)
+
+    def process_sequenced(self, topic: str, epoch: str, seq: int, data: Any) -> None:
+        """
+        Check sequence of data before passing it to callback.
+        """
+        with self._sequence_lock:
+            last: int = self._sequences[topic]
+            restarted: bool = epoch != self._epochs.get(topic, "")
+
+            # Already included in snapshot or replayed data
+            if not restarted and seq <= last:
+                return
+
+            # Sequence restarts with new epoch, so state is loaded again
+            if restarted or seq != last + 1:
+                if last and not restarted:
+                    self.gap_count += 1
+
+                try:
+                    self.sync_topic(topic)
+                except RemoteException:
+                    # Sequence is kept, so that next data retries recovery
+                    self.callback(topic, data)
+                    return
+
+                if epoch == self._epochs[topic] and seq <= self._sequences[topic]:
+                    return
+
+            self._epochs[topic] = epoch
+            self._sequences[topic] = seq
+            self.callback(topic, data)
+
+    def sync_topic(self, topic: str) -> None:
+        """
+        Load missed data of sequenced topic: a snapshot passed to
+        on_snapshot, or replayed data passed to callback.
+        """
+        with self._sequence_lock:
+            since: int = self._sequences[topic]
+            epoch: str = self._epochs.get(topic, "")
+            server_epoch, seq, snapshot, deltas = self.get_topic_snapshot(topic, since, epoch)
+
+            # All data of restarted server is new
+            if server_epoch != epoch:
+                since = 0
+
+            if snapshot is not None:
+                self.on_snapshot(topic, snapshot)
+
+            for delta_seq, data in deltas:
+                if delta_seq > since:
+                    self.callback(topic, data)
+
+            self._epochs[topic] = server_epoch
+            self._sequences[topic] = max(seq, since)
+
+    def on_snapshot(self, topic: str, data: Any) -> None:
+        """
+        Callback of full state of sequenced topic, which replaces local
+        state before following data.
+        """
+        pass
+
+    def clear_cache(self) -> None:
+        """
+        Drop cached results, which may miss invalidation when disconnected.
+        """
+        if self._cache:
+            self._cache.clear()
+
     def on_disconnected(self) -> None:
         """
         Callback when heartbeat is lost.
         """
         msg: str = f"RpcServer has no response over {HEARTBEAT_TOLERANCE} seconds, please check you connection."
         print(msg)
+
+
+@dataclass
+class PendingRequest:
+    """
+    Request of MultiplexRpcClient waiting for reply.
+    """
+
+    future: Future
+    handshake: bool
+    name: str = ""
+    key: tuple | None = None
+
+
+class MultiplexRpcClient(RpcClient):
+    """
+    RpcClient with DEALER socket, allowing many requests in flight.
+
+    Each request carries an id frame, replies are matched to pending
+    futures by an I/O thread. Timed out requests are dropped without
+    affecting the socket, and late replies are discarded.
+    """
+
+    def __init__(self, serializers: list[str] | None = None, cache: bool = False) -> None:
+        """Constructor"""
+        super().__init__(serializers, cache)
+
+        # Dealer socket (Request–reply pattern with request id)
+        self._socket_dealer: zmq.Socket = self._context.socket(zmq.DEALER)
+        self._socket_dealer.setsockopt(zmq.TCP_KEEPALIVE, 1)
+        self._socket_dealer.setsockopt(zmq.TCP_KEEPALIVE_IDLE, 60)
+        self._socket_dealer.setsockopt(zmq.LINGER, 0)
+
+        # Requests from caller threads are pushed to I/O thread by an inproc
+        # socket shared within lock, queue is unlimited so that send never blocks
+        self._inproc_address: str = f"inproc://rpc_client_{id(self)}"
+        self._socket_pull: zmq.Socket = self._context.socket(zmq.PULL)
+        self._socket_pull.setsockopt(zmq.RCVHWM, 0)
+        self._socket_pull.bind(self._inproc_address)
+
+        self._socket_push: zmq.Socket = self._context.socket(zmq.PUSH)
+        self._socket_push.setsockopt(zmq.SNDHWM, 0)
+        self._socket_push.setsockopt(zmq.LINGER, 0)
+        self._socket_push.connect(self._inproc_address)
+
+        # Pending requests related
+        self._request_count: count = count(1)
+        self._pending: dict[bytes, PendingRequest] = {}
+        self._deadlines: list[tuple[float, bytes]] = []
+        self._pending_lock: threading.Lock = threading.Lock()
+
+        self._io_thread: threading.Thread | None = None
+
+    @lru_cache(100)  # noqa
+    def __getattr__(self, name: str) -> Any:
+        """
+        Realize remote call function
+        """
+        def dorpc(*args: Any, **kwargs: Any) -> Any:
+            return self.call_async(name, *args, **kwargs).result()
+
+        return dorpc
+
+    def call_async(self, name: str, *args: Any, **kwargs: Any) -> Future:
+        """
+        Send request and return a future of the result.
+
+        Timeout in milliseconds can be passed with timeout keyword.
+        """
+        timeout: int = kwargs.pop("timeout", 30000)
+
+        # Answer from cache if possible
+        key: tuple | None = None
+        if self._cache:
+            key = make_cache_key(args, kwargs)
+            found, result = self._cache.get(name, key)
+            if found:
+                future: Future = Future()
+                future.set_result(result)
+                return future
+
+        if not self._req_serializers:
+            self.negotiate(timeout)
+
+        req: list = [name, args, kwargs]
+        frames: list = serialize(self._req_serializers, req)
+        return self.send_request(frames, timeout, False, name, key)
+
+    def acall(self, name: str, *args: Any, **kwargs: Any) -> asyncio.Future:
+        """
+        Send request and return an asyncio future of the result.
+        """
+        return asyncio.wrap_future(self.call_async(name, *args, **kwargs))
+
+    def negotiate(self, timeout: int) -> None:
+        """
+        Agree on serializers with server before the first request.
+        """
+        with self._lock:
+            if self._req_serializers:
+                return
+
+            names: str = ",".join(self._serializers.keys())
+            future: Future = self.send_request([HANDSHAKE_FRAME, names.encode()], timeout, True)
+
+            common: list[str] = [name for name in future.result().decode().split(",") if name]
+            if not common:
+                raise RemoteException(f"No serializer in {names} is accepted by server")
+
+            self._req_serializers = [self._serializers[name] for name in common]
+
+    def send_request(
+        self,
+        frames: list,
+        timeout: int,
+        handshake: bool,
+        name: str = "",
+        key: tuple | None = None
+    ) -> Future:
+        """
+        Register a pending future and pass request to I/O thread.
+        """
+        request_id: bytes = next(self._request_count).to_bytes(8, "little")
+        future: Future = Future()
+
+        # Checked within lock, so that request is either failed by I/O
+        # thread when stopped, or not registered at all
+        with self._pending_lock:
+            if not self._active:
+                raise RemoteException("RpcClient is not started")
+
+            self._pending[request_id] = PendingRequest(future, handshake, name, key)
+            heapq.heappush(self._deadlines, (time() + timeout / 1000, request_id))
+
+            self._socket_push.send_multipart([request_id, b""] + frames, copy=False)
+
+        return future
+
+    def start(
+        self,
+        req_address: str,
+        sub_address: str
+    ) -> None:
+        """
+        Start RpcClient
+        """
+        if self._active:
+            return
+
+        # Connect zmq port
+        self._socket_dealer.connect(req_address)
+        self._socket_sub.connect(sub_address)
+
+        # Start RpcClient status
+        self._active = True
+
+        # Start RpcClient thread and I/O thread
+        self._thread = threading.Thread(target=self.run)
+        self._thread.start()
+
+        self._io_thread = threading.Thread(target=self.run_io)
+        self._io_thread.start()
+
+        self._last_received_ping = time()
+
+    def join(self) -> None:
+        """"""
+        super().join()
+
+        if self._io_thread and self._io_thread.is_alive():
+            self._io_thread.join()
+        self._io_thread = None
+
+    def run_io(self) -> None:
+        """
+        Forward requests to server and resolve futures with replies.
+        """
+        poller: zmq.Poller = zmq.Poller()
+        poller.register(self._socket_dealer, zmq.POLLIN)
+        poller.register(self._socket_pull, zmq.POLLIN)
+
+        while self._active:
+            # Wake up no later than the nearest deadline
+            with self._pending_lock:
+                if self._deadlines:
+                    wait: float = max(self._deadlines[0][0] - time(), 0)
+                    timeout: int = min(int(wait * 1000) + 1, 1000)
+                else:
+                    timeout = 1000
+
+            events: dict = dict(poller.poll(timeout))
+
+            if self._socket_pull in events:
+                while True:
+                    try:
+                        frames: list = self._socket_pull.recv_multipart(zmq.NOBLOCK, copy=False)
+                    except zmq.Again:
+                        break
+                    self._socket_dealer.send_multipart(frames, copy=False)
+
+            if self._socket_dealer in events:
+                while True:
+                    try:
+                        frames = self._socket_dealer.recv_multipart(zmq.NOBLOCK, copy=False)
+                    except zmq.Again:
+                        break
+                    self.process_reply(frames)
+
+            self.check_timeout()
+
+        # Fail all pending requests
+        with self._pending_lock:
+            pending: list = list(self._pending.values())
+            self._pending.clear()
+            self._deadlines.clear()
+
+            # No request is sent after stopped
+            self._socket_push.close()
+
+        for request in pending:
+            request.future.set_exception(RemoteException("RpcClient is stopped"))
+
+        # Close socket
+        self._socket_pull.close()
+        self._socket_dealer.close()
+
+    def process_reply(self, frames: list) -> None:
+        """
+        Resolve pending future with reply frames: [request_id, b"", ...].
+        """
+        with self._pending_lock:
+            request: PendingRequest | None = self._pending.pop(frames[0].bytes, None)
+
+        # Reply of timed out request
+        if not request:
+            return
+
+        future: Future = request.future
+        body: list = frames[2:]
+
+        if request.handshake:
+            future.set_result(body[1].bytes)
+            return
+
+        # Server failed to decode request
+        if not len(body[0]):
+            future.set_exception(RemoteException(body[1].bytes.decode()))
+            return
+
+        try:
+            rep: Any = deserialize(self._serializers, [f.buffer for f in body])
+        except Exception as e:
+            future.set_exception(RemoteException(e))
+            return
+
+        # Return response if successed; Trigger exception if failed
+        if rep[0]:
+            # Result of cacheable function comes with its version
+            if self._cache and len(rep) > 2:
+                self._cache.set(request.name, request.key, rep[1], rep[2])
+            future.set_result(rep[1])
+        else:
+            future.set_exception(RemoteException(rep[1]))
+
+    def check_timeout(self) -> None:
+        """
+        Fail requests which exceed their deadline.
+        """
+        now: float = time()
+        expired: list[Future] = []
+
+        with self._pending_lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _deadline, request_id = heapq.heappop(self._deadlines)
+
+                request: PendingRequest | None = self._pending.pop(request_id, None)
+                if request:
+                    expired.append(request.future)
+
+            # Drop deadlines of answered requests when they pile up
+            if len(self._deadlines) > 2 * len(self._pending) + 1000:
+                self._deadlines = [d for d in self._deadlines if d[1] in self._pending]
+                heapq.heapify(self._deadlines)
+
+        for future in expired:
+            future.set_exception(RemoteException("Timeout reached for request"))
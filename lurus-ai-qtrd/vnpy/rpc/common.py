@@ -8,3 +8,9 @@ signal.signal(signal.SIGINT, signal.SIG_DFL)
 HEARTBEAT_TOPIC = "heartbeat"
 HEARTBEAT_INTERVAL = 10
 HEARTBEAT_TOLERANCE = 30
+
+# Empty serializer frame marks handshake and error messages
+HANDSHAKE_FRAME = b""
+
+# Empty frame after topic marks a batch of published data
+BATCH_FRAME = b""
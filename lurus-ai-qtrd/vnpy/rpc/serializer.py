@@ -0,0 +1,373 @@
+import pickle
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from dataclasses import fields, is_dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from enum import Enum
+from functools import lru_cache
+from typing import Any
+from zoneinfo import ZoneInfo
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+# Exceptions raised when an object is not supported by a serializer
+SERIALIZE_ERRORS: tuple[type[Exception], ...] = (TypeError, ValueError, OverflowError, pickle.PicklingError)
+
+
+class Serializer(ABC):
+    """
+    Convert objects to zmq frames and back.
+
+    The first frame carries the encoded object, following frames
+    carry out-of-band buffers which are sent without copying.
+    """
+
+    name: str = ""
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> list:
+        """
+        Encode object into list of bytes-like frames.
+        """
+        pass
+
+    @abstractmethod
+    def loads(self, frames: Sequence) -> Any:
+        """
+        Decode object from list of bytes-like frames.
+        """
+        pass
+
+
+class PickleSerializer(Serializer):
+    """
+    Pickle protocol 5 with out-of-band buffers.
+
+    Only use it between trusted processes, since loading pickle data
+    can execute arbitrary code.
+    """
+
+    name: str = "pickle"
+
+    def dumps(self, obj: Any) -> list:
+        """"""
+        buffers: list[pickle.PickleBuffer] = []
+        data: bytes = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        return [data] + [buffer.raw() for buffer in buffers]
+
+    def loads(self, frames: Sequence) -> Any:
+        """"""
+        return pickle.loads(frames[0], buffers=frames[1:])
+
+
+# Extension type codes of msgpack serializer
+EXT_TUPLE = 1
+EXT_ENUM = 2
+EXT_DATACLASS = 3
+EXT_DATETIME = 4
+EXT_DATE = 5
+EXT_TIME = 6
+EXT_TIMEDELTA = 7
+EXT_SET = 8
+EXT_NDARRAY = 9
+EXT_ARROW = 10
+EXT_ENUM_VALUE = 11
+
+SEPARATOR = "|"
+
+
+class MsgpackSerializer(Serializer):
+    """
+    Msgpack with native support of registered enums and dataclasses.
+
+    Only types registered with register_type can be decoded, so data
+    from untrusted peers never leads to arbitrary code execution. NumPy
+    arrays and Arrow tables are sent as separate zero-copy frames.
+    """
+
+    name: str = "msgpack"
+
+    types: dict[str, type] = {}
+
+    def __init__(self) -> None:
+        """"""
+        if not msgpack:
+            raise ImportError("msgpack is required by MsgpackSerializer")
+
+        if not self.types:
+            register_vnpy_types()
+
+    def dumps(self, obj: Any) -> list:
+        """"""
+        frames: list = [b""]
+        frames[0] = self.pack(obj, frames)
+        return frames
+
+    def loads(self, frames: Sequence) -> Any:
+        """"""
+        return self.unpack(frames[0], frames)
+
+    def pack(self, obj: Any, frames: list) -> bytes:
+        """
+        Pack object, appending out-of-band buffers to frames.
+        """
+        def default(o: Any) -> Any:
+            return self.encode_ext(o, frames)
+
+        data: bytes = msgpack.packb(obj, default=default, strict_types=True, use_bin_type=True)
+        return data
+
+    def unpack(self, data: bytes, frames: Sequence) -> Any:
+        """"""
+        def ext_hook(code: int, data: bytes) -> Any:
+            return self.decode_ext(code, data, frames)
+
+        return msgpack.unpackb(data, ext_hook=ext_hook, raw=False, strict_map_key=False)
+
+    def encode_ext(self, obj: Any, frames: list) -> Any:
+        """
+        Convert object not supported by msgpack into ExtType.
+        """
+        # Subclasses of builtin types are not packed natively in strict mode
+        if isinstance(obj, Enum):
+            name: str = type(obj).__name__
+            self.check_type(type(obj))
+
+            # Most enum values are str, which is joined with name directly
+            if isinstance(obj.value, str):
+                return msgpack.ExtType(EXT_ENUM, f"{name}{SEPARATOR}{obj.value}".encode())
+            return msgpack.ExtType(EXT_ENUM_VALUE, self.pack([name, obj.value], frames))
+        elif isinstance(obj, tuple):
+            return msgpack.ExtType(EXT_TUPLE, self.pack(list(obj), frames))
+        elif isinstance(obj, (set, frozenset)):
+            return msgpack.ExtType(EXT_SET, self.pack(list(obj), frames))
+        elif isinstance(obj, datetime):
+            tz: Any = obj.tzinfo
+            if tz is None:
+                tz_data: str = ""
+            elif isinstance(tz, ZoneInfo):
+                tz_data = tz.key
+            else:
+                tz_data = str(int(obj.utcoffset().total_seconds()))      # type: ignore
+            return msgpack.ExtType(EXT_DATETIME, f"{obj.replace(tzinfo=None).isoformat()}{SEPARATOR}{tz_data}".encode())
+        elif isinstance(obj, date):
+            return msgpack.ExtType(EXT_DATE, obj.isoformat().encode())
+        elif isinstance(obj, time):
+            return msgpack.ExtType(EXT_TIME, obj.isoformat().encode())
+        elif isinstance(obj, timedelta):
+            return msgpack.ExtType(EXT_TIMEDELTA, self.pack([obj.days, obj.seconds, obj.microseconds], frames))
+        elif is_dataclass(obj) and not isinstance(obj, type):
+            name = type(obj).__name__
+            self.check_type(type(obj))
+
+            # Field values in order, plus attributes set in __post_init__
+            names: tuple[str, ...] = get_field_names(type(obj))
+            values: list = [getattr(obj, n) for n in names]
+            attrs: dict = {k: v for k, v in vars(obj).items() if k not in get_field_set(type(obj))}
+            return msgpack.ExtType(EXT_DATACLASS, self.pack([name, values, attrs], frames))
+        elif np is not None and isinstance(obj, np.ndarray):
+            if obj.dtype.hasobject:
+                raise TypeError("Object array is not supported by MsgpackSerializer")
+
+            frames.append(np.ascontiguousarray(obj).data)
+            return msgpack.ExtType(EXT_NDARRAY, self.pack([obj.dtype.str, list(obj.shape), len(frames) - 1], frames))
+        elif np is not None and isinstance(obj, np.generic):
+            return obj.item()
+        elif pa is not None and isinstance(obj, (pa.Table, pa.RecordBatch)):
+            sink: pa.BufferOutputStream = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, obj.schema) as writer:
+                writer.write(obj)
+
+            frames.append(sink.getvalue())
+            is_table: bool = isinstance(obj, pa.Table)
+            return msgpack.ExtType(EXT_ARROW, self.pack([is_table, len(frames) - 1], frames))
+        elif isinstance(obj, int):
+            return int(obj)
+        elif isinstance(obj, float):
+            return float(obj)
+        elif isinstance(obj, str):
+            return str(obj)
+        elif isinstance(obj, dict):
+            return dict(obj)
+        elif isinstance(obj, list):
+            return list(obj)
+
+        raise TypeError(f"Object of type {type(obj).__name__} is not supported by MsgpackSerializer")
+
+    def decode_ext(self, code: int, data: bytes, frames: Sequence) -> Any:
+        """
+        Convert ExtType back into object.
+        """
+        if code == EXT_TUPLE:
+            return tuple(self.unpack(data, frames))
+        elif code == EXT_ENUM:
+            name, value = data.decode().split(SEPARATOR, 1)
+            return self.get_type(name)(value)
+        elif code == EXT_ENUM_VALUE:
+            name, value = self.unpack(data, frames)
+            return self.get_type(name)(value)
+        elif code == EXT_SET:
+            return set(self.unpack(data, frames))
+        elif code == EXT_DATETIME:
+            text, tz_data = data.decode().split(SEPARATOR, 1)
+            dt: datetime = datetime.fromisoformat(text)
+            if tz_data.lstrip("-").isdigit():
+                dt = dt.replace(tzinfo=timezone(timedelta(seconds=int(tz_data))))
+            elif tz_data:
+                dt = dt.replace(tzinfo=get_zoneinfo(tz_data))
+            return dt
+        elif code == EXT_DATE:
+            return date.fromisoformat(data.decode())
+        elif code == EXT_TIME:
+            return time.fromisoformat(data.decode())
+        elif code == EXT_TIMEDELTA:
+            days, seconds, microseconds = self.unpack(data, frames)
+            return timedelta(days, seconds, microseconds)
+        elif code == EXT_DATACLASS:
+            name, values, attrs = self.unpack(data, frames)
+            cls: type = self.get_type(name)
+
+            # Restore attributes directly like pickle, without calling __init__
+            obj: Any = cls.__new__(cls)
+            obj.__dict__.update(zip(get_field_names(cls), values, strict=True))
+            obj.__dict__.update(attrs)
+            return obj
+        elif code == EXT_NDARRAY:
+            dtype, shape, ix = self.unpack(data, frames)
+            return np.frombuffer(frames[ix], dtype=dtype).reshape(shape)
+        elif code == EXT_ARROW:
+            is_table, ix = self.unpack(data, frames)
+            reader: pa.RecordBatchStreamReader = pa.ipc.open_stream(pa.py_buffer(frames[ix]))
+            if is_table:
+                return reader.read_all()
+            else:
+                return reader.read_next_batch()
+
+        raise ValueError(f"Unknown msgpack extension type {code}")
+
+    def check_type(self, cls: type) -> None:
+        """"""
+        if self.types.get(cls.__name__, None) is not cls:
+            raise TypeError(f"Type {cls.__name__} is not registered in MsgpackSerializer")
+
+    def get_type(self, name: str) -> type:
+        """"""
+        cls: type | None = self.types.get(name, None)
+        if not cls:
+            raise ValueError(f"Type {name} is not registered in MsgpackSerializer")
+        return cls
+
+
+@lru_cache
+def get_field_names(cls: type) -> tuple[str, ...]:
+    """"""
+    return tuple(f.name for f in fields(cls))
+
+
+@lru_cache
+def get_field_set(cls: type) -> frozenset[str]:
+    """"""
+    return frozenset(get_field_names(cls))
+
+
+@lru_cache
+def get_zoneinfo(key: str) -> ZoneInfo:
+    """"""
+    return ZoneInfo(key)
+
+
+def register_type(cls: type) -> None:
+    """
+    Allow enum or dataclass type to be sent with MsgpackSerializer.
+    """
+    MsgpackSerializer.types[cls.__name__] = cls
+
+
+def register_vnpy_types() -> None:
+    """
+    Register enums and data objects of vnpy.trader.
+    """
+    from vnpy.trader import constant, object
+
+    for module in [constant, object]:
+        for value in vars(module).values():
+            if not isinstance(value, type) or value.__module__ != module.__name__:
+                continue
+
+            if issubclass(value, Enum) or is_dataclass(value):
+                register_type(value)
+
+
+SERIALIZERS: dict[str, type[Serializer]] = {
+    PickleSerializer.name: PickleSerializer,
+    MsgpackSerializer.name: MsgpackSerializer,
+}
+
+
+def register_serializer(serializer_class: type[Serializer]) -> None:
+    """
+    Add serializer which can be selected by name.
+    """
+    SERIALIZERS[serializer_class.name] = serializer_class
+
+
+def get_serializer(name: str) -> Serializer:
+    """"""
+    return SERIALIZERS[name]()
+
+
+def get_default_serializers() -> list[str]:
+    """
+    Serializer names in preference order, msgpack first if installed.
+    """
+    if msgpack:
+        return [MsgpackSerializer.name, PickleSerializer.name]
+    else:
+        return [PickleSerializer.name]
+
+
+def serialize(serializers: Sequence[Serializer], obj: Any) -> list:
+    """
+    Encode object with the first serializer which supports it.
+
+    The name of chosen serializer is put in the first frame.
+    """
+    error: Exception | None = None
+
+    for serializer in serializers:
+        try:
+            frames: list = serializer.dumps(obj)
+        except SERIALIZE_ERRORS as e:
+            error = e
+            continue
+
+        return [serializer.name.encode()] + frames
+
+    raise TypeError(f"Failed to serialize object of type {type(obj).__name__}: {error}")
+
+
+def deserialize(serializers: dict[str, Serializer], frames: Sequence) -> Any:
+    """
+    Decode frames produced by serialize.
+    """
+    name: str = bytes(frames[0]).decode()
+
+    serializer: Serializer | None = serializers.get(name, None)
+    if not serializer:
+        raise ValueError(f"Serializer {name} is not allowed")
+
+    return serializer.loads(frames[1:])
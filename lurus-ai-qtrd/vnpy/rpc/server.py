@@ -1,32 +1,131 @@
 import threading
 import traceback
-from time import time
+from collections import deque
+from uuid import uuid4
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from time import time, sleep, perf_counter
 from collections.abc import Callable
+from typing import Any
 
 import zmq
 
-from .common import HEARTBEAT_TOPIC, HEARTBEAT_INTERVAL
+from .cache import CACHE_TOPIC
+from .common import HEARTBEAT_TOPIC, HEARTBEAT_INTERVAL, HANDSHAKE_FRAME, BATCH_FRAME
+from .serializer import Serializer, get_serializer, get_default_serializers, serialize, deserialize
+
+
+POOL_THREAD = "thread"
+POOL_PROCESS = "process"
+
+
+@dataclass
+class FunctionStats:
+    """
+    Latency statistics of a registered function.
+    """
+
+    count: int = 0
+    error_count: int = 0
+    total_time: float = 0
+    max_time: float = 0
+    recent: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+    def update(self, cost: float, success: bool) -> None:
+        """"""
+        self.count += 1
+        self.total_time += cost
+        self.max_time = max(self.max_time, cost)
+        self.recent.append(cost)
+
+        if not success:
+            self.error_count += 1
+
+    def to_dict(self) -> dict:
+        """
+        Summary in milliseconds, percentiles over recent calls.
+        """
+        recent: list[float] = sorted(self.recent)
+
+        def percentile(q: float) -> float:
+            if not recent:
+                return 0
+            return recent[min(int(len(recent) * q), len(recent) - 1)] * 1000
+
+        return {
+            "count": self.count,
+            "error_count": self.error_count,
+            "mean": self.total_time / self.count * 1000 if self.count else 0,
+            "p50": percentile(0.5),
+            "p99": percentile(0.99),
+            "max": self.max_time * 1000,
+        }
 
 
 class RpcServer:
     """"""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        serializers: list[str] | None = None,
+        pool: str = "",
+        max_workers: int | None = None
+    ) -> None:
         """
         Constructor
+
+        serializers are names of accepted serializers in preference
+        order, remove "pickle" when clients are not trusted.
+
+        pool is "thread" or "process" to execute functions registered
+        as parallel in a worker pool, other functions run one by one in
+        order on a dedicated thread. By default all functions run
+        inline on the server thread.
         """
         # Save functions dict: key is function name, value is function object
         self._functions: dict[str, Callable] = {}
+        self._parallel_functions: set[str] = set()
+
+        # Worker pool related
+        self._pool: str = pool
+        self._max_workers: int | None = max_workers
+        self._executor: Executor | None = None
+        self._serial_executor: ThreadPoolExecutor | None = None
+        self._serial_lock: threading.Lock = threading.Lock()
+
+        # Client cache related, version is (server epoch, invalidation count)
+        self._cache_epoch: str = uuid4().hex[:8]
+        self._cache_versions: dict[str, tuple[str, int]] = {}
+        self._cache_lock: threading.Lock = threading.Lock()
+
+        # Latency statistics related
+        self._stats: dict[str, FunctionStats] = {}
+        self._stats_lock: threading.Lock = threading.Lock()
+
+        # Serializer related, the first one is used for publishing
+        if not serializers:
+            serializers = get_default_serializers()
+        self._serializers: dict[str, Serializer] = {name: get_serializer(name) for name in serializers}
+        self._pub_serializers: list[Serializer] = list(self._serializers.values())
 
         # Zmq port related
         self._context: zmq.Context = zmq.Context()
 
-        # Reply socket (Request–reply pattern)
-        self._socket_rep: zmq.Socket = self._context.socket(zmq.REP)
+        # Router socket (Request–reply pattern), serves both REQ and DEALER clients
+        self._socket_router: zmq.Socket = self._context.socket(zmq.ROUTER)
 
         # Publish socket (Publish–subscribe pattern)
         self._socket_pub: zmq.Socket = self._context.socket(zmq.PUB)
 
+        # Replies from worker pool are pushed back to server thread by inproc sockets
+        self._inproc_address: str = f"inproc://rpc_server_{id(self)}"
+        self._socket_pull: zmq.Socket = self._context.socket(zmq.PULL)
+        self._socket_pull.bind(self._inproc_address)
+
+        self._local: threading.local = threading.local()
+        self._push_sockets: list[zmq.Socket] = []
+
         # Worker thread related
         self._active: bool = False                          # RpcServer status
         self._thread: threading.Thread | None = None        # RpcServer thread
@@ -35,6 +134,19 @@ class RpcServer:
         # Heartbeat related
         self._heartbeat_at: float | None = None
 
+        # Batch publish related
+        self._batch_interval: float = 0
+        self._batch_thread: threading.Thread | None = None
+        self._batch_buffer: dict[str, list | dict] = {}
+        self._conflation_keys: dict[str, Callable[[Any], Any]] = {}
+
+        # Sequenced topic related, epoch tells sequences of restarted server apart
+        self._sequence_epoch: str = uuid4().hex[:8]
+        self._sequences: dict[str, int] = {}
+        self._histories: dict[str, deque[tuple[int, Any]]] = {}
+        self._snapshot_funcs: dict[str, Callable[[], Any]] = {}
+        self._sequence_lock: threading.Lock = threading.Lock()
+
     def is_active(self) -> bool:
         """"""
         return self._active
@@ -51,9 +163,18 @@ class RpcServer:
             return
 
         # Bind socket address
-        self._socket_rep.bind(rep_address)
+        self._socket_router.bind(rep_address)
         self._socket_pub.bind(pub_address)
 
+        # Start worker pool
+        if self._pool == POOL_THREAD:
+            self._executor = ThreadPoolExecutor(self._max_workers)
+        elif self._pool == POOL_PROCESS:
+            self._executor = ProcessPoolExecutor(self._max_workers, mp_context=get_context("spawn"))
+
+        if self._executor:
+            self._serial_executor = ThreadPoolExecutor(1)
+
         # Start RpcServer status
         self._active = True
 
@@ -61,6 +182,11 @@ class RpcServer:
         self._thread = threading.Thread(target=self.run)
         self._thread.start()
 
+        # Start batch publish thread
+        if self._batch_interval:
+            self._batch_thread = threading.Thread(target=self.run_batch)
+            self._batch_thread.start()
+
         # Init heartbeat publish timestamp
         self._heartbeat_at = time() + HEARTBEAT_INTERVAL
 
@@ -84,48 +210,426 @@ class RpcServer:
         """
         Run RpcServer functions
         """
+        poller: zmq.Poller = zmq.Poller()
+        poller.register(self._socket_router, zmq.POLLIN)
+        poller.register(self._socket_pull, zmq.POLLIN)
+
         while self._active:
-            # Poll response socket for 1 second
-            n: int = self._socket_rep.poll(1000)
+            # Poll router and inproc socket for 1 second
+            events: dict = dict(poller.poll(1000))
             self.check_heartbeat()
 
-            if not n:
+            # Forward replies finished by worker pool
+            if self._socket_pull in events:
+                while True:
+                    try:
+                        frames: list = self._socket_pull.recv_multipart(zmq.NOBLOCK, copy=False)
+                    except zmq.Again:
+                        break
+                    self._socket_router.send_multipart(frames, copy=False)
+
+            if self._socket_router not in events:
                 continue
 
-            # Receive request data from Reply socket
-            req = self._socket_rep.recv_pyobj()
+            # Receive request data from Router socket
+            frames = self._socket_router.recv_multipart(copy=False)
 
-            # Get function name and parameters
-            name, args, kwargs = req
+            # Split routing envelope (client identity, plus request id of
+            # DEALER client) from request body at the empty delimiter frame
+            ix: int = next((i for i, frame in enumerate(frames) if not len(frame)), -1)
+            if ix < 0:
+                continue
 
-            # Try to get and execute callable function object; capture exception information if it fails
-            try:
-                func: Callable = self._functions[name]
-                r: object = func(*args, **kwargs)
-                rep: list = [True, r]
-            except Exception as e:  # noqa
-                rep = [False, traceback.format_exc()]
+            envelope: list = frames[:ix + 1]
+            rep_frames: list | None = self.process_request(envelope, frames[ix + 1:])
+
+            # Send response back along the same envelope, unless dispatched to pool
+            if rep_frames is not None:
+                self._socket_router.send_multipart(envelope + rep_frames, copy=False)
 
-            # send callable response by Reply socket
-            self._socket_rep.send_pyobj(rep)
+        # Wait for the last batch to be published
+        if self._batch_thread:
+            self._batch_thread.join()
+            self._batch_thread = None
+
+        # Stop worker pool, running functions are waited for since their
+        # push sockets can only be closed after worker threads stop using them
+        for executor in [self._executor, self._serial_executor]:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+        self._serial_executor = None
 
         # Unbind socket address
+        for socket in self._push_sockets:
+            socket.close()
+        self._push_sockets.clear()
+
+        self._socket_pull.close()
         self._socket_pub.close()
-        self._socket_rep.close()
+        self._socket_router.close()
+
+    def process_request(self, envelope: list, frames: list) -> list | None:
+        """
+        Execute request frames and return reply frames.
+
+        Returns None if the request is dispatched to worker pool, which
+        sends reply asynchronously.
+        """
+        # Reply serializers negotiation from client
+        if not len(frames[0]):
+            return [HANDSHAKE_FRAME, self.negotiate(frames[1].bytes)]
+
+        # Decode request with serializer chosen by client
+        try:
+            serializer, name, args, kwargs = self.parse_request([f.buffer for f in frames])
+        except Exception:
+            return [HANDSHAKE_FRAME, traceback.format_exc().encode()]
+
+        start: float = perf_counter()
+
+        # Execute inline without worker pool
+        if not self._executor or not self._serial_executor:
+            rep: list = self.call_function(name, args, kwargs)
+            self.update_stats(name, start, rep[0])
+            return self.pack_reply(serializer, rep)
+
+        # Parallel functions in process pool are pickled to child process
+        if name in self._parallel_functions and self._pool == POOL_PROCESS:
+            version: tuple[str, int] | None = self._cache_versions.get(name, None)
+
+            future: Future = self._executor.submit(self._functions[name], *args, **kwargs)
+            future.add_done_callback(
+                lambda f: self.send_reply(envelope, serializer, name, start, get_future_reply(f, version))
+            )
+            return None
+
+        executor: Executor = self._serial_executor
+        if name in self._parallel_functions:
+            executor = self._executor
+
+        executor.submit(self.call_in_pool, envelope, serializer, name, args, kwargs, start)
+        return None
+
+    def call_in_pool(
+        self,
+        envelope: list,
+        serializer: Serializer,
+        name: str,
+        args: tuple,
+        kwargs: dict,
+        start: float
+    ) -> None:
+        """
+        Execute function in worker thread and send reply.
+        """
+        rep: list = self.call_function(name, args, kwargs)
+        self.send_reply(envelope, serializer, name, start, rep)
+
+    def send_reply(
+        self,
+        envelope: list,
+        serializer: Serializer,
+        name: str,
+        start: float,
+        rep: list
+    ) -> None:
+        """
+        Pass reply from worker thread to server thread.
+        """
+        self.update_stats(name, start, rep[0])
+
+        rep_frames: list = self.pack_reply(serializer, rep)
+        self.get_push_socket().send_multipart(envelope + rep_frames, copy=False)
+
+    def get_push_socket(self) -> zmq.Socket:
+        """
+        Get inproc push socket of current worker thread.
+        """
+        socket: zmq.Socket | None = getattr(self._local, "socket", None)
+
+        if not socket:
+            socket = self._context.socket(zmq.PUSH)
+            socket.connect(self._inproc_address)
+
+            self._local.socket = socket
+            with self._stats_lock:
+                self._push_sockets.append(socket)
+
+        return socket
+
+    def update_stats(self, name: str, start: float, success: bool) -> None:
+        """"""
+        cost: float = perf_counter() - start
+
+        with self._stats_lock:
+            stats: FunctionStats | None = self._stats.get(name, None)
+            if not stats:
+                stats = FunctionStats()
+                self._stats[name] = stats
+
+            stats.update(cost, success)
+
+    def get_function_stats(self) -> dict[str, dict]:
+        """
+        Get latency statistics (in milliseconds) of each function,
+        measured from receiving request to reply ready.
+        """
+        with self._stats_lock:
+            return {name: stats.to_dict() for name, stats in self._stats.items()}
+
+    def parse_request(self, frames: list) -> tuple[Serializer, str, tuple, dict]:
+        """
+        Decode request buffers into serializer, function name and parameters.
+        """
+        req: Any = deserialize(self._serializers, frames)
+        name, args, kwargs = req
+
+        serializer: Serializer = self._serializers[bytes(frames[0]).decode()]
+        return serializer, name, args, kwargs
+
+    def call_function(self, name: str, args: tuple, kwargs: dict) -> list:
+        """
+        Execute registered function, returns [success, result or traceback],
+        followed by cache version for cacheable function.
+        """
+        # Version is read before execution, so that result is never newer than it
+        version: tuple[str, int] | None = self._cache_versions.get(name, None)
+
+        # Try to get and execute callable function object; capture exception information if it fails
+        try:
+            func: Callable = self._functions[name]
+
+            # Order-sensitive functions never overlap, whichever thread calls them
+            if name in self._parallel_functions:
+                r: object = func(*args, **kwargs)
+            else:
+                with self._serial_lock:
+                    r = func(*args, **kwargs)
+
+            rep: list = [True, r]
+        except Exception as e:  # noqa
+            rep = [False, traceback.format_exc()]
+            return rep
+
+        if version:
+            rep.append(version)
+        return rep
+
+    def pack_reply(self, serializer: Serializer, rep: list) -> list:
+        """
+        Encode reply with the same serializer as request if possible.
+        """
+        serializers: list[Serializer] = [serializer] + [s for s in self._pub_serializers if s is not serializer]
+
+        try:
+            return serialize(serializers, rep)
+        except TypeError:
+            return serialize(serializers, [False, traceback.format_exc()])
 
     def publish(self, topic: str, data: object) -> None:
         """
         Publish data
         """
+        if topic in self._sequences:
+            self.publish_sequenced(topic, data)
+            return
+
+        self.send_data(topic, data)
+
+    def send_data(self, topic: str, data: object) -> None:
+        """
+        Send data immediately or put it into batch.
+        """
+        if self._batch_interval:
+            self.add_to_batch(topic, data)
+            return
+
+        frames: list = serialize(self._pub_serializers, data)
+        self.send_published([topic.encode()] + frames)
+
+    def set_sequenced(
+        self,
+        topic: str,
+        snapshot_func: Callable[[], Any] | None = None,
+        history_size: int = 10000
+    ) -> None:
+        """
+        Publish data of topic as (epoch, sequence, data), so that clients
+        can detect missed data and recover with get_topic_snapshot. Epoch
+        is changed when server restarts and sequence starts from 1 again.
+
+        snapshot_func returns full state of the topic. The last
+        history_size data are kept for replay, clients which missed more
+        load a snapshot instead. Data should be idempotent updates, like
+        the latest object of a key, since a snapshot may already include
+        the data published right after it.
+        """
+        if topic in self._conflation_keys:
+            raise ValueError(f"Conflated topic {topic} can not be sequenced")
+
+        with self._sequence_lock:
+            self._sequences.setdefault(topic, 0)
+            self._histories[topic] = deque(self._histories.get(topic, []), maxlen=history_size)
+
+            if snapshot_func:
+                self._snapshot_funcs[topic] = snapshot_func
+
+        self.register(self.get_topic_snapshot, parallel=True)
+
+    def publish_sequenced(self, topic: str, data: object) -> None:
+        """
+        Number data of topic and keep it in history.
+        """
+        # Sent within lock so that data goes out in sequence order
+        with self._sequence_lock:
+            seq: int = self._sequences[topic] + 1
+            self._sequences[topic] = seq
+            self._histories[topic].append((seq, data))
+
+            self.send_data(topic, (self._sequence_epoch, seq, data))
+
+    def get_topic_snapshot(
+        self,
+        topic: str,
+        since: int = 0,
+        epoch: str = ""
+    ) -> tuple[str, int, Any, list[tuple[int, Any]]]:
+        """
+        Get state of sequenced topic for a client whose last data is since
+        of epoch.
+
+        Returns (epoch, sequence, snapshot, deltas). If history still holds
+        all data after since, snapshot is None and deltas are replayed,
+        otherwise snapshot is the state at sequence and deltas is empty.
+        Sequence of another epoch is not comparable, so all data is loaded.
+        """
+        if epoch != self._sequence_epoch:
+            since = 0
+
+        with self._sequence_lock:
+            seq: int = self._sequences[topic]
+            history: deque[tuple[int, Any]] = self._histories[topic]
+
+            # Nothing missed, or history covers all missed data
+            first: int = history[0][0] if history else seq + 1
+            if since >= seq or first <= since + 1:
+                return self._sequence_epoch, seq, None, [item for item in history if item[0] > since]
+
+            snapshot_func: Callable[[], Any] | None = self._snapshot_funcs.get(topic, None)
+            if not snapshot_func:
+                raise ValueError(f"History of topic {topic} is not enough and no snapshot function is set")
+
+            return self._sequence_epoch, seq, snapshot_func(), []
+
+    def set_batch_publish(self, interval: float) -> None:
+        """
+        Collect published data per topic and send them in batch every
+        interval seconds, 0 to publish immediately. Call before start.
+
+        Order of data is kept within each topic, but not across topics.
+        """
+        self._batch_interval = interval
+
+    def set_conflation(self, topic: str, key_func: Callable[[Any], Any]) -> None:
+        """
+        Keep only the newest data of each key in a batch of the topic,
+        e.g. key_func=lambda tick: tick.vt_symbol for tick topic.
+        """
+        self._conflation_keys[topic] = key_func
+
+    def add_to_batch(self, topic: str, data: object) -> None:
+        """"""
+        key_func: Callable[[Any], Any] | None = self._conflation_keys.get(topic, None)
+
+        with self._lock:
+            if key_func:
+                conflated: dict = self._batch_buffer.setdefault(topic, {})      # type: ignore
+                conflated[key_func(data)] = data
+            else:
+                buffer: list = self._batch_buffer.setdefault(topic, [])         # type: ignore
+                buffer.append(data)
+
+    def run_batch(self) -> None:
+        """
+        Publish collected data periodically.
+        """
+        while self._active:
+            sleep(self._batch_interval)
+            self.flush_batch()
+
+        self.flush_batch()
+
+    def flush_batch(self) -> None:
+        """
+        Send one multipart message for each topic: [topic, BATCH_FRAME, data list].
+        """
+        with self._lock:
+            batch_buffer: dict[str, list | dict] = self._batch_buffer
+            self._batch_buffer = {}
+
+        for topic, buffer in batch_buffer.items():
+            if isinstance(buffer, dict):
+                buffer = list(buffer.values())
+
+            frames: list = serialize(self._pub_serializers, buffer)
+            self.send_published([topic.encode(), BATCH_FRAME] + frames)
+
+    def send_published(self, frames: list) -> None:
+        """
+        Send published message frames to subscribers.
+        """
         with self._lock:
-            self._socket_pub.send_pyobj([topic, data])
+            self._socket_pub.send_multipart(frames, copy=False)
+
+    def negotiate(self, data: bytes) -> bytes:
+        """
+        Choose serializers supported by both sides, in client preference order.
+        """
+        names: list[str] = [name for name in data.decode().split(",") if name in self._serializers]
+        return ",".join(names).encode()
 
-    def register(self, func: Callable) -> None:
+    def register(self, func: Callable, parallel: bool = False, cacheable: bool = False) -> None:
         """
         Register function
+
+        Parallel functions can run concurrently in worker pool, others
+        are order-sensitive and executed one by one. Functions for
+        process pool must be picklable.
+
+        Results of cacheable functions are kept by clients with cache
+        enabled, until invalidate is called for the function.
         """
         self._functions[func.__name__] = func
 
+        if parallel:
+            self._parallel_functions.add(func.__name__)
+        else:
+            self._parallel_functions.discard(func.__name__)
+
+        with self._cache_lock:
+            if cacheable:
+                self._cache_versions.setdefault(func.__name__, (self._cache_epoch, 0))
+            else:
+                self._cache_versions.pop(func.__name__, None)
+
+    def invalidate(self, name: str, delta: dict[tuple, Any] | None = None) -> None:
+        """
+        Notify clients that results of a cacheable function changed.
+
+        Call it after the data is updated. delta maps tuple of positional
+        arguments to new result, which replaces only those cached results,
+        e.g. {("rb2501.SHFE",): contract} for get_contract. Without delta
+        all cached results of the function are dropped.
+        """
+        with self._cache_lock:
+            epoch, count = self._cache_versions[name]
+            version: tuple[str, int] = (epoch, count + 1)
+            self._cache_versions[name] = version
+
+            # Published within lock so that versions are sent in order
+            self.publish(CACHE_TOPIC, (name, version, delta))
+
     def check_heartbeat(self) -> None:
         """
         Check whether it is required to send heartbeat.
@@ -138,3 +642,18 @@ class RpcServer:
 
             # Update timestamp of next publish
             self._heartbeat_at = now + HEARTBEAT_INTERVAL
+
+
+def get_future_reply(future: Future, version: tuple[str, int] | None = None) -> list:
+    """
+    Convert result of process pool future into [success, result or traceback],
+    followed by cache version if given.
+    """
+    try:
+        rep: list = [True, future.result()]
+    except Exception as e:
+        return [False, "".join(traceback.format_exception(e))]
+
+    if version:
+        rep.append(version)
+    return rep
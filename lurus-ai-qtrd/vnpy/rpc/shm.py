@@ -0,0 +1,548 @@
+import os
+import struct
+import sys
+import tempfile
+import threading
+import traceback
+from collections.abc import Callable
+from functools import lru_cache
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from time import perf_counter, sleep, time
+from typing import Any
+from uuid import uuid4
+
+import zmq
+
+from .cache import make_cache_key
+from .client import RpcClient, RemoteException
+from .common import HEARTBEAT_TOPIC, HEARTBEAT_TOLERANCE, HANDSHAKE_FRAME
+from .serializer import serialize, deserialize
+from .server import RpcServer
+
+
+# Layout of ring buffer header
+HEADER_SIZE = 64
+WRITE_POS = 0           # uint64, total bytes written
+READ_POS = 8            # uint64, total bytes read
+CAPACITY = 16           # uint64, size of data area
+WAITING = 24            # uint32, consumer is blocked on wake socket
+CLOSED = 28             # uint32, ring is closed by its owner
+ALIVE = 32              # float64, last keepalive time of owner
+
+BUFFER_SIZE = 16 * 1024 * 1024
+
+# Busy polling time before blocking on wake socket, spinning only
+# slows down the other side on a single core machine
+SPIN_TIME = 0.0002 if (os.cpu_count() or 1) > 1 else 0
+
+
+class ShmRingBuffer:
+    """
+    Single-producer single-consumer message ring in shared memory.
+
+    Consumer spins briefly on the write position and then blocks on a
+    zmq ipc socket, which producer only signals when consumer is waiting.
+    """
+
+    def __init__(self, name: str = "", size: int = 0) -> None:
+        """
+        Create a new ring if size is given, otherwise attach to ring of name.
+        """
+        if size:
+            self.shm: SharedMemory = SharedMemory(name=name or None, create=True, size=HEADER_SIZE + size)
+            self.shm.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+            struct.pack_into("<Q", self.shm.buf, CAPACITY, size)
+            self.owner: bool = True
+        else:
+            self.shm = attach_shared_memory(name)
+            self.owner = False
+
+        self.name: str = self.shm.name
+        self.buf: memoryview = self.shm.buf
+        self.capacity: int = struct.unpack_from("<Q", self.buf, CAPACITY)[0]
+
+        self.socket: zmq.Socket | None = None
+
+    @property
+    def wake_address(self) -> str:
+        """"""
+        path: Path = Path(tempfile.gettempdir()).joinpath(f"vnpy_{self.name.strip('/')}.ipc")
+        return f"ipc://{path}"
+
+    def open_consumer(self, context: zmq.Context) -> None:
+        """"""
+        self.socket = context.socket(zmq.PULL)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(self.wake_address)
+
+    def open_producer(self, context: zmq.Context) -> None:
+        """"""
+        self.socket = context.socket(zmq.PUSH)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.setsockopt(zmq.RECONNECT_IVL, 10)
+        self.socket.connect(self.wake_address)
+
+    def get(self, offset: int, fmt: str) -> int:
+        """"""
+        value: int = struct.unpack_from(fmt, self.buf, offset)[0]
+        return value
+
+    def set(self, offset: int, fmt: str, value: int) -> None:
+        """"""
+        struct.pack_into(fmt, self.buf, offset, value)
+
+    def is_closed(self) -> bool:
+        """"""
+        return bool(self.get(CLOSED, "<I"))
+
+    def keep_alive(self) -> None:
+        """
+        Mark owner process as alive, checked by the other side.
+        """
+        struct.pack_into("<d", self.buf, ALIVE, time())
+
+    def is_alive(self, tolerance: float) -> bool:
+        """"""
+        alive_time: float = struct.unpack_from("<d", self.buf, ALIVE)[0]
+        return time() - alive_time < tolerance
+
+    def write(self, frames: list) -> bool:
+        """
+        Append a message of frames, returns False if ring is full.
+        """
+        views: list[memoryview] = [memoryview(f).cast("B") for f in frames]
+        size: int = 8 + 4 * len(views) + sum(v.nbytes for v in views)
+
+        if size > self.capacity:
+            raise ValueError(f"Message of {size} bytes exceeds ring capacity {self.capacity}")
+
+        write_pos: int = self.get(WRITE_POS, "<Q")
+        read_pos: int = self.get(READ_POS, "<Q")
+        if size > self.capacity - (write_pos - read_pos):
+            return False
+
+        data: bytes = encode_frames(views)
+
+        self.copy_in(write_pos, struct.pack("<I", len(data)))
+        self.copy_in(write_pos + 4, data)
+        self.set(WRITE_POS, "<Q", write_pos + size)
+
+        # Wake up consumer blocked on socket
+        if self.get(WAITING, "<I") and self.socket:
+            try:
+                self.socket.send(b"", zmq.NOBLOCK)
+            except zmq.Again:
+                pass
+
+        return True
+
+    def read(self, timeout: int) -> list[bytes] | None:
+        """
+        Pop the next message, waiting at most timeout milliseconds.
+        """
+        now: float = perf_counter()
+        spin_end: float = now + SPIN_TIME
+        deadline: float = now + timeout / 1000
+
+        while True:
+            if self.get(WRITE_POS, "<Q") != self.get(READ_POS, "<Q"):
+                return self.pop()
+
+            now = perf_counter()
+            if now >= deadline:
+                return None
+            elif now < spin_end:
+                continue
+
+            # Block on wake socket, check again after flag is set to avoid lost wakeup
+            self.set(WAITING, "<I", 1)
+
+            if self.get(WRITE_POS, "<Q") == self.get(READ_POS, "<Q") and self.socket:
+                wait: int = min(int((deadline - now) * 1000) + 1, 100)
+                if self.socket.poll(wait):
+                    while True:
+                        try:
+                            self.socket.recv(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+
+            self.set(WAITING, "<I", 0)
+
+    def pop(self) -> list[bytes]:
+        """"""
+        read_pos: int = self.get(READ_POS, "<Q")
+
+        size: int = struct.unpack("<I", self.copy_out(read_pos, 4))[0]
+        data: bytes = self.copy_out(read_pos + 4, size)
+
+        self.set(READ_POS, "<Q", read_pos + 4 + size)
+        return decode_frames(data)
+
+    def copy_in(self, pos: int, data: bytes) -> None:
+        """
+        Copy data into ring at position, wrapping around the end.
+        """
+        ix: int = pos % self.capacity
+        first: int = min(len(data), self.capacity - ix)
+
+        self.buf[HEADER_SIZE + ix: HEADER_SIZE + ix + first] = data[:first]
+        if first < len(data):
+            self.buf[HEADER_SIZE: HEADER_SIZE + len(data) - first] = data[first:]
+
+    def copy_out(self, pos: int, size: int) -> bytes:
+        """"""
+        ix: int = pos % self.capacity
+        first: int = min(size, self.capacity - ix)
+
+        data: bytes = bytes(self.buf[HEADER_SIZE + ix: HEADER_SIZE + ix + first])
+        if first < size:
+            data += bytes(self.buf[HEADER_SIZE: HEADER_SIZE + size - first])
+        return data
+
+    def close(self) -> None:
+        """
+        Close ring, the owner also removes shared memory segment.
+        """
+        if self.owner:
+            self.set(CLOSED, "<I", 1)
+
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+
+        del self.buf
+        self.shm.close()
+
+        if self.owner:
+            self.shm.unlink()
+
+
+def attach_shared_memory(name: str) -> SharedMemory:
+    """
+    Attach to existing segment without registering it to resource tracker.
+
+    Otherwise the tracker of this process unlinks the segment on exit,
+    while it is still used by its owner.
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)     # type: ignore
+
+    register: Callable = resource_tracker.register
+    resource_tracker.register = lambda *args: None      # type: ignore
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def encode_frames(views: list[memoryview]) -> bytes:
+    """
+    Pack byte views as: count, then length and content of each frame.
+    """
+    parts: list = [struct.pack(f"<I{len(views)}I", len(views), *[v.nbytes for v in views])]
+    parts.extend(views)
+    return b"".join(parts)
+
+
+def decode_frames(data: bytes) -> list[bytes]:
+    """"""
+    view: memoryview = memoryview(data)
+
+    count: int = struct.unpack_from("<I", view)[0]
+    sizes: tuple = struct.unpack_from(f"<{count}I", view, 4)
+
+    frames: list = []
+    pos: int = 4 + 4 * count
+    for size in sizes:
+        frames.append(view[pos: pos + size])
+        pos += size
+    return frames
+
+
+class ShmConnection:
+    """
+    Rings attached by server for one shared memory client.
+    """
+
+    def __init__(self, context: zmq.Context, req_name: str, rep_name: str, pub_name: str) -> None:
+        """"""
+        self.req_ring: ShmRingBuffer = ShmRingBuffer(req_name)
+        self.rep_ring: ShmRingBuffer = ShmRingBuffer(rep_name)
+        self.pub_ring: ShmRingBuffer = ShmRingBuffer(pub_name)
+
+        self.req_ring.open_consumer(context)
+        self.rep_ring.open_producer(context)
+        self.pub_ring.open_producer(context)
+
+        self.active: bool = True
+        self.dropped: int = 0
+
+    def close(self) -> None:
+        """"""
+        for ring in [self.req_ring, self.rep_ring, self.pub_ring]:
+            ring.close()
+
+
+class ShmRpcServer(RpcServer):
+    """
+    RpcServer which also serves clients on the same host through
+    shared memory rings.
+
+    ShmRpcClient attaches with shm_connect over the normal request
+    socket. Each shared memory client gets its own server thread,
+    order-sensitive functions are still executed one at a time.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """"""
+        super().__init__(*args, **kwargs)
+
+        self._shm_connections: dict[str, ShmConnection] = {}
+        self._shm_threads: list[threading.Thread] = []
+
+        self.register(self.shm_connect, parallel=True)
+        self.register(self.shm_disconnect, parallel=True)
+
+    def shm_connect(self, client_id: str, req_name: str, rep_name: str, pub_name: str) -> bool:
+        """
+        Attach rings created by a client and start serving it.
+        """
+        connection: ShmConnection = ShmConnection(self._context, req_name, rep_name, pub_name)
+
+        with self._lock:
+            self._shm_connections[client_id] = connection
+
+        thread: threading.Thread = threading.Thread(target=self.run_shm, args=(client_id, connection))
+        thread.start()
+        self._shm_threads.append(thread)
+
+        return True
+
+    def shm_disconnect(self, client_id: str) -> bool:
+        """"""
+        with self._lock:
+            connection: ShmConnection | None = self._shm_connections.pop(client_id, None)
+
+        if connection:
+            connection.active = False
+        return True
+
+    def run_shm(self, client_id: str, connection: ShmConnection) -> None:
+        """
+        Serve requests of a shared memory client: [seq, serializer, ...].
+        """
+        while self._active and connection.active and not connection.req_ring.is_closed():
+            frames: list | None = connection.req_ring.read(1000)
+            if not frames:
+                # Client process exited without shm_disconnect
+                if not connection.req_ring.is_alive(HEARTBEAT_TOLERANCE):
+                    break
+                continue
+
+            seq: bytes = frames[0]
+            rep_frames: list = self.process_shm_request(frames[1:])
+
+            while not connection.rep_ring.write([seq] + rep_frames):
+                if not connection.active or connection.rep_ring.is_closed():
+                    break
+                sleep(0.001)
+
+        with self._lock:
+            self._shm_connections.pop(client_id, None)
+
+        connection.close()
+
+    def process_shm_request(self, frames: list) -> list:
+        """"""
+        try:
+            serializer, name, args, kwargs = self.parse_request(frames)
+        except Exception:
+            return [HANDSHAKE_FRAME, traceback.format_exc().encode()]
+
+        start: float = perf_counter()
+        rep: list = self.call_function(name, args, kwargs)
+        self.update_stats(name, start, rep[0])
+
+        return self.pack_reply(serializer, rep)
+
+    def send_published(self, frames: list) -> None:
+        """
+        Publish to socket subscribers and shared memory clients.
+        """
+        super().send_published(frames)
+
+        with self._lock:
+            for connection in self._shm_connections.values():
+                # Drop data for slow client, like PUB socket at high water mark
+                if not connection.pub_ring.write(frames):
+                    connection.dropped += 1
+
+    def join(self) -> None:
+        """"""
+        super().join()
+
+        for thread in self._shm_threads:
+            thread.join()
+        self._shm_threads.clear()
+
+
+class ShmRpcClient(RpcClient):
+    """
+    RpcClient talking to ShmRpcServer on the same host through shared
+    memory rings instead of sockets.
+
+    Only serializer negotiation and shm_connect go through the request
+    socket, sub_address is not used.
+    """
+
+    def __init__(
+        self,
+        serializers: list[str] | None = None,
+        buffer_size: int = BUFFER_SIZE,
+        cache: bool = False
+    ) -> None:
+        """"""
+        # Server writes all topics into pub ring, filtered here like SUB socket
+        self._topics: set[bytes] = {HEARTBEAT_TOPIC.encode()}
+
+        super().__init__(serializers, cache)
+
+        self._client_id: str = uuid4().hex
+        self._seq: int = 0
+
+        self._req_ring: ShmRingBuffer = ShmRingBuffer(size=buffer_size)
+        self._rep_ring: ShmRingBuffer = ShmRingBuffer(size=buffer_size)
+        self._pub_ring: ShmRingBuffer = ShmRingBuffer(size=buffer_size)
+
+        self._req_ring.open_producer(self._context)
+        self._rep_ring.open_consumer(self._context)
+        self._pub_ring.open_consumer(self._context)
+
+    @lru_cache(100)  # noqa
+    def __getattr__(self, name: str) -> Any:
+        """
+        Realize remote call function
+        """
+        def dorpc(*args: Any, **kwargs: Any) -> Any:
+            # Get timeout value from kwargs, default value is 30 seconds
+            timeout: int = kwargs.pop("timeout", 30000)
+
+            # Answer from cache if possible
+            if self._cache:
+                key: tuple | None = make_cache_key(args, kwargs)
+                found, result = self._cache.get(name, key)
+                if found:
+                    return result
+
+            req: list = [name, args, kwargs]
+
+            with self._lock:
+                self._seq += 1
+                seq: bytes = self._seq.to_bytes(8, "little")
+
+                frames: list = serialize(self._req_serializers, req)
+                if not self._req_ring.write([seq] + frames):
+                    raise RemoteException(f"Request buffer is full for {req}")
+
+                # Skip replies of previous timed out requests
+                deadline: float = time() + timeout / 1000
+                while True:
+                    wait: int = int((deadline - time()) * 1000)
+                    rep_frames: list | None = self._rep_ring.read(max(wait, 0))
+
+                    if rep_frames is None:
+                        msg: str = f"Timeout of {timeout}ms reached for {req}"
+                        raise RemoteException(msg)
+                    elif bytes(rep_frames[0]) == seq:
+                        break
+
+            # Server failed to decode request
+            if not len(rep_frames[1]):
+                raise RemoteException(bytes(rep_frames[2]).decode())
+
+            rep: Any = deserialize(self._serializers, rep_frames[1:])
+
+            # Return response if successed; Trigger exception if failed
+            if rep[0]:
+                # Result of cacheable function comes with its version
+                if self._cache and len(rep) > 2:
+                    self._cache.set(name, key, rep[1], rep[2])
+                return rep[1]
+            else:
+                raise RemoteException(rep[1])
+
+        return dorpc
+
+    def start(
+        self,
+        req_address: str,
+        sub_address: str = ""
+    ) -> None:
+        """
+        Start RpcClient
+        """
+        if self._active:
+            return
+
+        # Attach rings to server through request socket
+        self._socket_req.connect(req_address)
+        self._req_ring.keep_alive()
+
+        with self._lock:
+            self.negotiate(30000)
+
+        remote_connect: Any = RpcClient.__getattr__(self, "shm_connect")
+        remote_connect(self._client_id, self._req_ring.name, self._rep_ring.name, self._pub_ring.name)
+
+        # Start RpcClient status
+        self._active = True
+
+        # Start RpcClient thread
+        self._thread = threading.Thread(target=self.run)
+        self._thread.start()
+
+        self._last_received_ping = time()
+
+    def subscribe_topic(self, topic: str) -> None:
+        """
+        Subscribe data
+        """
+        self._topics.add(topic.encode())
+
+    def run(self) -> None:
+        """
+        Process data published through shared memory.
+        """
+        last_received: float = time()
+
+        while self._active:
+            self._req_ring.keep_alive()
+
+            frames: list | None = self._pub_ring.read(1000)
+
+            if frames:
+                last_received = time()
+
+                topic: bytes = bytes(frames[0])
+                if any(topic.startswith(t) for t in self._topics):
+                    self.process_published(frames)
+            elif time() - last_received > HEARTBEAT_TOLERANCE:
+                last_received = time()
+                self.clear_cache()
+                self.on_disconnected()
+
+        # Detach from server
+        try:
+            remote_disconnect: Any = RpcClient.__getattr__(self, "shm_disconnect")
+            remote_disconnect(self._client_id, timeout=1000)
+        except RemoteException:
+            pass
+
+        # Close rings and socket
+        for ring in [self._req_ring, self._rep_ring, self._pub_ring]:
+            ring.close()
+
+        self._socket_req.close()
+        self._socket_sub.close()
@@ -1,11 +1,14 @@
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
 from itertools import product
+from typing import TYPE_CHECKING
 from concurrent.futures import ProcessPoolExecutor
 from random import random, choice
 from time import perf_counter
 from multiprocessing import get_context
 from multiprocessing.context import BaseContext
-from multiprocessing.managers import DictProxy
+from multiprocessing.managers import DictProxy, SyncManager
+from multiprocessing.pool import Pool
+from contextlib import contextmanager, ExitStack
 from _collections_abc import dict_keys, dict_values, Iterable
 
 from tqdm import tqdm
@@ -13,6 +16,9 @@ from deap import creator, base, tools, algorithms       # type: ignore
 
 from .locale import _
 
+if TYPE_CHECKING:
+    from .optimize_rpc import OptimizationCoordinator
+
 OUTPUT_FUNC = Callable[[str], None]
 EVALUATE_FUNC = Callable[[dict], dict]
 KEY_FUNC = Callable[[tuple], float]
@@ -101,9 +107,19 @@ def run_bf_optimization(
     optimization_setting: OptimizationSetting,
     key_func: KEY_FUNC,
     max_workers: int | None = None,
-    output: OUTPUT_FUNC = print
+    output: OUTPUT_FUNC = print,
+    backend: str = "process",
+    rep_address: str = "",
+    pub_address: str = "",
 ) -> list[tuple]:
-    """Run brutal force optimization"""
+    """
+    Run brutal force optimization
+
+    With backend="rpc", settings are evaluated by workers connected
+    to rep_address/pub_address (see vnpy.trader.optimize_rpc), and
+    max_workers is the number of extra worker processes started on
+    this host.
+    """
     settings: list[dict] = optimization_setting.generate_settings()
 
     output(_("开始执行穷举算法优化"))
@@ -111,22 +127,29 @@ def run_bf_optimization(
 
     start: float = perf_counter()
 
-    with ProcessPoolExecutor(
-        max_workers,
-        mp_context=get_context("spawn")
-    ) as executor:
-        it: Iterable = tqdm(
-            executor.map(evaluate_func, settings),
-            total=len(settings)
-        )
-        results: list[tuple] = list(it)
-        results.sort(reverse=True, key=key_func)
+    if backend == "rpc":
+        with start_coordinator(evaluate_func, max_workers, output, rep_address, pub_address) as coordinator:
+            progress_bar: tqdm = tqdm(total=len(settings))
+            results: list[tuple] = coordinator.map(settings, progress_bar.update)
+            progress_bar.close()
+    else:
+        with ProcessPoolExecutor(
+            max_workers,
+            mp_context=get_context("spawn")
+        ) as executor:
+            it: Iterable = tqdm(
+                executor.map(evaluate_func, settings),
+                total=len(settings)
+            )
+            results = list(it)
 
-        end: float = perf_counter()
-        cost: int = int(end - start)
-        output(_("穷举算法优化完成，耗时{}秒").format(cost))
+    results.sort(reverse=True, key=key_func)
 
-        return results
+    end: float = perf_counter()
+    cost: int = int(end - start)
+    output(_("穷举算法优化完成，耗时{}秒").format(cost))
+
+    return results
 
 
 def run_ga_optimization(
@@ -142,6 +165,9 @@ def run_ga_optimization(
     mutpb: float | None = None,             # mutation probability: probability that an offspring is produced by mutation
     indpb: float = 1.0,                     # independent probability: probability for each gene to be mutated
     output: OUTPUT_FUNC = print,
+    backend: str = "process",               # "process" for local process pool, "rpc" for remote workers
+    rep_address: str = "",                  # coordinator addresses used by rpc backend
+    pub_address: str = "",
 ) -> list[tuple]:
     """Run genetic algorithm optimization"""
     # Define functions for generate parameter randomly
@@ -161,12 +187,7 @@ def run_ga_optimization(
                 individual[i] = paramlist[i]
         return individual,
 
-    # Set up multiprocessing Pool and Manager
-    ctx: BaseContext = get_context("spawn")
-    with ctx.Manager() as manager, ctx.Pool(max_workers) as pool:
-        # Create shared dict for result cache
-        cache: DictProxy[tuple, tuple] = manager.dict()
-
+    with ExitStack() as stack:
         # Set up toolbox
         toolbox: base.Toolbox = base.Toolbox()
         toolbox.register("individual", tools.initIterate, creator.Individual, generate_parameter)
@@ -174,7 +195,24 @@ def run_ga_optimization(
         toolbox.register("mate", tools.cxTwoPoint)
         toolbox.register("mutate", mutate_individual, indpb=indpb)
         toolbox.register("select", tools.selNSGA2)
-        toolbox.register("map", pool.map)
+
+        if backend == "rpc":
+            # Evaluate on remote workers and keep result cache locally
+            coordinator: OptimizationCoordinator = stack.enter_context(
+                start_coordinator(evaluate_func, max_workers, output, rep_address, pub_address)
+            )
+            cache: dict | DictProxy[tuple, tuple] = {}
+            toolbox.register("map", ga_rpc_map, coordinator, cache)
+        else:
+            # Set up multiprocessing Pool and Manager
+            ctx: BaseContext = get_context("spawn")
+            manager: SyncManager = stack.enter_context(ctx.Manager())
+            pool: Pool = stack.enter_context(ctx.Pool(max_workers))
+
+            # Create shared dict for result cache
+            cache = manager.dict()
+            toolbox.register("map", pool.map)
+
         toolbox.register(
             "evaluate",
             ga_evaluate,
@@ -248,3 +286,74 @@ def ga_evaluate(
 
     value: float = key_func(result)
     return (value, )
+
+
+def ga_rpc_map(
+    coordinator: "OptimizationCoordinator",
+    cache: dict,
+    func: Callable,
+    population: list
+) -> list:
+    """
+    Map function of genetic algorithm with rpc backend.
+
+    Uncached individuals are evaluated by remote workers first, so func
+    only reads results from cache.
+    """
+    keys: list[tuple] = list({tuple(individual) for individual in population if tuple(individual) not in cache})
+
+    if keys:
+        results: list = coordinator.map([dict(key) for key in keys])
+        cache.update(zip(keys, results, strict=True))
+
+    return list(map(func, population))
+
+
+@contextmanager
+def start_coordinator(
+    evaluate_func: EVALUATE_FUNC,
+    local_workers: int | None,
+    output: OUTPUT_FUNC,
+    rep_address: str,
+    pub_address: str
+) -> Iterator["OptimizationCoordinator"]:
+    """
+    Start coordinator of rpc backend together with local worker processes.
+    """
+    # Import here to keep vnpy.rpc out of process backend
+    from .optimize_rpc import (
+        OptimizationCoordinator,
+        RPC_REP_ADDRESS,
+        RPC_PUB_ADDRESS,
+        start_optimization_workers,
+        to_connect_address
+    )
+
+    rep_address = rep_address or RPC_REP_ADDRESS
+    pub_address = pub_address or RPC_PUB_ADDRESS
+
+    coordinator: OptimizationCoordinator = OptimizationCoordinator(output=output)
+    coordinator.set_evaluate_func(evaluate_func)
+    coordinator.start(rep_address, pub_address)
+
+    output(_("优化协调服务启动，请求地址{}，广播地址{}").format(rep_address, pub_address))
+
+    processes: list = []
+    if local_workers:
+        processes = start_optimization_workers(
+            to_connect_address(rep_address),
+            to_connect_address(pub_address),
+            local_workers
+        )
+    else:
+        output(_("等待远程优化节点连接，超过{}秒未连接则优化失败").format(coordinator.connect_timeout))
+
+    try:
+        yield coordinator
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+        coordinator.stop()
+        coordinator.join()
@@ -0,0 +1,475 @@
+import os
+import socket
+import threading
+import traceback
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from multiprocessing.context import SpawnProcess
+from time import time, sleep
+from typing import Any
+from uuid import uuid4
+
+import zmq
+
+from ..rpc import RpcServer, RpcClient
+from ..rpc.client import RemoteException
+from .locale import _
+
+
+OPTIMIZATION_TOPIC = "optimization"
+
+RPC_REP_ADDRESS = "tcp://*:2015"
+RPC_PUB_ADDRESS = "tcp://*:4103"
+
+KEEPALIVE_INTERVAL = 2
+WORKER_TIMEOUT = 10
+CONNECT_TIMEOUT = 60
+MAX_RETRIES = 3
+
+
+@dataclass
+class OptimizationTask:
+    """
+    A batch of parameter settings dispatched to one worker.
+    """
+
+    task_id: int
+    items: list[tuple[int, dict]]
+    failures: int = 0
+    finished: bool = False
+    dispatched_at: float = 0
+    workers: set[str] = field(default_factory=set)
+
+
+@dataclass
+class WorkerInfo:
+    """
+    State of a registered optimization worker.
+    """
+
+    worker_id: str
+    last_seen: float
+    tasks: set[int] = field(default_factory=set)
+    finished: int = 0
+
+
+class OptimizationCoordinator(RpcServer):
+    """
+    Distribute parameter batches to remote workers with RpcServer.
+
+    Workers pull batches with fetch_task and push results back with
+    submit_result. Idle workers steal duplicates of the slowest running
+    batch once the queue is empty, and batches held by a worker which
+    stopped sending keepalive are requeued. A job fails if no worker is
+    connected for connect_timeout seconds.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 1,
+        worker_timeout: float = WORKER_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        output: Callable[[str], None] = print,
+        connect_timeout: float = CONNECT_TIMEOUT
+    ) -> None:
+        """"""
+        super().__init__()
+
+        self.batch_size: int = batch_size
+        self.worker_timeout: float = worker_timeout
+        self.max_retries: int = max_retries
+        self.connect_timeout: float = connect_timeout
+        self.output: Callable[[str], None] = output
+
+        self._task_lock: threading.Lock = threading.Lock()
+        self._task_event: threading.Event = threading.Event()
+
+        self._workers: dict[str, WorkerInfo] = {}
+
+        self._func_id: int = 0
+        self._evaluate_func: Callable | None = None
+
+        self._job_active: bool = False
+        self._tasks: dict[int, OptimizationTask] = {}
+        self._pending: deque[int] = deque()
+        self._results: list = []
+        self._finished_count: int = 0
+        self._error: str = ""
+
+        self.steal_count: int = 0
+        self.retry_count: int = 0
+
+        self.register(self.register_worker)
+        self.register(self.unregister_worker)
+        self.register(self.keep_alive)
+        self.register(self.fetch_task)
+        self.register(self.submit_result)
+        self.register(self.get_evaluate_func)
+
+    def set_evaluate_func(self, evaluate_func: Callable) -> None:
+        """
+        Set the function evaluated by workers for following jobs.
+        """
+        with self._task_lock:
+            self._func_id += 1
+            self._evaluate_func = evaluate_func
+
+    def get_worker_count(self) -> int:
+        """"""
+        with self._task_lock:
+            return len(self._workers)
+
+    def wait_for_workers(self, count: int, timeout: float) -> bool:
+        """
+        Wait until at least count workers are registered.
+        """
+        end: float = time() + timeout
+        while time() < end:
+            if self.get_worker_count() >= count:
+                return True
+            sleep(0.1)
+        return False
+
+    def map(
+        self,
+        settings: list[dict],
+        callback: Callable[[int], None] | None = None
+    ) -> list:
+        """
+        Evaluate all settings on workers and return results in input order.
+
+        The callback receives the number of settings newly finished.
+        """
+        with self._task_lock:
+            self._tasks.clear()
+            self._pending.clear()
+            self._results = [None] * len(settings)
+            self._finished_count = 0
+            self._error = ""
+
+            items: list[tuple[int, dict]] = list(enumerate(settings))
+            for task_id, i in enumerate(range(0, len(items), self.batch_size)):
+                task: OptimizationTask = OptimizationTask(task_id, items[i: i + self.batch_size])
+                self._tasks[task_id] = task
+                self._pending.append(task_id)
+
+            self._job_active = True
+
+        # Wake up idle workers
+        self.publish(OPTIMIZATION_TOPIC, self._func_id)
+
+        last_count: int = 0
+        connected_time: float = time()
+
+        while True:
+            self._task_event.wait(1)
+            self._task_event.clear()
+
+            with self._task_lock:
+                self.check_workers()
+
+                count: int = self._finished_count
+                error: str = self._error
+                finished: bool = count == len(settings)
+
+                # No worker to evaluate remaining tasks
+                if self._workers:
+                    connected_time = time()
+                disconnected: bool = time() - connected_time > self.connect_timeout
+
+                if finished or error or disconnected:
+                    self._job_active = False
+                    self._pending.clear()
+                    results: list = self._results
+                    self._results = []
+
+            if callback and count > last_count:
+                callback(count - last_count)
+                last_count = count
+
+            if error:
+                raise RemoteException(error)
+            elif finished:
+                return results
+            elif disconnected:
+                raise TimeoutError(_("超过{}秒没有优化节点连接").format(self.connect_timeout))
+
+    def check_workers(self) -> None:
+        """
+        Requeue tasks of workers without keepalive for worker_timeout seconds.
+        """
+        now: float = time()
+
+        for worker in list(self._workers.values()):
+            if now - worker.last_seen < self.worker_timeout:
+                continue
+
+            self._workers.pop(worker.worker_id)
+            self.output(_("优化节点{}失去响应，重新分配{}个任务").format(worker.worker_id, len(worker.tasks)))
+
+            for task_id in worker.tasks:
+                task: OptimizationTask | None = self._tasks.get(task_id, None)
+                if not task or task.finished:
+                    continue
+
+                task.workers.discard(worker.worker_id)
+                if not task.workers:
+                    self.retry_task(task, _("优化节点{}失去响应").format(worker.worker_id))
+
+    def retry_task(self, task: OptimizationTask, error: str) -> None:
+        """
+        Put a task back into the queue, or fail the job after max_retries.
+        """
+        task.failures += 1
+
+        if task.failures > self.max_retries:
+            self._error = error
+            self._task_event.set()
+        else:
+            self.retry_count += 1
+            self._pending.appendleft(task.task_id)
+
+    def touch_worker(self, worker_id: str) -> WorkerInfo:
+        """
+        Update the keepalive time of a worker, registering it if unknown.
+        """
+        worker: WorkerInfo | None = self._workers.get(worker_id, None)
+        if not worker:
+            worker = WorkerInfo(worker_id, time())
+            self._workers[worker_id] = worker
+            self.output(_("优化节点{}已连接").format(worker_id))
+        else:
+            worker.last_seen = time()
+        return worker
+
+    def register_worker(self, worker_id: str) -> float:
+        """
+        Called by worker on startup, returns keepalive interval.
+        """
+        with self._task_lock:
+            self.touch_worker(worker_id)
+        return min(KEEPALIVE_INTERVAL, self.worker_timeout / 3)
+
+    def unregister_worker(self, worker_id: str) -> None:
+        """
+        Called by worker on graceful exit.
+        """
+        with self._task_lock:
+            worker: WorkerInfo | None = self._workers.get(worker_id, None)
+            if worker:
+                worker.last_seen = 0
+                self.check_workers()
+
+    def keep_alive(self, worker_id: str) -> None:
+        """"""
+        with self._task_lock:
+            self.touch_worker(worker_id)
+
+    def get_evaluate_func(self) -> tuple[int, Callable | None]:
+        """"""
+        with self._task_lock:
+            return self._func_id, self._evaluate_func
+
+    def fetch_task(self, worker_id: str) -> tuple[int, int, list[tuple[int, dict]]] | None:
+        """
+        Pull the next batch for a worker, returns (func_id, task_id, items).
+        """
+        with self._task_lock:
+            worker: WorkerInfo = self.touch_worker(worker_id)
+
+            if not self._job_active:
+                return None
+
+            task: OptimizationTask | None = None
+
+            while self._pending:
+                task = self._tasks[self._pending.popleft()]
+                if not task.finished:
+                    break
+                task = None
+
+            # Steal the oldest running task when nothing is left in queue
+            if not task:
+                running: list[OptimizationTask] = [
+                    t for t in self._tasks.values()
+                    if not t.finished and t.workers and worker_id not in t.workers and len(t.workers) < 2
+                ]
+                if not running:
+                    return None
+
+                task = min(running, key=lambda t: t.dispatched_at)
+                self.steal_count += 1
+            else:
+                task.dispatched_at = time()
+
+            task.workers.add(worker_id)
+            worker.tasks.add(task.task_id)
+
+            return self._func_id, task.task_id, task.items
+
+    def submit_result(
+        self,
+        worker_id: str,
+        func_id: int,
+        task_id: int,
+        success: bool,
+        data: Any
+    ) -> None:
+        """
+        Push results of a batch, data is traceback string if failed.
+        """
+        with self._task_lock:
+            worker: WorkerInfo = self.touch_worker(worker_id)
+            worker.tasks.discard(task_id)
+
+            task: OptimizationTask | None = self._tasks.get(task_id, None)
+            if (
+                not self._job_active
+                or func_id != self._func_id
+                or not task
+                or task.finished
+                or worker_id not in task.workers
+            ):
+                return
+
+            task.workers.discard(worker_id)
+
+            if success:
+                for (index, _setting), result in zip(task.items, data, strict=True):
+                    self._results[index] = result
+
+                task.finished = True
+                worker.finished += len(task.items)
+                self._finished_count += len(task.items)
+            elif not task.workers:
+                self.retry_task(task, data)
+
+            self._task_event.set()
+
+
+class OptimizationWorker(RpcClient):
+    """
+    Pull parameter batches from OptimizationCoordinator and evaluate them.
+    """
+
+    def __init__(self, worker_id: str = "") -> None:
+        """"""
+        super().__init__()
+
+        if not worker_id:
+            worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:6]}"
+        self.worker_id: str = worker_id
+
+        # Allow new requests after a timeout and drop stale replies
+        self._socket_req.setsockopt(zmq.REQ_RELAXED, 1)
+        self._socket_req.setsockopt(zmq.REQ_CORRELATE, 1)
+
+        self._func_id: int = 0
+        self._evaluate_func: Callable | None = None
+
+        self._wakeup: threading.Event = threading.Event()
+        self._keepalive_interval: float = KEEPALIVE_INTERVAL
+
+        self.subscribe_topic("")
+
+    def callback(self, topic: str, data: Any) -> None:
+        """"""
+        if topic == OPTIMIZATION_TOPIC:
+            self._wakeup.set()
+
+    def run_keepalive(self) -> None:
+        """
+        Send keepalive while the main thread is busy evaluating.
+        """
+        while self._active:
+            try:
+                self.keep_alive(self.worker_id, timeout=5000)
+            except RemoteException:
+                pass
+            sleep(self._keepalive_interval)
+
+    def work(self) -> None:
+        """
+        Process batches until stopped, blocking the calling thread.
+        """
+        self._keepalive_interval = self.register_worker(self.worker_id)
+
+        keepalive_thread: threading.Thread = threading.Thread(target=self.run_keepalive, daemon=True)
+        keepalive_thread.start()
+
+        while self._active:
+            try:
+                task: tuple | None = self.fetch_task(self.worker_id, timeout=5000)
+            except RemoteException:
+                sleep(1)
+                continue
+
+            if not task:
+                self._wakeup.wait(1)
+                self._wakeup.clear()
+                continue
+
+            func_id, task_id, items = task
+
+            if func_id != self._func_id:
+                self._func_id, self._evaluate_func = self.get_evaluate_func()
+
+            evaluate_func: Callable = self._evaluate_func      # type: ignore
+            try:
+                results: list = [evaluate_func(setting) for _index, setting in items]
+                self.submit_result(self.worker_id, func_id, task_id, True, results)
+            except RemoteException:
+                continue
+            except Exception:
+                self.submit_result(self.worker_id, func_id, task_id, False, traceback.format_exc())
+
+
+def run_optimization_worker(req_address: str, sub_address: str, worker_id: str = "") -> None:
+    """
+    Run an optimization worker in current process until interrupted.
+    """
+    worker: OptimizationWorker = OptimizationWorker(worker_id)
+    worker.start(req_address, sub_address)
+
+    try:
+        worker.work()
+    finally:
+        try:
+            worker.unregister_worker(worker.worker_id, timeout=1000)
+        except RemoteException:
+            pass
+
+        worker.stop()
+        worker.join()
+
+
+def start_optimization_workers(
+    req_address: str,
+    sub_address: str,
+    count: int
+) -> list[SpawnProcess]:
+    """
+    Start worker processes on current host.
+    """
+    ctx = get_context("spawn")
+
+    processes: list[SpawnProcess] = []
+    for _i in range(count):
+        process: SpawnProcess = ctx.Process(
+            target=run_optimization_worker,
+            args=(req_address, sub_address),
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+
+    return processes
+
+
+def to_connect_address(address: str) -> str:
+    """
+    Convert a bind address into an address for local connection.
+    """
+    return address.replace("*", "127.0.0.1").replace("0.0.0.0", "127.0.0.1")
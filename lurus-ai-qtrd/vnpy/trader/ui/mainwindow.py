@@ -94,6 +94,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.save_window_setting("default")
 
+        # Both update_with_cell and update_with_data may be overridden
         tick_widget.itemDoubleClicked.connect(self.trading_widget.update_with_cell)
         position_widget.itemDoubleClicked.connect(self.trading_widget.update_with_cell)
 
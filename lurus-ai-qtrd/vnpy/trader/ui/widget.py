@@ -4,12 +4,14 @@ Basic widgets for UI.
 
 import csv
 import platform
+import threading
 from enum import Enum
 from typing import cast, Any
 from copy import copy
 from tzlocal import get_localzone_name
 from datetime import datetime
 from importlib import metadata
+from collections.abc import Callable
 
 from .qt import QtCore, QtGui, QtWidgets, Qt
 from ..constant import Direction, Exchange, Offset, OrderType
@@ -44,12 +46,24 @@ COLOR_BID = QtGui.QColor(255, 174, 201)
 COLOR_ASK = QtGui.QColor(160, 255, 160)
 COLOR_BLACK = QtGui.QColor("black")
 
+# Interval of applying buffered events into monitors, in milliseconds
+UPDATE_INTERVAL = 50
+
+# Role providing raw value for sorting monitor rows
+SORT_ROLE = Qt.ItemDataRole.UserRole
+
+# More changed row ranges than this are merged into one dataChanged signal
+MAX_CHANGED_RANGES = 20
+
 
 class BaseCell(QtWidgets.QTableWidgetItem):
     """
     General cell used in tablewidgets.
     """
 
+    alignment: Qt.AlignmentFlag = Qt.AlignmentFlag.AlignCenter
+    color: QtGui.QColor | None = None
+
     def __init__(self, content: Any, data: Any) -> None:
         """"""
         super().__init__()
@@ -76,6 +90,20 @@ class BaseCell(QtWidgets.QTableWidgetItem):
         """
         return self._data
 
+    @classmethod
+    def get_text(cls, content: Any) -> str:
+        """
+        Get text of content shown in monitor.
+        """
+        return str(content)
+
+    @classmethod
+    def get_color(cls, content: Any) -> QtGui.QColor | None:
+        """
+        Get foreground color of content shown in monitor.
+        """
+        return cls.color
+
     def __lt__(self, other: "BaseCell") -> bool:        # type: ignore
         """
         Sort by text content.
@@ -100,6 +128,13 @@ class EnumCell(BaseCell):
         if content:
             super().set_content(content.value, data)
 
+    @classmethod
+    def get_text(cls, content: Any) -> str:
+        """"""
+        if content:
+            return str(content.value)
+        return ""
+
 
 class DirectionCell(EnumCell):
     """
@@ -116,10 +151,15 @@ class DirectionCell(EnumCell):
         """
         super().set_content(content, data)
 
+        self.setForeground(self.get_color(content))
+
+    @classmethod
+    def get_color(cls, content: Any) -> QtGui.QColor:
+        """"""
         if content is Direction.SHORT:
-            self.setForeground(COLOR_SHORT)
+            return COLOR_SHORT
         else:
-            self.setForeground(COLOR_LONG)
+            return COLOR_LONG
 
 
 class BidCell(BaseCell):
@@ -127,6 +167,8 @@ class BidCell(BaseCell):
     Cell used for showing bid price and volume.
     """
 
+    color: QtGui.QColor = COLOR_BID
+
     def __init__(self, content: Any, data: Any) -> None:
         """"""
         super().__init__(content, data)
@@ -139,6 +181,8 @@ class AskCell(BaseCell):
     Cell used for showing ask price and volume.
     """
 
+    color: QtGui.QColor = COLOR_ASK
+
     def __init__(self, content: Any, data: Any) -> None:
         """"""
         super().__init__(content, data)
@@ -162,10 +206,15 @@ class PnlCell(BaseCell):
         """
         super().set_content(content, data)
 
+        self.setForeground(self.get_color(content))
+
+    @classmethod
+    def get_color(cls, content: Any) -> QtGui.QColor:
+        """"""
         if str(content).startswith("-"):
-            self.setForeground(COLOR_SHORT)
+            return COLOR_SHORT
         else:
-            self.setForeground(COLOR_LONG)
+            return COLOR_LONG
 
 
 class TimeCell(BaseCell):
@@ -184,7 +233,16 @@ class TimeCell(BaseCell):
         if content is None:
             return
 
-        content = content.astimezone(self.local_tz)
+        self.setText(self.get_text(content))
+        self._data = data
+
+    @classmethod
+    def get_text(cls, content: datetime | None) -> str:
+        """"""
+        if content is None:
+            return ""
+
+        content = content.astimezone(cls.local_tz)
         timestamp: str = content.strftime("%H:%M:%S")
 
         millisecond: int = int(content.microsecond / 1000)
@@ -193,8 +251,7 @@ class TimeCell(BaseCell):
         else:
             timestamp = f"{timestamp}.000"
 
-        self.setText(timestamp)
-        self._data = data
+        return timestamp
 
 
 class DateCell(BaseCell):
@@ -211,24 +268,229 @@ class DateCell(BaseCell):
         if content is None:
             return
 
-        self.setText(content.strftime("%Y-%m-%d"))
+        self.setText(self.get_text(content))
         self._data = data
 
+    @classmethod
+    def get_text(cls, content: Any) -> str:
+        """"""
+        if content is None:
+            return ""
+        return str(content.strftime("%Y-%m-%d"))
+
 
 class MsgCell(BaseCell):
     """
     Cell used for showing msg data.
     """
 
+    alignment: Qt.AlignmentFlag = Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter
+
     def __init__(self, content: str, data: Any) -> None:
         """"""
         super().__init__(content, data)
-        self.setTextAlignment(QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignVCenter)
+        self.setTextAlignment(self.alignment)
+
+
+class MonitorModel(QtCore.QAbstractTableModel):
+    """
+    Table model of monitor data, newest row is shown on top.
+    """
+
+    def __init__(self, headers: dict, data_key: str) -> None:
+        """"""
+        super().__init__()
+
+        self.headers: dict = headers
+        self.data_key: str = data_key
+
+        self.fields: list[str] = list(headers.keys())
+        self.cell_types: list[type[BaseCell]] = [d["cell"] for d in headers.values()]
+        self.update_columns: list[int] = [i for i, d in enumerate(headers.values()) if d["update"]]
+
+        # Rows are stored from oldest to newest
+        self.rows: list[Any] = []
+        self.contents: list[list[Any]] = []
+        self.texts: list[list[str]] = []
+        self.colors: list[list[QtGui.QColor | None]] = []
+
+        # Key of data to position in rows
+        self.positions: dict[str, int] = {}
+
+    def rowCount(self, parent: QtCore.QModelIndex | None = None) -> int:
+        """"""
+        if parent is not None and parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent: QtCore.QModelIndex | None = None) -> int:
+        """"""
+        if parent is not None and parent.isValid():
+            return 0
+        return len(self.fields)
+
+    def data(self, index: QtCore.QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        """"""
+        if not index.isValid():
+            return None
+
+        ix: int = len(self.rows) - 1 - index.row()
+        column: int = index.column()
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.texts[ix][column]
+        elif role == Qt.ItemDataRole.ForegroundRole:
+            return self.colors[ix][column]
+        elif role == Qt.ItemDataRole.TextAlignmentRole:
+            return self.cell_types[column].alignment
+        elif role == SORT_ROLE:
+            # Numbers are sorted by value, others by text
+            content: Any = self.contents[ix][column]
+            if isinstance(content, int | float):
+                return content
+            return self.texts[ix][column]
+
+        return None
+
+    def headerData(
+        self,
+        section: int,
+        orientation: Qt.Orientation,
+        role: int = Qt.ItemDataRole.DisplayRole
+    ) -> Any:
+        """"""
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.headers[self.fields[section]]["display"]
+        return None
+
+    def get_data(self, row: int) -> Any:
+        """
+        Get data object of row.
+        """
+        return self.rows[len(self.rows) - 1 - row]
+
+    def update_data(self, data_list: list) -> None:
+        """
+        Update a batch of data into table, only the latest data of
+        each key is applied.
+        """
+        new_rows: list = []
+        changed: set[int] = set()
+
+        if not self.data_key:
+            new_rows = data_list
+        else:
+            latest: dict[str, Any] = {}
+            for data in data_list:
+                latest[getattr(data, self.data_key)] = data
+
+            for key, data in latest.items():
+                ix: int | None = self.positions.get(key, None)
+                if ix is None:
+                    new_rows.append(data)
+                else:
+                    self.update_row(ix, data)
+                    changed.add(ix)
+
+        if changed:
+            self.emit_data_changed(changed)
 
+        if new_rows:
+            self.insert_rows(new_rows)
 
-class BaseMonitor(QtWidgets.QTableWidget):
+    def insert_rows(self, new_rows: list) -> None:
+        """
+        Insert new rows at the top of table.
+        """
+        self.beginInsertRows(QtCore.QModelIndex(), 0, len(new_rows) - 1)
+
+        for data in new_rows:
+            if self.data_key:
+                self.positions[getattr(data, self.data_key)] = len(self.rows)
+
+            contents: list[Any] = [getattr(data, field) for field in self.fields]
+
+            self.rows.append(data)
+            self.contents.append(contents)
+            self.texts.append([
+                cell.get_text(content) for cell, content in zip(self.cell_types, contents, strict=True)
+            ])
+            self.colors.append([
+                cell.get_color(content) for cell, content in zip(self.cell_types, contents, strict=True)
+            ])
+
+        self.endInsertRows()
+
+    def update_row(self, ix: int, data: Any) -> None:
+        """
+        Update columns of an old row.
+        """
+        self.rows[ix] = data
+
+        contents: list[Any] = self.contents[ix]
+        texts: list[str] = self.texts[ix]
+        colors: list[QtGui.QColor | None] = self.colors[ix]
+
+        for column in self.update_columns:
+            cell: type[BaseCell] = self.cell_types[column]
+            content: Any = getattr(data, self.fields[column])
+
+            contents[column] = content
+            texts[column] = cell.get_text(content)
+            colors[column] = cell.get_color(content)
+
+    def emit_data_changed(self, changed: set[int]) -> None:
+        """
+        Emit dataChanged for each range of continuous changed rows.
+        """
+        count: int = len(self.rows)
+        rows: list[int] = sorted(count - 1 - ix for ix in changed)
+
+        ranges: list[list[int]] = [[rows[0], rows[0]]]
+        for row in rows[1:]:
+            if row == ranges[-1][1] + 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+
+        if len(ranges) > MAX_CHANGED_RANGES:
+            ranges = [[rows[0], rows[-1]]]
+
+        if self.update_columns:
+            first_column, last_column = self.update_columns[0], self.update_columns[-1]
+        else:
+            first_column, last_column = 0, len(self.fields) - 1
+
+        for start, end in ranges:
+            self.dataChanged.emit(self.index(start, first_column), self.index(end, last_column))
+
+
+class MonitorProxyModel(QtCore.QSortFilterProxyModel):
+    """
+    Sort and filter rows of monitor.
+    """
+
+    def __init__(self, filter_func: Callable[[Any], bool]) -> None:
+        """"""
+        super().__init__()
+
+        self.filter_func: Callable[[Any], bool] = filter_func
+
+        self.setSortRole(SORT_ROLE)
+        self.setDynamicSortFilter(True)
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QtCore.QModelIndex) -> bool:
+        """"""
+        model: MonitorModel = cast(MonitorModel, self.sourceModel())
+        return self.filter_func(model.get_data(source_row))
+
+
+class BaseMonitor(QtWidgets.QTableView):
     """
     Monitor data update.
+
+    Events are buffered in event engine thread and applied into
+    table model once every UPDATE_INTERVAL.
     """
 
     event_type: str = ""
@@ -236,7 +498,10 @@ class BaseMonitor(QtWidgets.QTableWidget):
     sorting: bool = False
     headers: dict = {}
 
-    signal: QtCore.Signal = QtCore.Signal(Event)
+    signal_double_click: QtCore.Signal = QtCore.Signal(object)
+
+    # Same as signal of QTableWidget, emitted with cell double clicked
+    itemDoubleClicked: QtCore.Signal = QtCore.Signal(object)
 
     def __init__(self, main_engine: MainEngine, event_engine: EventEngine) -> None:
         """"""
@@ -244,7 +509,10 @@ class BaseMonitor(QtWidgets.QTableWidget):
 
         self.main_engine: MainEngine = main_engine
         self.event_engine: EventEngine = event_engine
-        self.cells: dict[str, dict] = {}
+
+        self.buffer: list = []
+        self.lock: threading.Lock = threading.Lock()
+        self.timer: QtCore.QTimer = QtCore.QTimer(self)
 
         self.init_ui()
         self.load_setting()
@@ -259,16 +527,19 @@ class BaseMonitor(QtWidgets.QTableWidget):
         """
         Initialize table.
         """
-        self.setColumnCount(len(self.headers))
+        self.table_model: MonitorModel = MonitorModel(self.headers, self.data_key)
 
-        labels: list = [d["display"] for d in self.headers.values()]
-        self.setHorizontalHeaderLabels(labels)
+        self.proxy_model: MonitorProxyModel = MonitorProxyModel(self.filter_data)
+        self.proxy_model.setSourceModel(self.table_model)
+        self.setModel(self.proxy_model)
 
         self.verticalHeader().setVisible(False)
         self.setEditTriggers(self.EditTrigger.NoEditTriggers)
         self.setAlternatingRowColors(True)
         self.setSortingEnabled(self.sorting)
 
+        self.doubleClicked.connect(self.process_double_click)
+
     def init_menu(self) -> None:
         """
         Create right click menu.
@@ -288,65 +559,48 @@ class BaseMonitor(QtWidgets.QTableWidget):
         Register event handler into event engine.
         """
         if self.event_type:
-            self.signal.connect(self.process_event)
-            self.event_engine.register(self.event_type, self.signal.emit)
+            self.timer.setInterval(UPDATE_INTERVAL)
+            self.timer.timeout.connect(self.process_buffer)
+            self.timer.start()
+
+            self.event_engine.register(self.event_type, self.process_event)
 
     def process_event(self, event: Event) -> None:
         """
-        Process new data from event and update into table.
+        Buffer new data from event, called in event engine thread.
         """
-        # Disable sorting to prevent unwanted error.
-        if self.sorting:
-            self.setSortingEnabled(False)
-
-        # Update data into table.
-        data = event.data
-
-        if not self.data_key:
-            self.insert_new_row(data)
-        else:
-            key: str = data.__getattribute__(self.data_key)
-
-            if key in self.cells:
-                self.update_old_row(data)
-            else:
-                self.insert_new_row(data)
+        with self.lock:
+            self.buffer.append(event.data)
 
-        # Enable sorting
-        if self.sorting:
-            self.setSortingEnabled(True)
-
-    def insert_new_row(self, data: Any) -> None:
+    def process_buffer(self) -> None:
         """
-        Insert a new row at the top of table.
+        Update data buffered since last time into table.
         """
-        self.insertRow(0)
-
-        row_cells: dict = {}
-        for column, header in enumerate(self.headers.keys()):
-            setting: dict = self.headers[header]
+        with self.lock:
+            if not self.buffer:
+                return
+            data_list, self.buffer = self.buffer, []
 
-            content = data.__getattribute__(header)
-            cell: QtWidgets.QTableWidgetItem = setting["cell"](content, data)
-            self.setItem(0, column, cell)
+        self.table_model.update_data(data_list)
 
-            if setting["update"]:
-                row_cells[header] = cell
-
-        if self.data_key:
-            key: str = data.__getattribute__(self.data_key)
-            self.cells[key] = row_cells
+    def filter_data(self, data: Any) -> bool:
+        """
+        Whether row of data is shown in table.
+        """
+        return True
 
-    def update_old_row(self, data: Any) -> None:
+    def process_double_click(self, index: QtCore.QModelIndex) -> None:
         """
-        Update an old row in table.
+        Emit data object of row double clicked.
         """
-        key: str = data.__getattribute__(self.data_key)
-        row_cells = self.cells[key]
+        source_index: QtCore.QModelIndex = self.proxy_model.mapToSource(index)
+        data: Any = self.table_model.get_data(source_index.row())
+        self.signal_double_click.emit(data)
 
-        for header, cell in row_cells.items():
-            content = data.__getattribute__(header)
-            cell.set_content(content, data)
+        column: int = source_index.column()
+        content: Any = getattr(data, self.table_model.fields[column])
+        cell: BaseCell = self.table_model.cell_types[column](content, data)
+        self.itemDoubleClicked.emit(cell)
 
     def resize_columns(self) -> None:
         """
@@ -370,17 +624,12 @@ class BaseMonitor(QtWidgets.QTableWidget):
             headers: list = [d["display"] for d in self.headers.values()]
             writer.writerow(headers)
 
-            for row in range(self.rowCount()):
-                if self.isRowHidden(row):
-                    continue
-
-                row_data: list = []
-                for column in range(self.columnCount()):
-                    item: QtWidgets.QTableWidgetItem | None = self.item(row, column)
-                    if item:
-                        row_data.append(str(item.text()))
-                    else:
-                        row_data.append("")
+            # Rows filtered out are not saved
+            for row in range(self.proxy_model.rowCount()):
+                row_data: list = [
+                    self.proxy_model.index(row, column).data()
+                    for column in range(self.proxy_model.columnCount())
+                ]
                 writer.writerow(row_data)
 
     def contextMenuEvent(self, event: QtGui.QContextMenuEvent) -> None:
@@ -502,13 +751,12 @@ class OrderMonitor(BaseMonitor):
         super().init_ui()
 
         self.setToolTip(_("双击单元格撤单"))
-        self.itemDoubleClicked.connect(self.cancel_order)
+        self.signal_double_click.connect(self.cancel_order)
 
-    def cancel_order(self, cell: BaseCell) -> None:
+    def cancel_order(self, order: OrderData) -> None:
         """
         Cancel order if cell double clicked.
         """
-        order: OrderData = cell.get_data()
         req: CancelRequest = order.create_cancel_request()
         self.main_engine.cancel_order(req, order.gateway_name)
 
@@ -585,13 +833,12 @@ class QuoteMonitor(BaseMonitor):
         super().init_ui()
 
         self.setToolTip(_("双击单元格撤销报价"))
-        self.itemDoubleClicked.connect(self.cancel_quote)
+        self.signal_double_click.connect(self.cancel_quote)
 
-    def cancel_quote(self, cell: BaseCell) -> None:
+    def cancel_quote(self, quote: QuoteData) -> None:
         """
         Cancel quote if cell double clicked.
         """
-        quote: QuoteData = cell.get_data()
         req: CancelRequest = quote.create_cancel_request()
         self.main_engine.cancel_quote(req, quote.gateway_name)
 
@@ -1020,9 +1267,15 @@ class TradingWidget(QtWidgets.QWidget):
             self.main_engine.cancel_order(req, order.gateway_name)
 
     def update_with_cell(self, cell: BaseCell) -> None:
-        """"""
-        data = cell.get_data()
+        """
+        Update order fields with data of cell double clicked.
+        """
+        self.update_with_data(cell.get_data())
 
+    def update_with_data(self, data: Any) -> None:
+        """
+        Update order fields with data of tick or position double clicked.
+        """
         self.symbol_line.setText(data.symbol)
         self.exchange_combo.setCurrentIndex(
             self.exchange_combo.findText(data.exchange.value)
@@ -1055,20 +1308,11 @@ class ActiveOrderMonitor(OrderMonitor):
     Monitor which shows active order only.
     """
 
-    def process_event(self, event: Event) -> None:
+    def filter_data(self, data: OrderData) -> bool:
         """
         Hides the row if order is not active.
         """
-        super().process_event(event)
-
-        order: OrderData = event.data
-        row_cells: dict = self.cells[order.vt_orderid]
-        row: int = self.row(row_cells["volume"])
-
-        if order.is_active():
-            self.showRow(row)
-        else:
-            self.hideRow(row)
+        return data.is_active()
 
 
 class ContractManager(QtWidgets.QWidget):